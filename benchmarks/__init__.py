@@ -0,0 +1 @@
+"""Offline benchmarks for the retrieval engine and agent pipeline."""
@@ -0,0 +1,70 @@
+"""Recall@k and latency of the IVF(-PQ) index against exact search.
+
+Builds the index on a synthetic clustered catalog (or a local catalog with
+``--domain``) and sweeps ``nprobe`` / ``rerank``.
+
+Usage:
+    python -m benchmarks.ann_benchmark --items 200000 --pq-m 48
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_catalog
+from retrieval.ann import IVFIndex
+from retrieval.catalog import ExactIndex, get_catalog, normalize_rows
+
+
+def sample_queries(catalog, n, noise=0.05, seed=42):
+    """Queries near catalog items, like user slices built from item embeddings."""
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(catalog), n, replace=False))
+    base = np.asarray(catalog.vectors[rows])
+    return normalize_rows(base + rng.standard_normal(base.shape, dtype=np.float32) * noise)
+
+
+def recall_at_k(approx_rows, exact_rows):
+    hits = [len(set(a[a >= 0]) & set(e)) for a, e in zip(approx_rows, exact_rows)]
+    return sum(hits) / exact_rows.size
+
+
+def timed_search(index, queries, k):
+    started = time.perf_counter()
+    rows = np.vstack([index.search(q[None, :], k)[0] for q in queries])
+    return rows, (time.perf_counter() - started) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--domain", choices=["movie", "music", "product"], default=None)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--pq-m", type=int, default=0)
+    args = parser.parse_args()
+
+    catalog = get_catalog(args.domain) if args.domain else synthetic_catalog(args.items)
+    queries = sample_queries(catalog, args.queries)
+
+    started = time.perf_counter()
+    index = IVFIndex.build(catalog, nlist=args.nlist, pq_m=args.pq_m)
+    print(f"Built {index.params} in {time.perf_counter() - started:.1f}s, "
+          f"index {index.nbytes() / 2**20:.1f} MiB, catalog {catalog.vectors.nbytes / 2**20:.1f} MiB")
+
+    exact_rows, exact_ms = timed_search(ExactIndex(catalog), queries, args.k)
+    print(f"exact: {exact_ms:.2f} ms/query")
+
+    print(f"{'nprobe':>7} {'rerank':>7} {'recall@' + str(args.k):>10} {'ms/query':>9} {'speedup':>8}")
+    reranks = [0, 50, 200] if args.pq_m else [0]
+    for nprobe in (1, 4, 8, 16, 32, 64):
+        for rerank in reranks:
+            index.nprobe, index.rerank = nprobe, rerank
+            rows, ms = timed_search(index, queries, args.k)
+            print(f"{nprobe:>7} {rerank:>7} {recall_at_k(rows, exact_rows):>10.3f} {ms:>9.2f} {exact_ms / ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Throughput vs latency of the micro-batching scorer.
+
+Runs N client threads that each issue query vectors back to back against a
+synthetic catalog, once unbatched (batch size 1) and then for several batch
+size / max-wait settings.
+
+Usage:
+    python -m benchmarks.batching_benchmark --items 30000 --clients 32
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_catalog
+from retrieval.batching import BatchScorer
+from retrieval.catalog import ExactIndex
+
+
+def run(scorer, clients, queries_per_client, k, dim=384):
+    latencies = []
+    lock = threading.Lock()
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((clients, queries_per_client, dim), dtype=np.float32)
+
+    def client(c):
+        local = []
+        for q in queries[c]:
+            t0 = time.perf_counter()
+            scorer.search(q, k)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "qps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "avg_batch": scorer.stats["queries"] / max(scorer.stats["batches"], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=30000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=20, help="queries per client")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    index = ExactIndex(synthetic_catalog(args.items))
+    settings = [(1, 0.0), (8, 1.0), (32, 2.0), (64, 2.0), (64, 5.0)]
+
+    print(f"{'batch':>6} {'wait_ms':>8} {'qps':>10} {'p50_ms':>8} {'p99_ms':>8} {'avg_batch':>10}")
+    for batch_size, wait_ms in settings:
+        result = run(BatchScorer(index, batch_size, wait_ms), args.clients, args.queries, args.k)
+        print(
+            f"{batch_size:>6} {wait_ms:>8.1f} {result['qps']:>10.1f} {result['p50_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {result['avg_batch']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Offline evaluation of the retrieval engines: quality and cost side by side.
+
+Every user's history is read from the activity store in consumption order and
+the last item of each domain is hidden. The user vector is rebuilt from what
+is left the way ``update_user_vector`` builds it: with ``--profile last`` a
+domain slice is the embedding of the newest remaining item, and with
+``--profile mean`` it is the mean of the remaining items. The collective
+slice is the average of the domain slices, weighted by activity counts. The
+catalog vector of an item stands in for the embedding of its description.
+For each domain, three queries ask for the hidden item (remaining history
+excluded, as online):
+
+- ``domain``: the domain slice;
+- ``collective``: the collective slice;
+- ``cross``: a collective slice built from the other domains only. It measures
+  whether activity in one domain predicts consumption in another.
+
+Per (engine mode, domain, query) the harness reports precision@k, recall@k
+(the hit rate, as one item is hidden), coverage (share of the catalog
+recommended to anyone), latency per query (batched, and single queries as
+the online scorer issues them) and memory (index structures beyond the
+catalog matrix and peak scoring allocations). Users are scored in batches of
+``--batch`` with one matrix multiplication per batch, so thousands of users
+take seconds.
+
+Usage:
+    python -m benchmarks.eval_harness --modes exact,int8,two_stage --k 10
+    python -m benchmarks.eval_harness --synthetic 30k --users 5000 --output eval.json
+
+Modes are those of ``retrieval.engine``; modes whose artifacts were not built
+for a catalog are skipped. ``--synthetic`` evaluates a synthetic world in a
+scratch directory; its histories are random, so it checks speed and memory,
+not quality.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+SOURCES = ("domain", "collective", "cross")
+
+
+def held_out(histories, catalogs, min_history=2):
+    """Hide the newest item of each domain with at least ``min_history`` catalog items.
+
+    Returns:
+        {domain: (user_ids, hidden rows (U,), remaining rows [U arrays, oldest first])}
+        and {user_id: {domain: remaining rows}} of every user with a hidden item.
+    """
+    splits = {domain: ([], [], []) for domain in catalogs}
+    remaining = {}
+    for user_id, history in histories.items():
+        rows = {domain: catalog.rows_for(history.get(domain, ())) for domain, catalog in catalogs.items()}
+        held = [domain for domain in catalogs if len(rows[domain]) >= min_history]
+        if not held:
+            continue
+        for domain in held:
+            users, hidden, kept = splits[domain]
+            users.append(user_id)
+            hidden.append(rows[domain][-1])
+            rows[domain] = rows[domain][:-1]
+            kept.append(rows[domain])
+        remaining[user_id] = rows
+    splits = {
+        domain: (users, np.asarray(hidden, dtype=np.int64), kept) for domain, (users, hidden, kept) in splits.items()
+    }
+    return splits, remaining
+
+
+def profile_slices(remaining, catalogs, profile):
+    """Domain slices and activity counts of each user's remaining history.
+
+    Returns:
+        (user IDs, {domain: (U x 384) slices}, {domain: (U,) counts}), rows in ``remaining`` order.
+    """
+    users = list(remaining)
+    slices, counts = {}, {}
+    for domain, catalog in catalogs.items():
+        out = np.zeros((len(users), catalog.vectors.shape[1]), dtype=np.float32)
+        counts[domain] = np.zeros(len(users), dtype=np.float32)
+        for u, user_id in enumerate(users):
+            rows = remaining[user_id][domain]
+            if len(rows):
+                counts[domain][u] = len(rows)
+                picked = rows[-1:] if profile == "last" else np.sort(rows)
+                out[u] = np.asarray(catalog.vectors[picked], dtype=np.float32).mean(axis=0)
+        slices[domain] = out
+    return users, slices, counts
+
+
+def weighted_slice(slices, counts, domains):
+    """Count-weighted average of the given domains' slices (zero where there is no activity)."""
+    total = sum(counts[d] for d in domains)
+    mixed = sum(slices[d] * counts[d][:, None] for d in domains)
+    return np.where(total[:, None] > 0, mixed / np.maximum(total, 1)[:, None], 0).astype(np.float32)
+
+
+def build_queries(splits, users, slices, counts, catalogs):
+    """{(domain, source): (user positions in the split, queries)} of every non-empty query."""
+    from retrieval.catalog import normalize_rows
+
+    position = {user_id: u for u, user_id in enumerate(users)}
+    collective = weighted_slice(slices, counts, list(catalogs))
+    queries = {}
+    for domain in catalogs:
+        at = np.asarray([position[user_id] for user_id in splits[domain][0]], dtype=np.int64)
+        by_source = {
+            "domain": slices[domain][at],
+            "collective": collective[at],
+            "cross": weighted_slice(slices, counts, [d for d in catalogs if d != domain])[at],
+        }
+        for source, matrix in by_source.items():
+            valid = np.flatnonzero(np.linalg.norm(matrix, axis=1) > 0)
+            queries[(domain, source)] = (valid, normalize_rows(matrix[valid]))
+    return queries
+
+
+def evaluate(index, catalog, hidden, kept, valid, queries, k, batch, single_queries):
+    """Quality, latency and memory of one index on one (domain, source) query set."""
+    rows = np.full((len(valid), k), -1, dtype=np.int64)
+    batch_ms = 0.0
+    tracemalloc.start()
+    for start in range(0, len(valid), batch):
+        block = valid[start:start + batch]
+        exclude = [kept[i] for i in block]
+        started = time.perf_counter()
+        found, _ = index.search(queries[start:start + batch], k, exclude)
+        batch_ms += (time.perf_counter() - started) * 1000
+        rows[start:start + len(block), :found.shape[1]] = found
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    single = []
+    for i in range(min(single_queries, len(valid))):
+        started = time.perf_counter()
+        index.search(queries[i:i + 1], k, [kept[valid[i]]])
+        single.append((time.perf_counter() - started) * 1000)
+
+    hits = (rows == hidden[valid][:, None]).any(axis=1)
+    recommended = np.unique(rows[rows >= 0])
+    return {
+        "users": int(len(valid)),
+        f"precision@{k}": round(float(hits.sum() / max(hits.size * k, 1)), 5),
+        f"recall@{k}": round(float(hits.mean()) if hits.size else 0.0, 5),
+        "coverage": round(recommended.size / len(catalog), 5),
+        "batched_ms_per_query": round(batch_ms / max(len(valid), 1), 4),
+        "p50_ms": round(float(np.percentile(single, 50)), 3) if single else 0.0,
+        "p95_ms": round(float(np.percentile(single, 95)), 3) if single else 0.0,
+        "scoring_peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def run(histories, catalogs, modes, k, profile, batch, single_queries):
+    from retrieval.engine import INDEX_TYPES
+    from runtime.memory import array_bytes
+
+    splits, remaining = held_out(histories, catalogs)
+    users, slices, counts = profile_slices(remaining, catalogs, profile)
+    queries = build_queries(splits, users, slices, counts, catalogs)
+
+    results = {}
+    for mode in modes:
+        for domain, catalog in catalogs.items():
+            index = INDEX_TYPES[mode](catalog)
+            if index is None:
+                print(f"[SKIP] {mode} is not built for {domain}")
+                continue
+            heap, mapped = array_bytes(index, exclude=(catalog.vectors, catalog.ids))
+            _, hidden, kept = splits[domain]
+            for source in SOURCES:
+                valid, matrix = queries[(domain, source)]
+                result = evaluate(index, catalog, hidden, kept, valid, matrix, k, batch, single_queries)
+                result["index_mb"] = round((heap + mapped) / 2**20, 2)
+                results[f"{mode}/{domain}/{source}"] = result
+    return results
+
+
+def report(results, k):
+    print(
+        f"{'mode/domain/query':<30} {'users':>7} {'P@' + str(k):>8} {'R@' + str(k):>8} {'coverage':>9} "
+        f"{'ms/q batch':>11} {'p50 ms':>8} {'p95 ms':>8} {'index MB':>9} {'peak MB':>8}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:<30} {r['users']:>7} {r[f'precision@{k}']:8.4f} {r[f'recall@{k}']:8.4f} {r['coverage']:9.4f} "
+            f"{r['batched_ms_per_query']:11.4f} {r['p50_ms']:8.3f} {r['p95_ms']:8.3f} {r['index_mb']:9.1f} "
+            f"{r['scoring_peak_mb']:8.1f}"
+        )
+    by_mode = {}
+    for name, r in results.items():
+        mode, _, source = name.split("/")
+        if source == "cross":
+            by_mode.setdefault(mode, []).append((r[f"recall@{k}"], r["users"]))
+    for mode, pairs in by_mode.items():
+        users = sum(n for _, n in pairs)
+        rate = sum(hit * n for hit, n in pairs) / max(users, 1)
+        print(f"{mode}: cross-domain hit rate@{k} {rate:.4f} over {users} held-out items")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="exact", help="comma-separated retrieval.engine modes")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--profile", choices=("last", "mean"), default="last")
+    parser.add_argument("--batch", type=int, default=256, help="users scored per matrix multiplication")
+    parser.add_argument("--single-queries", type=int, default=200, help="queries also timed one at a time")
+    parser.add_argument("--max-users", type=int, default=0, help="evaluate at most this many users (0 = all)")
+    parser.add_argument("--synthetic", choices=("30k", "300k", "3m"), default=None,
+                        help="evaluate a synthetic world instead of the activity store")
+    parser.add_argument("--users", type=int, default=2000, help="synthetic users")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        # The retrieval modules read their paths when first imported
+        workdir = tempfile.mkdtemp(prefix="recsys-eval-")
+        os.environ["RECSYS_DATA_DIR"] = workdir
+        os.environ["USER_ACTIVITY_DB"] = os.path.join(workdir, "user_activity.db")
+
+    from benchmarks.results import save_results
+    from retrieval.catalog import get_catalog
+    from retrieval.config import CATALOG_DIR, DOMAINS, USER_ACTIVITY_DB
+    from retrieval.engine import INDEX_TYPES
+    from retrieval.user_vectors import load_all_histories
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    unknown = [mode for mode in modes if mode not in INDEX_TYPES]
+    if unknown:
+        parser.error(f"unknown modes {unknown}; choose from {sorted(INDEX_TYPES)}")
+
+    if args.synthetic:
+        from benchmarks.pipeline_benchmark import SIZES
+        from benchmarks.world import build_world
+
+        build_world(SIZES[args.synthetic], args.users, USER_ACTIVITY_DB, catalog_root=CATALOG_DIR)
+
+    catalogs = {domain: get_catalog(domain) for domain in DOMAINS}
+    catalogs = {domain: catalog for domain, catalog in catalogs.items() if catalog is not None}
+    if not catalogs:
+        raise SystemExit(f"No local catalogs found in {CATALOG_DIR}; run `python -m retrieval.catalog` first.")
+    histories = load_all_histories(USER_ACTIVITY_DB)
+    if args.max_users:
+        histories = dict(list(histories.items())[:args.max_users])
+    print(f"Evaluating {len(histories)} users on {', '.join(f'{d} ({len(c)} items)' for d, c in catalogs.items())}")
+
+    started = time.perf_counter()
+    results = run(histories, catalogs, modes, args.k, args.profile, args.batch, args.single_queries)
+    report(results, args.k)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+    if args.output:
+        save_results(args.output, {key: value for key, value in vars(args).items() if key != "output"}, results)
+
+
+if __name__ == "__main__":
+    main()
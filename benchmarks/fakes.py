@@ -0,0 +1,223 @@
+"""In-memory stand-ins for Pinecone, for running the pipeline offline.
+
+``FakeIndex`` implements the part of the Pinecone ``Index`` surface the tools
+use: ``fetch(ids)``, ``query(vector, top_k, filter, include_metadata)`` with
+``$eq`` / ``$in`` metadata filters, and ``upsert(vectors)``. Responses
+support both attribute (``response.matches``, ``match.id``) and mapping
+(``response.get("matches")``, ``match["metadata"]``) access, as the real
+client's do. ``install_fake_pinecone`` routes ``retrieval.pinecone_client``
+(and so every tool) to a ``FakePinecone``. ``install_fake_encoder`` replaces
+the SentenceTransformer with ``FakeEncoder``, which needs neither
+sentence-transformers nor torch.
+"""
+
+import hashlib
+import sys
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from retrieval.catalog import normalize_rows, top_k
+
+
+class Record:
+    """Response object with attribute and mapping access, like the Pinecone client's.
+
+    Not a dict subclass: fetched vectors expose ``.values``, which would
+    otherwise be shadowed by ``dict.values``.
+    """
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def __getitem__(self, name):
+        return self.__dict__[name]
+
+    def __setitem__(self, name, value):
+        self.__dict__[name] = value
+
+    def __contains__(self, name):
+        return name in self.__dict__
+
+    def get(self, name, default=None):
+        return self.__dict__.get(name, default)
+
+
+class FakeIndex:
+    """Cosine-similarity index held in a numpy matrix.
+
+    Bulk-loaded items can take their metadata from ``metadata_fn(row)``
+    instead of one dict per item, so multi-million item catalogs fit in memory.
+    ``latency_ms`` adds a fixed delay per call to model the network round trip.
+    """
+
+    def __init__(self, name, dimension, latency_ms=0.0):
+        self.name = name
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.ids = []
+        self.row_of = {}
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        # Upserted values as written (Pinecone returns them unnormalized); scoring uses _vectors
+        self._raw = {}
+        self._metadata = {}
+        self._metadata_fn = None
+        self._field_index = {}
+        self._lock = threading.Lock()
+        self.calls = {"fetch": 0, "query": 0, "upsert": 0, "list": 0}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def bulk_load(self, ids, vectors, metadata_fn=None):
+        """Replace the contents with ``ids`` / ``vectors`` (normalized here)."""
+        with self._lock:
+            self.ids = [str(i) for i in ids]
+            self.row_of = {item_id: row for row, item_id in enumerate(self.ids)}
+            self._vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+            self._raw = {}
+            self._metadata = {}
+            self._metadata_fn = metadata_fn
+            self._field_index = {}
+
+    def _metadata_of(self, row):
+        if row in self._metadata:
+            return self._metadata[row]
+        return self._metadata_fn(row) if self._metadata_fn is not None else {}
+
+    def _wait(self, op):
+        self.calls[op] += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def fetch(self, ids, **kwargs):
+        self._wait("fetch")
+        vectors = {}
+        for item_id in ids:
+            row = self.row_of.get(str(item_id))
+            if row is not None:
+                values = self._raw.get(row)
+                values = values if values is not None else self._vectors[row]
+                vectors[item_id] = Record(id=item_id, values=values.tolist(), metadata=self._metadata_of(row))
+        return Record(vectors=vectors, namespace="")
+
+    def list(self, prefix=None, limit=100, **kwargs):
+        """Pages of record IDs, like the serverless client's ``Index.list``."""
+        self._wait("list")
+        ids = [item_id for item_id in self.ids if prefix is None or item_id.startswith(prefix)]
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def upsert(self, vectors, **kwargs):
+        self._wait("upsert")
+        entries = [dict(zip(("id", "values", "metadata"), e)) if isinstance(e, (tuple, list)) else e for e in vectors]
+        with self._lock:
+            # New IDs grow the matrix once per call, not once per record
+            new_ids = list(dict.fromkeys(str(e["id"]) for e in entries if str(e["id"]) not in self.row_of))
+            if new_ids:
+                for item_id in new_ids:
+                    self.row_of[item_id] = len(self.ids)
+                    self.ids.append(item_id)
+                grown = np.zeros((len(new_ids), self.dimension), dtype=np.float32)
+                self._vectors = np.vstack([self._vectors, grown])
+                self._field_index = {}
+            for entry in entries:
+                row = self.row_of[str(entry["id"])]
+                values = np.asarray(entry["values"], dtype=np.float32)
+                self._raw[row] = values
+                self._vectors[row] = normalize_rows(values[None, :])[0]
+                if entry.get("metadata") is not None:
+                    self._metadata[row] = entry["metadata"]
+        return Record(upserted_count=len(vectors))
+
+    def _rows_matching(self, filter):
+        rows = None
+        for field, condition in filter.items():
+            if field not in self._field_index:
+                index = {}
+                for row in range(len(self.ids)):
+                    index.setdefault(self._metadata_of(row).get(field), []).append(row)
+                self._field_index[field] = index
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            values = [condition["$eq"]] if "$eq" in condition else condition.get("$in", [])
+            matched = {row for value in values for row in self._field_index[field].get(value, [])}
+            rows = matched if rows is None else rows & matched
+        return np.asarray(sorted(rows), dtype=np.int64)
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=False, include_values=False, **kwargs):
+        self._wait("query")
+        query = np.asarray(vector, dtype=np.float32)[None, :]
+        norm = np.linalg.norm(query)
+        query = query / norm if norm > 0 else query
+        candidates = self._rows_matching(filter) if filter else None
+        vectors = self._vectors if candidates is None else self._vectors[candidates]
+        if len(vectors) == 0:
+            return Record(matches=[], namespace="")
+        scores = vectors @ query[0]
+        best = _top(scores, top_k)
+        matches = []
+        for position in best:
+            row = int(position if candidates is None else candidates[position])
+            match = Record(id=self.ids[row], score=float(scores[position]))
+            if include_metadata:
+                match["metadata"] = self._metadata_of(row)
+            if include_values:
+                match["values"] = self._vectors[row].tolist()
+            matches.append(match)
+        return Record(matches=matches, namespace="")
+
+
+def _top(scores, k):
+    return top_k(scores[None, :], min(k, len(scores)))[0][0]
+
+
+class FakePinecone:
+    """Registry of FakeIndex objects, standing in for the Pinecone client."""
+
+    def __init__(self, indexes=None):
+        self.indexes = dict(indexes or {})
+
+    def Index(self, name):
+        return self.indexes[name]
+
+
+def install_fake_pinecone(client):
+    """Point ``retrieval.pinecone_client`` (used by every tool) at ``client``."""
+    from retrieval import pinecone_client
+
+    pinecone_client.get_index.cache_clear()
+    pinecone_client.get_client = lambda: client
+    return client
+
+
+class FakeEncoder:
+    """Deterministic stand-in for the SentenceTransformer: a unit vector seeded by each text's hash."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _embed(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, str):
+            return self._embed(sentences)
+        return np.stack([self._embed(text) for text in sentences]) if sentences else np.zeros((0, self.dim), np.float32)
+
+
+def install_fake_encoder(encoder=None):
+    """Make ``retrieval.embeddings.get_embedding_model`` (and modules that imported it) return ``encoder``."""
+    from retrieval import embeddings
+
+    encoder = encoder or FakeEncoder()
+    original = embeddings.get_embedding_model
+    fake = lru_cache(maxsize=1)(lambda: encoder)
+    for module in list(sys.modules.values()):
+        if getattr(module, "get_embedding_model", None) is original:
+            module.get_embedding_model = fake
+    return encoder
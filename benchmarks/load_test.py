@@ -0,0 +1,308 @@
+"""Synthetic load: N concurrent users replaying sessions through the real ``Runner``.
+
+Each virtual user loops over sessions until the level's time is up: it opens
+a session, introduces itself ("My name is Ada") and then sends
+``--turns-per-session`` activity messages ("I watched Synthetic Movie 42
+(source: Amazon Prime)"), waiting a think time drawn from
+``--think-time`` before every message. The agents run with scripted models
+(``benchmarks.stub_model``), optionally delayed by ``--model-latency-ms``, and
+Pinecone is replaced by the in-memory fakes, so the load lands on this
+process: the tools, SQLite, the local retrieval engine and the session service.
+
+Every level of ``--concurrency`` reports throughput (turns/s), p50/p95/p99
+turn latency, the error rate, CPU use, peak RSS and event-loop lag. The knee
+is the last level after which adding users stops raising throughput by
+``--knee-gain`` (default 10%).
+
+Usage:
+    python -m benchmarks.load_test --concurrency 1,2,4,8,16,32 --duration 30 --think-time exp:500
+    python -m benchmarks.load_test --model-latency-ms 400 --sessions sqlite --output load.json
+
+Think times: ``const:MS``, ``uniform:LO:HI``, ``exp:MEAN`` or
+``lognormal:MEDIAN:SIGMA`` (milliseconds).
+"""
+
+import os
+import tempfile
+
+# The tools read their paths when first imported: point them at a scratch directory
+WORKDIR = os.environ.setdefault("RECSYS_DATA_DIR", tempfile.mkdtemp(prefix="recsys-load-"))
+os.environ.setdefault("USER_ACTIVITY_DB", os.path.join(WORKDIR, "user_activity.db"))
+os.environ.setdefault("GATE_PINECONE_RATE", "1000000")
+os.environ.setdefault("GATE_PINECONE_BURST", "1000000")
+os.environ.setdefault("GATE_GEMINI_RATE", "1000000")
+os.environ.setdefault("GATE_GEMINI_BURST", "1000000")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import contextlib  # noqa: E402
+import io  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+from collections import Counter  # noqa: E402
+
+import numpy as np  # noqa: E402
+
+from benchmarks.fakes import install_fake_encoder, install_fake_pinecone  # noqa: E402
+from benchmarks.pipeline_benchmark import SIZES  # noqa: E402
+from benchmarks.results import save_results, summarize  # noqa: E402
+from benchmarks.stub_model import activity_scripts  # noqa: E402
+from benchmarks.world import build_world  # noqa: E402
+from retrieval.config import CATALOG_DIR, USER_ACTIVITY_DB  # noqa: E402
+
+APP_NAME = "load-test"
+NAMES = ("Ada", "Grace", "Alan", "Edsger", "Barbara", "Donald", "Frances", "Ken")
+
+
+def think_time(spec):
+    """Sampler ``rng -> seconds`` for a think-time spec (see module docstring)."""
+    kind, *params = spec.split(":")
+    try:
+        values = [float(p) for p in params]
+    except ValueError:
+        values = []
+    if kind == "const" and len(values) == 1:
+        return lambda rng: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.exponential(values[0]) / 1000 if values[0] else 0.0
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: values[0] * rng.lognormal(0.0, values[1]) / 1000
+    raise argparse.ArgumentTypeError(f"bad think time {spec!r}: use const:MS, uniform:LO:HI, exp:MEAN or lognormal:MEDIAN:SIGMA")
+
+
+def session_scripts():
+    """Activity scripts whose root agent stores names and forwards everything else."""
+    scripts = activity_scripts()
+    forward = scripts["root_agent"]
+    introduce = [
+        ("call", "update_user_name", lambda text: {"name": text.rsplit(" ", 1)[-1]}),
+        ("text", "Nice to meet you! PLEASE ENTER YOUR QUERY NOW."),
+    ]
+    scripts["root_agent"] = lambda text: introduce if text.startswith("My name is") else forward
+    return scripts
+
+
+def session_service(kind):
+    if kind == "memory":
+        from google.adk.sessions import InMemorySessionService
+
+        return InMemorySessionService()
+    from google.adk.sessions import DatabaseSessionService
+
+    from runtime.session_cache import CachingSessionService
+
+    return CachingSessionService(DatabaseSessionService(db_url=f"sqlite:///{os.path.join(WORKDIR, 'sessions.db')}"))
+
+
+class LoopLag:
+    """Samples how late the event loop wakes a sleeping task (a saturation signal)."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append((loop.time() - started - self.interval) * 1000)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+
+
+class Level:
+    """Turns, errors and resource use of one concurrency level."""
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.latencies = {"name": [], "activity": []}
+        self.errors = Counter()
+        self.budget_breaches = 0
+
+    def turns(self):
+        return sum(len(samples) for samples in self.latencies.values())
+
+
+async def run_turn(runner, level, user_id, session_id, kind, text):
+    from google.genai import types
+
+    from runtime.llm_usage import finish_turn
+    from runtime.tracing import close_invocation
+
+    message = types.Content(role="user", parts=[types.Part(text=text)])
+    invocation_id, answered = None, False
+    started = time.perf_counter()
+    try:
+        async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=message):
+            invocation_id = event.invocation_id or invocation_id
+            answered = answered or bool(event.is_final_response() and event.content and event.content.parts)
+    except Exception as e:
+        level.errors[type(e).__name__] += 1
+    else:
+        level.latencies[kind].append((time.perf_counter() - started) * 1000)
+        if not answered:
+            level.errors["no_response"] += 1
+    if invocation_id:
+        close_invocation(invocation_id)
+        usage = finish_turn(invocation_id)
+        level.budget_breaches += bool(usage and usage["breached"])
+
+
+async def virtual_user(runner, world, level, index, deadline, think, turns_per_session, seed):
+    rng = np.random.default_rng(seed + index)
+    user_id = world.user_ids[index % len(world.user_ids)]
+    name = NAMES[index % len(NAMES)]
+    while time.perf_counter() < deadline:
+        session = runner.session_service.create_session(
+            app_name=APP_NAME, user_id=user_id, state={"user_name": "", "user_id": user_id, "step_no": 0}
+        )
+        messages = [("name", f"My name is {name}")] + [
+            ("activity", f"I watched {world.title('movie', rng)} (source: Amazon Prime)") for _ in range(turns_per_session)
+        ]
+        for kind, text in messages:
+            await asyncio.sleep(think(rng))
+            if time.perf_counter() >= deadline:
+                return
+            await run_turn(runner, level, user_id, session.id, kind, text)
+
+
+async def run_level(runner, world, concurrency, duration, think, turns_per_session, seed):
+    from runtime.memory import rss_bytes
+
+    level = Level(concurrency)
+    lag = LoopLag()
+    peak_rss = rss_bytes()
+    stop_sampling = threading.Event()
+
+    def sample_rss():
+        nonlocal peak_rss
+        while not stop_sampling.wait(0.2):
+            peak_rss = max(peak_rss, rss_bytes())
+
+    sampler = threading.Thread(target=sample_rss, name="load-rss", daemon=True)
+    sampler.start()
+    lag.start()
+    cpu_started, started = time.process_time(), time.perf_counter()
+    deadline = started + duration
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(
+            virtual_user(runner, world, level, i, deadline, think, turns_per_session, seed) for i in range(concurrency)
+        ))
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    await lag.stop()
+    stop_sampling.set()
+    sampler.join()
+
+    turns = level.turns()
+    errors = sum(level.errors.values())
+    all_latencies = level.latencies["name"] + level.latencies["activity"]
+    result = summarize(all_latencies) if all_latencies else {"n": 0}
+    result.update({
+        "concurrency": concurrency,
+        "throughput_per_s": round(turns / wall, 3),
+        "error_rate": round(errors / max(turns + errors, 1), 4),
+        "errors": dict(level.errors),
+        "budget_breaches": level.budget_breaches,
+        "cpu_percent": round(cpu * 100 / wall, 1),
+        "peak_rss_mb": round(peak_rss / 1024 / 1024, 1),
+        "loop_lag_p95_ms": round(float(np.percentile(lag.samples, 95)), 3) if lag.samples else 0.0,
+        "threads": threading.active_count(),
+    })
+    for kind, samples in level.latencies.items():
+        if samples:
+            result[f"{kind}_p95_ms"] = summarize(samples)["p95_ms"]
+    return result
+
+
+def find_knee(results, min_gain):
+    """Concurrency of the last level that still raised throughput by ``min_gain`` over the previous one."""
+    knee = results[0]["concurrency"]
+    for before, after in zip(results, results[1:]):
+        if after["throughput_per_s"] < before["throughput_per_s"] * (1 + min_gain):
+            break
+        knee = after["concurrency"]
+    return knee
+
+
+async def run(args, world):
+    from google.adk.runners import Runner
+
+    from benchmarks.stub_model import install_scripted_models
+    from root_agent.agent import root_agent
+
+    install_scripted_models(root_agent, session_scripts(), args.model_latency_ms)
+    service = session_service(args.sessions)
+    runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=service)
+    think = think_time(args.think_time)
+
+    print(
+        f"{'users':>6} {'turns/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} "
+        f"{'cpu %':>6} {'rss MB':>7} {'lag p95':>8}"
+    )
+    results = []
+    for concurrency in args.concurrency:
+        result = await run_level(runner, world, concurrency, args.duration, think, args.turns_per_session, args.seed)
+        results.append(result)
+        print(
+            f"{concurrency:>6} {result['throughput_per_s']:8.2f} {result.get('p50_ms', 0):9.1f} "
+            f"{result.get('p95_ms', 0):9.1f} {result.get('p99_ms', 0):9.1f} {result['error_rate']:7.1%} "
+            f"{result['cpu_percent']:6.0f} {result['peak_rss_mb']:7.0f} {result['loop_lag_p95_ms']:8.1f}"
+        )
+    if hasattr(service, "flush"):
+        service.flush()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=sorted(SIZES), default="30k")
+    parser.add_argument("--users", type=int, default=1000, help="synthetic users in the world")
+    parser.add_argument("--concurrency", type=lambda s: [int(n) for n in s.split(",")], default=[1, 2, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    parser.add_argument("--think-time", default="exp:500")
+    parser.add_argument("--turns-per-session", type=int, default=5, help="activity messages after the introduction")
+    parser.add_argument("--model-latency-ms", type=float, default=0.0, help="delay of every scripted model response")
+    parser.add_argument("--pinecone-latency-ms", type=float, default=0.0)
+    parser.add_argument("--sessions", choices=("memory", "sqlite"), default="memory",
+                        help="InMemorySessionService, or the cached SQLite service main.py uses")
+    parser.add_argument("--knee-gain", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake-encoder", action="store_true",
+                        help="embed with a hash-seeded fake instead of the SentenceTransformer (no torch needed)")
+    parser.add_argument("--output", help="write the per-level results to this JSON file")
+    args = parser.parse_args()
+    try:
+        think_time(args.think_time)  # validate before building the world
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    world = build_world(SIZES[args.size], args.users, USER_ACTIVITY_DB, catalog_root=CATALOG_DIR,
+                        latency_ms=args.pinecone_latency_ms)
+    install_fake_pinecone(world.client)
+    if args.fake_encoder:
+        install_fake_encoder()
+    print(f"Built {args.size} world with {args.users} users in {time.perf_counter() - started:.1f}s ({WORKDIR})")
+
+    results = asyncio.run(run(args, world))
+    knee = find_knee(results, args.knee_gain)
+    print(f"Knee: throughput stops growing by {args.knee_gain:.0%} per level after {knee} concurrent users")
+
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key != "output"}
+        save_results(args.output, config, {f"users_{r['concurrency']}": r for r in results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Offline micro and full-turn benchmarks of the agent tools.
+
+Pinecone is replaced by in-memory fakes over a synthetic catalog and Gemini
+by scripted models, so the numbers measure this code, not the network. Use
+``--pinecone-latency-ms`` to model the round trip.
+
+Usage:
+    python -m benchmarks.pipeline_benchmark --size 30k --output bench.json
+    python -m benchmarks.pipeline_benchmark --size 30k --baseline bench.json   # exit 1 on regression
+
+Sizes are total catalog items split over the three domains: 30k, 300k, 3m
+(3m needs roughly 8 GB of memory). ``--turns`` > 0 also runs full turns
+through ADK's ``Runner``. ``calculate_user_embeddings`` (timed on its own and
+in every turn) loads the SentenceTransformer, so sentence-transformers and
+torch must be installed unless ``--fake-encoder`` is given.
+"""
+
+import os
+import tempfile
+
+# The tools read their paths when first imported: point them at a scratch directory
+WORKDIR = os.environ.setdefault("RECSYS_DATA_DIR", tempfile.mkdtemp(prefix="recsys-bench-"))
+os.environ.setdefault("USER_ACTIVITY_DB", os.path.join(WORKDIR, "user_activity.db"))
+os.environ.setdefault("GATE_PINECONE_RATE", "1000000")
+os.environ.setdefault("GATE_PINECONE_BURST", "1000000")
+os.environ.setdefault("GATE_GEMINI_RATE", "1000000")
+os.environ.setdefault("GATE_GEMINI_BURST", "1000000")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import contextlib  # noqa: E402
+import io  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+from types import SimpleNamespace  # noqa: E402
+
+import numpy as np  # noqa: E402
+
+from benchmarks.fakes import install_fake_encoder, install_fake_pinecone  # noqa: E402
+from benchmarks.results import load_results, regressions, save_results, summarize  # noqa: E402
+from benchmarks.world import build_world  # noqa: E402
+from retrieval.config import CATALOG_DIR, USER_ACTIVITY_DB  # noqa: E402
+
+SIZES = {"30k": 30000, "300k": 300000, "3m": 3000000}
+
+
+def timed(fn, iterations, warmup=3):
+    """Latencies (ms) of ``iterations`` calls of ``fn(i)``; tool logging is silenced."""
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(warmup):
+            fn(i)
+        for i in range(iterations):
+            started = time.perf_counter()
+            fn(i)
+            samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def micro_benchmarks(world, iterations, seed=0):
+    from root_agent.sub_agents.explainer_agent.agent import (
+        calculate_user_embeddings,
+        exact_title_search,
+        update_user_activity,
+    )
+    from root_agent.sub_agents.explainer_agent.sub_agents.recommendation_agent.agent import (
+        get_recommendations_based_on_activity,
+    )
+
+    rng = np.random.default_rng(seed)
+    users = [world.user_ids[int(i)] for i in rng.integers(0, len(world.user_ids), iterations + 3)]
+    titles = [world.title("movie", rng) for _ in range(iterations + 3)]
+
+    def context(i):
+        return SimpleNamespace(state={"user_id": users[i]})
+
+    return {
+        "title_lookup": summarize(timed(lambda i: exact_title_search(titles[i], "movies_watched"), iterations)),
+        "update_user_activity": summarize(timed(
+            lambda i: update_user_activity("movies_watched", titles[i], context(i)), iterations
+        )),
+        "calculate_user_embeddings": summarize(timed(
+            lambda i: calculate_user_embeddings("movie", f"I watched {titles[i]}", f"Movie: {titles[i]}", context(i)),
+            iterations,
+        )),
+        "get_recommendations_based_on_activity": summarize(timed(
+            lambda i: get_recommendations_based_on_activity("movie", context(i)), iterations
+        )),
+    }
+
+
+async def turn_benchmark(world, turns, seed=0):
+    """Latency of full single-item activity turns through Runner with scripted models."""
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+
+    from benchmarks.stub_model import activity_scripts, install_scripted_models
+    from root_agent.agent import root_agent
+    from runtime.llm_usage import finish_turn
+
+    install_scripted_models(root_agent, activity_scripts())
+    service = InMemorySessionService()
+    runner = Runner(agent=root_agent, app_name="benchmark", session_service=service)
+    rng = np.random.default_rng(seed)
+
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(turns):
+            user_id = world.user_ids[i % len(world.user_ids)]
+            session = service.create_session(
+                app_name="benchmark", user_id=user_id, state={"user_id": user_id, "user_name": "Bench", "step_no": 0}
+            )
+            message = types.Content(role="user", parts=[types.Part(text=f"I watched {world.title('movie', rng)} on Amazon Prime")])
+            started = time.perf_counter()
+            invocation_id = None
+            async for event in runner.run_async(user_id=user_id, session_id=session.id, new_message=message):
+                invocation_id = event.invocation_id or invocation_id
+            samples.append((time.perf_counter() - started) * 1000)
+            finish_turn(invocation_id)
+    return {"full_turn": summarize(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=sorted(SIZES), default="30k")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--pinecone-latency-ms", type=float, default=0.0)
+    parser.add_argument("--local-catalogs", action=argparse.BooleanOptionalAction, default=True,
+                        help="export the catalogs so recommendations use the local engine")
+    parser.add_argument("--fake-encoder", action="store_true",
+                        help="embed with a hash-seeded fake instead of the SentenceTransformer (no torch needed)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    world = build_world(
+        SIZES[args.size], args.users, USER_ACTIVITY_DB,
+        catalog_root=CATALOG_DIR if args.local_catalogs else None,
+        latency_ms=args.pinecone_latency_ms,
+    )
+    install_fake_pinecone(world.client)
+    if args.fake_encoder:
+        install_fake_encoder()
+    print(f"Built {args.size} world with {args.users} users in {time.perf_counter() - started:.1f}s ({WORKDIR})")
+
+    results = micro_benchmarks(world, args.iterations)
+    if args.turns:
+        results.update(asyncio.run(turn_benchmark(world, args.turns)))
+
+    print(f"{'benchmark':>40} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, summary in results.items():
+        print(f"{name:>40} {summary['p50_ms']:9.2f} {summary['p95_ms']:9.2f} {summary['p99_ms']:9.2f}")
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "tolerance")}
+    if args.output:
+        save_results(args.output, config, results)
+    if args.baseline:
+        baseline = load_results(args.baseline)
+        if baseline.get("config") != config:
+            print(f"Warning: baseline was recorded with {baseline.get('config')}")
+        slower = regressions(baseline, {"benchmarks": results}, args.tolerance)
+        for name, metric, before, after in slower:
+            print(f"REGRESSION {name} {metric}: {before:.2f} -> {after:.2f} ms")
+        if slower:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Memory, recall@k and latency of int8 / float16 catalog storage.
+
+Usage:
+    python -m benchmarks.quantization_benchmark --items 100000
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.ann_benchmark import recall_at_k, sample_queries
+from benchmarks.synthetic import synthetic_catalog
+from retrieval.catalog import ExactIndex, save_catalog, load_catalog
+from retrieval.quantize import QuantizedIndex, save_quantized
+from retrieval.user_vectors import UserVectorCache
+
+
+def timed_search(index, queries, k, batch=32):
+    started = time.perf_counter()
+    rows = np.vstack([index.search(queries[i:i + batch], k)[0] for i in range(0, len(queries), batch)])
+    return rows, (time.perf_counter() - started) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    synthetic = synthetic_catalog(args.items)
+    with tempfile.TemporaryDirectory() as root:
+        save_catalog("synthetic", synthetic.ids, synthetic.vectors, root)
+        catalog = load_catalog("synthetic", root)
+        queries = sample_queries(catalog, args.queries)
+        exact_rows, exact_ms = timed_search(ExactIndex(catalog), queries, args.k)
+
+        print(f"{'storage':>8} {'rerank':>7} {'MiB':>8} {'recall@' + str(args.k):>10} {'ms/query':>9}")
+        print(f"{'float32':>8} {'-':>7} {catalog.vectors.nbytes / 2**20:>8.1f} {1.0:>10.3f} {exact_ms:>9.3f}")
+        for kind in ("fp16", "int8"):
+            quantized = save_quantized(catalog, kind, root)
+            for rerank in (0, 50):
+                rows, ms = timed_search(QuantizedIndex(catalog, quantized, rerank), queries, args.k)
+                print(f"{kind:>8} {rerank:>7} {quantized.nbytes / 2**20:>8.1f} "
+                      f"{recall_at_k(rows, exact_rows):>10.3f} {ms:>9.3f}")
+            del quantized
+
+    # User-vector cache footprint for 10K users
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((10000, 1536), dtype=np.float32) * 0.05
+    print(f"\n{'cache':>8} {'MiB/10K users':>14} {'max abs err':>12}")
+    for dtype in ("float32", "float16", "int8"):
+        cache = UserVectorCache(max_users=10000, dtype=dtype)
+        for i, v in enumerate(vectors):
+            cache.put(str(i), v, version="v")
+        err = max(np.abs(cache.get(str(i))[0] - vectors[i]).max() for i in range(100))
+        print(f"{dtype:>8} {cache.nbytes / 2**20:>14.2f} {err:>12.5f}")
+
+
+if __name__ == "__main__":
+    main()
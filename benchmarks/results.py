@@ -0,0 +1,55 @@
+"""Latency summaries saved as JSON, and regression checks against a baseline."""
+
+import json
+import platform
+import time
+
+import numpy as np
+
+
+def summarize(samples_ms):
+    """p50 / p95 / p99 / mean of a list of latencies in milliseconds."""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "n": int(samples.size),
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+    }
+
+
+def save_results(path, config, benchmarks):
+    """Write one run (its configuration and {name: summary}) to ``path``."""
+    run = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "config": config,
+        "benchmarks": benchmarks,
+    }
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    return run
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(baseline, current, tolerance=0.2, metrics=("p50_ms", "p95_ms")):
+    """Benchmarks slower than the baseline by more than ``tolerance`` (fraction).
+
+    Returns:
+        A list of (benchmark, metric, baseline_value, current_value).
+    """
+    slower = []
+    for name, summary in current["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            continue
+        for metric in metrics:
+            if summary[metric] > before[metric] * (1 + tolerance):
+                slower.append((name, metric, before[metric], summary[metric]))
+    return slower
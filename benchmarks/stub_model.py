@@ -0,0 +1,129 @@
+"""Scripted stand-in for Gemini, so full turns run through ``Runner`` offline.
+
+Each agent gets a ``ScriptedModel`` whose script is a list of steps:
+``("call", tool_name, args)`` emits a function call and ``("text", str)``
+a final answer. The step is picked from the request itself: the number of
+function responses since the latest user/context message. Concurrent
+sessions therefore each follow their own script without shared cursors.
+``args`` may be a callable receiving the latest user text, so one script
+serves every synthetic user's message. The script itself may be a callable
+mapping the user text to a list of steps, for agents that act differently on
+different kinds of message. ``latency_ms`` delays each response without
+blocking the event loop, as a remote model would.
+"""
+
+import asyncio
+from typing import Any, AsyncGenerator
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+
+
+def _user_text(content):
+    if content.role != "user" or not content.parts:
+        return None
+    texts = [part.text for part in content.parts if part.text]
+    return " ".join(texts) if texts else None
+
+
+def _progress(contents):
+    """(latest user message, function responses since the latest user or context message).
+
+    Events of other agents reach a model as user-role "For context:" messages;
+    they end the count but are not the user's message.
+    """
+    completed, counting, user_text = 0, True, ""
+    for content in reversed(contents):
+        text = _user_text(content)
+        if text is None:
+            if counting:
+                completed += sum(1 for part in content.parts or [] if part.function_response)
+            continue
+        counting = False
+        if not text.startswith("For context:"):
+            user_text = text
+            break
+    return user_text, completed
+
+
+class ScriptedModel(BaseLlm):
+    """Replays a fixed sequence of tool calls and a final text answer."""
+
+    model: str = "scripted"
+    script: Any = []
+    latency_ms: float = 0.0
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        user_text, completed = _progress(llm_request.contents)
+        script = self.script(user_text) if callable(self.script) else self.script
+        step = script[min(completed, len(script) - 1)]
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        if step[0] == "call":
+            _, name, args = step
+            args = args(user_text) if callable(args) else dict(args)
+            part = types.Part(function_call=types.FunctionCall(name=name, args=args))
+        else:
+            part = types.Part(text=step[1])
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+def transfer(agent_name):
+    """Script step handing control to ``agent_name``."""
+    return ("call", "transfer_to_agent", {"agent_name": agent_name})
+
+
+# Script step ending one step of the explainer's workflow
+NEXT_STEP = ("call", "increment_step_no", {})
+
+
+def activity_scripts(summary="Summary: enjoys synthetic catalog items."):
+    """Scripts for one single-item activity turn through the whole agent tree.
+
+    The user message must look like "I watched <title> on Amazon Prime" or
+    "I watched <title> (source: Amazon Prime)"; the summarizer step is
+    replaced by a fixed summary so that a turn exercises every tool and
+    transfer with deterministic inputs. The explainer calls
+    ``increment_step_no`` after each of its first seven steps, as its
+    instruction requires; step 8 is the transfer to the recommendation agent.
+    """
+
+    def title_of(text):
+        return text.split(" watched ", 1)[-1].split(" (source:", 1)[0].rsplit(" on ", 1)[0]
+
+    return {
+        "root_agent": [transfer("explainer_agent"), ("text", "Forwarded.")],
+        "explainer_agent": [
+            NEXT_STEP,  # 1. parse
+            ("call", "update_user_activity", lambda text: {"field": "movies_watched", "item": title_of(text)}),
+            NEXT_STEP,  # 2. record the activity
+            NEXT_STEP,  # 3. map the summary field
+            ("call", "get_user_pref_summary", {"activity_type": "movie"}),
+            ("call", "get_item_description", lambda text: {"activity_type": "movie", "item_name": title_of(text)}),
+            NEXT_STEP,  # 4. fetch
+            NEXT_STEP,  # 5. summarize (fixed summary)
+            ("call", "set_user_pref_summary", {"activity_type": "movie", "new_summary": summary}),
+            NEXT_STEP,  # 6. store the summary
+            ("call", "calculate_user_embeddings", lambda text: {
+                "activity_type": "movie", "user_query": text, "description": f"Movie: {title_of(text)}",
+            }),
+            NEXT_STEP,  # 7. recalculate embeddings
+            transfer("recommendation_agent"),  # 8.
+            ("text", "Done."),
+        ],
+        "recommendation_agent": [
+            ("call", "get_recommendations_based_on_activity", {"base_activity": "movie"}),
+            ("text", "Here are your recommendations."),
+        ],
+        "summarizer_agent": [("text", summary)],
+    }
+
+
+def install_scripted_models(agent, scripts, latency_ms=0.0):
+    """Replace the model of ``agent`` and its sub-agents with ScriptedModels."""
+    if agent.name in scripts:
+        agent.model = ScriptedModel(script=scripts[agent.name], latency_ms=latency_ms)
+    for sub_agent in agent.sub_agents:
+        install_scripted_models(sub_agent, scripts, latency_ms)
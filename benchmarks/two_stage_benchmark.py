@@ -0,0 +1,46 @@
+"""Latency and recall@k of two-stage (projected search + exact re-rank) retrieval.
+
+Usage:
+    python -m benchmarks.two_stage_benchmark --items 200000
+"""
+
+import argparse
+import tempfile
+
+from benchmarks.ann_benchmark import recall_at_k, sample_queries
+from benchmarks.quantization_benchmark import timed_search
+from benchmarks.synthetic import synthetic_catalog
+from retrieval.catalog import ExactIndex, load_catalog, save_catalog
+from retrieval.projection import build_projection, load_two_stage_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    synthetic = synthetic_catalog(args.items)
+    with tempfile.TemporaryDirectory() as root:
+        save_catalog("synthetic", synthetic.ids, synthetic.vectors, root)
+        catalog = load_catalog("synthetic", root)
+        queries = sample_queries(catalog, args.queries)
+        exact_rows, exact_ms = timed_search(ExactIndex(catalog), queries, args.k)
+        print(f"exact 384-dim: {exact_ms:.3f} ms/query")
+
+        print(f"{'method':>7} {'dim':>5} {'cands':>6} {'recall@' + str(args.k):>10} {'ms/query':>9} {'speedup':>8}")
+        for method in ("pca", "random"):
+            for dim in (48, 96, 192):
+                build_projection(catalog, dim, method, root)
+                index = load_two_stage_index(catalog, root)
+                for candidates in (100, 300):
+                    index.candidates = candidates
+                    rows, ms = timed_search(index, queries, args.k)
+                    print(f"{method:>7} {dim:>5} {candidates:>6} {recall_at_k(rows, exact_rows):>10.3f} "
+                          f"{ms:>9.3f} {exact_ms / ms:>7.1f}x")
+                del index
+
+
+if __name__ == "__main__":
+    main()
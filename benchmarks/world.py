@@ -0,0 +1,126 @@
+"""Synthetic catalogs and users wired into the fakes, for offline pipeline runs.
+
+``build_world`` creates, for a total catalog size split evenly over the three
+domains:
+
+- a ``FakeIndex`` per catalog index (movies-list, music-list, products-list)
+  with clustered vectors and schema-shaped metadata, looked up by titles
+  such as "Synthetic Movie 42";
+- synthetic users with a few consumed items per domain, their 1536-dim
+  vectors stored in both layouts of ``retrieval.user_store`` (the fake
+  user-preference-vector and user-preference-slices indexes) and their rows
+  in a ``user_activity`` SQLite table;
+- optionally the exported local catalogs, so the local retrieval engine is
+  exercised as in production.
+
+The retrieval and agent modules read their paths at import time, so callers
+must set ``RECSYS_DATA_DIR`` / ``USER_ACTIVITY_DB`` before importing them
+(see ``benchmarks.pipeline_benchmark``).
+"""
+
+import json
+import sqlite3
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from benchmarks.fakes import FakeIndex, FakePinecone
+from benchmarks.synthetic import clustered_vectors
+from retrieval.catalog import normalize_rows, save_catalog
+from retrieval.config import DOMAINS, EMBEDDING_DIM, INDEX_NAMES, USER_INDEX_NAME, USER_VECTOR_DIM
+from retrieval.user_store import USER_SLICE_INDEX_NAME, slice_records, split_vector
+
+TITLE_PREFIXES = {"movie": "Synthetic Movie", "music": "Synthetic Track", "product": "Synthetic Product"}
+GENRES = ("Drama", "Comedy", "Action", "Science Fiction", "Documentary", "Thriller")
+
+
+def synthetic_title(domain, row):
+    return f"{TITLE_PREFIXES[domain]} {row}"
+
+
+def synthetic_metadata(domain, row):
+    """Deterministic metadata shaped like the real catalog records."""
+    title = synthetic_title(domain, row)
+    genre = GENRES[row % len(GENRES)]
+    if domain == "movie":
+        return {
+            "title": title, "original_title": title, "genres": genre, "keywords": f"{genre.lower()}, synthetic",
+            "overview": f"A synthetic {genre.lower()} film.", "tagline": "Benchmarks, at scale.",
+            "release_date": f"{1970 + row % 55}-01-01", "vote_average": 5 + row % 50 / 10, "popularity": float(row % 1000),
+        }
+    if domain == "music":
+        return {
+            "track_name": title, "artists": f"Artist {row % 997}", "album_name": f"Album {row % 4999}",
+            "track_genre": genre.lower(), "popularity": row % 100, "explicit": row % 7 == 0, "duration_ms": 120000 + row % 180000,
+        }
+    return {
+        "title": title, "stars": 3 + row % 20 / 10, "reviews": row % 5000, "price": 5 + row % 500,
+        "listPrice": 10 + row % 500, "category": genre, "isBestSeller": row % 50 == 0, "boughtInLastMonth": row % 1000,
+    }
+
+
+@dataclass
+class World:
+    client: FakePinecone
+    db_path: str
+    user_ids: list
+    domain_sizes: dict
+    histories: dict = field(default_factory=dict)
+
+    def title(self, domain, rng):
+        return synthetic_title(domain, int(rng.integers(0, self.domain_sizes[domain])))
+
+
+def build_world(n_items, n_users, db_path, catalog_root=None, history=5, seed=0, latency_ms=0.0):
+    """Fake indexes, SQLite activity rows and (optionally) local catalogs; see module docstring."""
+    rng = np.random.default_rng(seed)
+    per_domain = max(1, n_items // len(DOMAINS))
+    indexes, vectors = {}, {}
+    for offset, domain in enumerate(DOMAINS):
+        vectors[domain] = clustered_vectors(per_domain, EMBEDDING_DIM, seed=seed + offset)
+        index = FakeIndex(INDEX_NAMES[domain], EMBEDDING_DIM, latency_ms)
+        index.bulk_load(range(per_domain), vectors[domain], lambda row, domain=domain: synthetic_metadata(domain, row))
+        indexes[INDEX_NAMES[domain]] = index
+        if catalog_root is not None:
+            save_catalog(domain, np.arange(per_domain).astype(str), vectors[domain], catalog_root)
+
+    user_ids = [f"user_{i}" for i in range(n_users)]
+    histories, user_vectors = {}, np.empty((n_users, USER_VECTOR_DIM), dtype=np.float32)
+    for u, user_id in enumerate(user_ids):
+        histories[user_id] = {domain: rng.choice(per_domain, size=min(history, per_domain), replace=False) for domain in DOMAINS}
+        slices = [normalize_rows(vectors[domain][histories[user_id][domain]].mean(axis=0, keepdims=True))[0] for domain in DOMAINS]
+        user_vectors[u] = np.concatenate(slices + [np.mean(slices, axis=0)])
+
+    user_index = FakeIndex(USER_INDEX_NAME, USER_VECTOR_DIM, latency_ms)
+    user_index.upsert([{"id": user_id, "values": user_vectors[u]} for u, user_id in enumerate(user_ids)])
+    indexes[USER_INDEX_NAME] = user_index
+    slice_index = FakeIndex(USER_SLICE_INDEX_NAME, EMBEDDING_DIM, latency_ms)
+    slice_index.upsert([
+        record for u, user_id in enumerate(user_ids) for record in slice_records(user_id, split_vector(user_vectors[u]))
+    ])
+    indexes[USER_SLICE_INDEX_NAME] = slice_index
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS user_activity")
+        conn.execute(
+            "CREATE TABLE user_activity (user_id TEXT PRIMARY KEY, movies_watched TEXT, listened_music TEXT, "
+            "products_purchased TEXT, movie_pref_summary TEXT, music_pref_summary TEXT, product_pref_summary TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO user_activity VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    user_id,
+                    json.dumps([str(i) for i in histories[user_id]["movie"]]),
+                    json.dumps([str(i) for i in histories[user_id]["music"]]),
+                    json.dumps([str(i) for i in histories[user_id]["product"]]),
+                    "Summary: likes synthetic films.", "Summary: likes synthetic music.", "Summary: buys synthetic products.",
+                )
+                for user_id in user_ids
+            ],
+        )
+    conn.close()
+
+    sizes = {domain: per_domain for domain in DOMAINS}
+    return World(FakePinecone(indexes), db_path, user_ids, sizes, histories)
@@ -1,7 +1,21 @@
-from datetime import datetime
+import os
 
+from google.adk.events import Event, EventActions
+from google.adk.sessions.base_session_service import GetSessionConfig
 from google.genai import types
 
+from runtime.interaction_history import interaction_history, legacy_entries
+from runtime.memory import enforce_memory_caps
+from runtime.metrics import ACTIVE_TURNS
+from runtime.profiling import maybe_profile
+from runtime.llm_usage import finish_turn
+from runtime.tracing import close_invocation, span
+
+# Printing the session state before and after every turn is opt-in
+DISPLAY_STATE = os.getenv("DISPLAY_STATE", "0") == "1"
+# Only state is needed here; load one event instead of the whole list (0 means "all")
+STATE_ONLY = GetSessionConfig(num_recent_events=1)
+
 
 # ANSI color codes for terminal output
 class Colors:
@@ -30,47 +44,59 @@ class Colors:
     BG_WHITE = "\033[47m"
 
 
-def update_interaction_history(session_service, app_name, user_id, session_id, entry):
-    """Add an entry to the interaction history in state.
+# Sessions whose in-state history (from before the table) has been archived by this process
+_archived_sessions = set()
+
+
+def record_interactions(session_service, app_name, user_id, session_id, entries):
+    """Add entries to the interaction history in one transaction.
+
+    The entries go to the interaction_history table only. Nothing is appended
+    to the session, so its event stream does not grow with the history.
+    Sessions that still carry a history in state have it archived into the
+    table (and removed from state) the first time they are recorded to.
 
     Args:
         session_service: The session service instance
         app_name: The application name
         user_id: The user ID
         session_id: The session ID
-        entry: A dictionary containing the interaction data
-            - requires 'action' key (e.g., 'user_query', 'agent_response')
+        entries: Dictionaries containing the interaction data
+            - each requires an 'action' key (e.g., 'user_query', 'agent_response')
             - other keys are flexible depending on the action type
     """
     try:
-        # Get current session
-        session = session_service.get_session(
-            app_name=app_name, user_id=user_id, session_id=session_id
-        )
+        key = (app_name, user_id, session_id)
+        if key not in _archived_sessions:
+            session = session_service.get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id, config=STATE_ONLY
+            )
+            if session.state.get("interaction_history") is not None:
+                interaction_history.append(
+                    app_name, user_id, session_id, legacy_entries(session.state["interaction_history"])
+                )
+                session_service.append_event(
+                    session,
+                    Event(author="user", actions=EventActions(state_delta={"interaction_history": None})),
+                )
+            _archived_sessions.add(key)
+        interaction_history.append(app_name, user_id, session_id, entries)
+    except Exception as e:
+        print(f"Error updating interaction history: {e}")
 
-        # Get current interaction history
-        interaction_history = session.state.get("interaction_history", [])
 
-        # Add timestamp if not already present
-        if "timestamp" not in entry:
-            entry["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def update_interaction_history(session_service, app_name, user_id, session_id, entry):
+    """Add one entry to the interaction history (see ``record_interactions``)."""
+    record_interactions(session_service, app_name, user_id, session_id, [entry])
 
-        # Add the entry to interaction history
-        interaction_history.append(entry)
 
-        # Create updated state
-        updated_state = session.state.copy()
-        updated_state["interaction_history"] = interaction_history
+def get_interaction_history(app_name, user_id, session_id, before_id=None, page_size=20):
+    """Read one newest-first page of the full interaction history.
 
-        # Create a new session with updated state
-        session_service.create_session(
-            app_name=app_name,
-            user_id=user_id,
-            session_id=session_id,
-            state=updated_state,
-        )
-    except Exception as e:
-        print(f"Error updating interaction history: {e}")
+    Returns:
+        (entries, next_before_id); pass next_before_id to read the next page.
+    """
+    return interaction_history.page(app_name, user_id, session_id, before_id=before_id, limit=page_size)
 
 
 def add_user_query_to_history(session_service, app_name, user_id, session_id, query):
@@ -110,7 +136,7 @@ def display_state(
     """Display the current session state in a formatted way."""
     try:
         session = session_service.get_session(
-            app_name=app_name, user_id=user_id, session_id=session_id
+            app_name=app_name, user_id=user_id, session_id=session_id, config=STATE_ONLY
         )
 
         # Format the output with clear sections
@@ -134,11 +160,12 @@ def display_state(
         else:
             print("📚 Courses: None")
 
-        # Handle interaction history in a more readable way
-        interaction_history = session.state.get("interaction_history", [])
-        if interaction_history:
-            print("📝 Interaction History:")
-            for idx, interaction in enumerate(interaction_history, 1):
+        # Handle interaction history in a more readable way (recent entries only,
+        # the rest are paged from the table with get_interaction_history)
+        recent_history = interaction_history.recent(app_name, user_id, session_id)
+        if recent_history:
+            print("📝 Interaction History (most recent):")
+            for idx, interaction in enumerate(recent_history, 1):
                 # Pretty format dict entries, or just show strings
                 if isinstance(interaction, dict):
                     action = interaction.get("action", "interaction")
@@ -230,49 +257,79 @@ async def call_agent_async(runner, user_id, session_id, query):
     )
     final_response_text = None
     agent_name = None
+    invocation_id = None
 
     # Display state before processing the message
-    display_state(
-        runner.session_service,
-        runner.app_name,
-        user_id,
-        session_id,
-        "State BEFORE processing",
-    )
+    if DISPLAY_STATE:
+        display_state(
+            runner.session_service,
+            runner.app_name,
+            user_id,
+            session_id,
+            "State BEFORE processing",
+        )
 
+    # Root span of this turn's trace (agents, tools and external calls nest below it);
+    # the turn is also profiled if a profile was requested (PROFILE_TURNS, /profile)
+    ACTIVE_TURNS.inc()
     try:
-        async for event in runner.run_async(
-            user_id=user_id, session_id=session_id, new_message=content
-        ):
-            # Capture the agent name from the event if available
-            if event.author:
-                agent_name = event.author
-
-            response = await process_agent_response(event)
-            if response:
-                final_response_text = response
-    except Exception as e:
-        print(f"{Colors.BG_RED}{Colors.WHITE}ERROR during agent run: {e}{Colors.RESET}")
+        with maybe_profile(session_id), span("turn", user_id=user_id, session_id=session_id) as turn:
+            try:
+                async for event in runner.run_async(
+                    user_id=user_id, session_id=session_id, new_message=content
+                ):
+                    # Capture the agent name from the event if available
+                    if event.author:
+                        agent_name = event.author
+                    invocation_id = event.invocation_id or invocation_id
+
+                    response = await process_agent_response(event)
+                    if response:
+                        final_response_text = response
+            except Exception as e:
+                print(f"{Colors.BG_RED}{Colors.WHITE}ERROR during agent run: {e}{Colors.RESET}")
+
+            # Record the query and, if we got a final response, the agent's answer in one write
+            entries = [{"action": "user_query", "query": query}]
+            if final_response_text and agent_name:
+                entries.append({"action": "agent_response", "agent": agent_name, "response": final_response_text})
+            record_interactions(runner.session_service, runner.app_name, user_id, session_id, entries)
+            if invocation_id:
+                turn.set(invocation_id=invocation_id)
+                close_invocation(invocation_id)
+    finally:
+        ACTIVE_TURNS.dec()
 
-    # Add the agent response to interaction history if we got a final response
-    if final_response_text and agent_name:
-        add_agent_response_to_history(
+    # Display state after processing the message
+    if DISPLAY_STATE:
+        display_state(
             runner.session_service,
             runner.app_name,
             user_id,
             session_id,
-            agent_name,
-            final_response_text,
+            "State AFTER processing",
         )
 
-    # Display state after processing the message
-    display_state(
-        runner.session_service,
-        runner.app_name,
-        user_id,
-        session_id,
-        "State AFTER processing",
-    )
+    # Model calls, tokens and model time of each agent on this turn, and the user's running totals
+    usage = finish_turn(invocation_id) if invocation_id else None
+    if usage:
+        for name, stats in usage["agents"].items():
+            print(
+                f"{Colors.YELLOW}[LLM] {name}: {stats['calls']} calls, {stats['prompt_tokens']} prompt tokens "
+                f"({stats['cached_tokens']} cached), {stats['completion_tokens']} completion tokens, "
+                f"{stats['ms']:.0f} ms{Colors.RESET}"
+            )
+        turn, user = usage["turn"], usage["user"]
+        print(
+            f"{Colors.YELLOW}[LLM] turn: {turn['calls']} calls, "
+            f"{turn['prompt_tokens'] + turn['completion_tokens']} tokens, {turn['ms']:.0f} ms"
+            f"{' (budget reached: ' + usage['breached'] + ')' if usage['breached'] else ''} | "
+            f"user {user_id}: {user['turns']} turns, {user['calls']} calls, "
+            f"{user['prompt_tokens'] + user['completion_tokens']} tokens{Colors.RESET}"
+        )
+
+    # Evict least recently used cache entries if a memory cap is exceeded (rate-limited)
+    enforce_memory_caps()
 
     print(f"{Colors.YELLOW}{'-' * 30}{Colors.RESET}")
     return final_response_text
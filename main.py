@@ -1,35 +1,44 @@
 import asyncio
+import time
+
+_started = time.perf_counter()
 
-# Import the root agent
-######################################### from customer_service_agent.agent import customer_service_agent
-from root_agent.agent import root_agent
-from dotenv import load_dotenv
-from google.adk.runners import Runner
-from google.adk.sessions import DatabaseSessionService
-from helper import add_user_query_to_history, call_agent_async
 import os
-from pinecone import Pinecone, ServerlessSpec
+from dotenv import load_dotenv
+from runtime.startup import configure_debug_logging, warm_up
 
 load_dotenv()
+configure_debug_logging()
+
+# The agent tree (ADK, LiteLLM, Pinecone, numpy, ...) is imported in the
+# background while the user types their ID; main_async waits for it
+warm_up_thread = warm_up()
 
 # ===== PART 1: Initialize Persistent Session Service =====
-# Using SQLite database for persistent storage
+# Using SQLite database for persistent storage, with hot sessions cached in
+# memory and their events written back in the background
 db_url = "sqlite:///./databases/agent_data.db"
-session_service = DatabaseSessionService(db_url=db_url)
+
+
+def create_session_service():
+    from google.adk.sessions import DatabaseSessionService
+    from runtime.session_cache import CachingSessionService
+
+    return CachingSessionService(DatabaseSessionService(db_url=db_url))
 
 
 # ===== PART 2: Initialize Pinecone DB =====
 def init_pinecone_client():
+    from retrieval.pinecone_client import get_index
+
     api_key = os.environ.get("PINECONE_API_KEY")
     if not api_key:
         raise ValueError("Missing PINECONE_API_KEY in environment")
-    
-    pc = Pinecone(api_key=api_key)
-    
+
     return {
-        "movies": pc.Index("movies-list"),
-        "music": pc.Index("music-list"),
-        "products": pc.Index("products-list")
+        "movies": get_index("movies-list"),
+        "music": get_index("music-list"),
+        "products": get_index("products-list")
     }
 
 # ===== PART 3: Define Initial State =====
@@ -43,6 +52,22 @@ initial_state = {
 
 
 async def main_async(userID):
+    waited_ms = warm_up_thread.wait()
+    print(f"[STARTUP] Agents imported in {warm_up_thread.elapsed_ms:.0f} ms ({waited_ms:.0f} ms spent waiting)")
+
+    # Import the root agent
+    ######################################### from customer_service_agent.agent import customer_service_agent
+    from root_agent.agent import root_agent
+    from google.adk.runners import Runner
+    from helper import add_user_query_to_history, call_agent_async
+    from runtime.memory import memory_report
+    from runtime.metrics import METRICS_DUMP_FILE, dump, start_exporters
+    from runtime.profiling import request_profile
+    from runtime.user_context import prefetch_stats, prefetch_user_context
+
+    session_service = create_session_service()
+    start_exporters()
+
     # Setup constants
     APP_NAME = "Inter-domain Recommendation Engine"
     USER_ID = userID
@@ -51,7 +76,7 @@ async def main_async(userID):
     initial_state["step_no"] = 0
     
     # ===== PART 4: Session Management - Find or Create =====
-    # Check for existing sessions for this user
+    # Check for existing sessions for this user (most recently updated first)
     existing_sessions = session_service.list_sessions(
         app_name=APP_NAME,
         user_id=USER_ID,
@@ -72,6 +97,11 @@ async def main_async(userID):
         SESSION_ID = new_session.id
         print(f"Created new session: {SESSION_ID}")
     
+    # ===== PART 4B: Prefetch User Context =====
+    # Activity row, summaries, user vector, index handles and the embedding model
+    # load concurrently in the background while the greeting turn runs
+    prefetch = asyncio.get_running_loop().run_in_executor(None, prefetch_user_context, USER_ID)
+
     # ===== PART 3B: Initialize Pinecone Indices =====
     pinecone_indices = init_pinecone_client()
     # ===== PART 4: Agent Runner Setup =====
@@ -89,17 +119,37 @@ async def main_async(userID):
     # Set the user variable if not already set
     user_input = "Do you know my name, if not ask me to introduce myself"
     await call_agent_async(runner, USER_ID, SESSION_ID, user_input)
+    prefetch_report = await prefetch
+    first_turn = True
 
     while True:
         # Get user input
         user_input = input("You: ")
         # Check if user wants to exit
+        if user_input.strip() == "/profile":
+            request_profile()
+            print("The next turn will be profiled.")
+            continue
+        if user_input.strip() == "/memory":
+            print(memory_report())
+            continue
         if user_input.lower() in ["exit", "quit"]:
+            session_service.flush()
+            print(session_service.report())
+            if METRICS_DUMP_FILE:
+                dump(METRICS_DUMP_FILE)
             print("Ending conversation. Your data has been saved to the database.")
             break
         # Process the user query through the agent
         await call_agent_async(runner, USER_ID, SESSION_ID, user_input)
+        if first_turn:
+            first_turn = False
+            print(
+                f"[PREFETCH] First turn used {prefetch_stats['saved_ms']:.0f} ms of prefetched loads "
+                f"(prefetch took {prefetch_report['wall_ms']:.0f} ms in the background)"
+            )
 
 if __name__ == "__main__":
+    print(f"[STARTUP] Ready in {(time.perf_counter() - _started) * 1000:.0f} ms")
     user_id_input = input("Enter your user ID: ")
     asyncio.run(main_async(userID=user_id_input))
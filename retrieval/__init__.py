@@ -0,0 +1 @@
+"""Local retrieval engine: catalog matrices, precomputed tables and search helpers."""
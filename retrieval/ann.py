@@ -0,0 +1,244 @@
+"""Approximate nearest neighbour search: an IVF index with optional product quantization.
+
+Build:
+    - a coarse quantizer of ``nlist`` centroids (spherical k-means on a sample),
+    - inverted lists: catalog rows grouped by their nearest centroid,
+    - optionally a product quantizer (``pq_m`` sub-spaces x 256 centroids) that
+      stores the residual ``item - centroid`` of every item as ``pq_m`` uint8 codes.
+
+Search probes the ``nprobe`` closest lists. Without PQ the candidates are
+scored exactly against the (memory-mapped) catalog matrix. With PQ they are
+scored as ``query . centroid + query . residual`` from per-query lookup
+tables, and the best ``rerank`` candidates are re-scored exactly. ``nprobe`` and ``rerank`` trade recall for
+latency and can be changed on a loaded index.
+
+The index lives in ``databases/catalog/<domain>/ivf/`` and is loaded with
+``mmap_mode="r"``:
+
+    python -m retrieval.ann product --nlist 4096 --pq-m 48
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from .catalog import CATALOG_DIR, catalog_path, get_catalog, normalize_rows, top_k
+
+NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+RERANK = int(os.getenv("ANN_RERANK", "200"))
+
+
+def kmeans(data, n_clusters, iters=20, spherical=False, seed=0, chunk=65536):
+    """Plain Lloyd's k-means (or spherical k-means on normalised data)."""
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+    for _ in range(iters):
+        labels = assign(data, centroids, spherical, chunk)
+        counts = np.bincount(labels, minlength=n_clusters)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[filled] = np.add.reduceat(data[np.argsort(labels, kind="stable")], starts[filled], axis=0)
+        # Re-seed empty clusters with random points so every list stays usable
+        empty = ~filled
+        sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        counts[empty] = 1
+        centroids = sums / counts[:, None]
+        if spherical:
+            centroids = normalize_rows(centroids)
+    return centroids.astype(np.float32)
+
+
+def assign(data, centroids, spherical=False, chunk=65536):
+    """Index of the nearest centroid of every row (max inner product if spherical)."""
+    labels = np.empty(len(data), dtype=np.int64)
+    c_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(data), chunk):
+        block = np.asarray(data[start:start + chunk], dtype=np.float32)
+        sims = block @ centroids.T
+        if not spherical:
+            sims = 2 * sims - c_norms
+        labels[start:start + chunk] = sims.argmax(axis=1)
+    return labels
+
+
+class IVFIndex:
+    """Inverted-file ANN index over a catalog."""
+
+    def __init__(self, catalog, centroids, offsets, rows, codebooks=None, codes=None, params=None,
+                 nprobe=NPROBE, rerank=RERANK):
+        self.catalog = catalog
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.codebooks = codebooks
+        self.codes = codes
+        self.params = params or {}
+        self.nprobe = nprobe
+        self.rerank = rerank
+
+    @classmethod
+    def build(cls, catalog, nlist=None, pq_m=0, train_size=100000, iters=20, seed=0):
+        """Train the quantizers and fill the inverted lists.
+
+        Args:
+            catalog: Catalog whose (normalised) vectors are indexed.
+            nlist: Number of inverted lists, defaults to ~4 * sqrt(N).
+            pq_m: Number of PQ sub-spaces (must divide 384), 0 disables PQ.
+            train_size: Vectors sampled to train the quantizers.
+            iters: k-means iterations.
+            seed: Random seed.
+        """
+        vectors = catalog.vectors
+        n, dim = vectors.shape
+        nlist = nlist or max(1, min(n, int(4 * np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(vectors[np.sort(rng.choice(n, min(n, train_size), replace=False))])
+
+        started = time.time()
+        centroids = kmeans(sample, nlist, iters, spherical=True, seed=seed)
+        labels = assign(vectors, centroids, spherical=True)
+        rows = np.argsort(labels, kind="stable").astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=nlist))
+
+        codebooks = codes = None
+        if pq_m:
+            if dim % pq_m:
+                raise ValueError(f"pq_m={pq_m} must divide the dimension {dim}")
+            sub = dim // pq_m
+            # 64 training points per codeword are plenty for 256-entry sub-codebooks
+            pq_sample = sample[:256 * 64]
+            residuals = pq_sample - centroids[assign(pq_sample, centroids, spherical=True)]
+            codebooks = np.stack([
+                kmeans(residuals[:, j * sub:(j + 1) * sub], 256, iters, seed=seed + j) for j in range(pq_m)
+            ])
+            codes = np.empty((n, pq_m), dtype=np.uint8)
+            for start in range(0, n, 65536):
+                block = np.asarray(vectors[start:start + 65536]) - centroids[labels[start:start + 65536]]
+                for j in range(pq_m):
+                    codes[start:start + 65536, j] = assign(block[:, j * sub:(j + 1) * sub], codebooks[j])
+
+        params = {
+            "nlist": int(nlist),
+            "pq_m": int(pq_m),
+            "count": int(n),
+            "digest": catalog.digest,
+            "build_seconds": round(time.time() - started, 2),
+        }
+        return cls(catalog, centroids, offsets, rows, codebooks, codes, params)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "centroids.npy"), self.centroids)
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        np.save(os.path.join(path, "rows.npy"), self.rows)
+        if self.codes is not None:
+            np.save(os.path.join(path, "codebooks.npy"), self.codebooks)
+            np.save(os.path.join(path, "codes.npy"), self.codes)
+        with open(os.path.join(path, "params.json"), "w") as f:
+            json.dump(self.params, f, indent=2)
+
+    @classmethod
+    def load(cls, catalog, path, nprobe=NPROBE, rerank=RERANK):
+        """Memory-map a saved index; returns None if missing or built for another catalog."""
+        params_file = os.path.join(path, "params.json")
+        if not os.path.exists(params_file):
+            return None
+        with open(params_file) as f:
+            params = json.load(f)
+        if params.get("digest") != catalog.digest:
+            return None
+
+        def load_array(name):
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        codebooks = codes = None
+        if params.get("pq_m"):
+            codebooks = np.asarray(load_array("codebooks.npy"))
+            codes = load_array("codes.npy")
+        return cls(catalog, np.asarray(load_array("centroids.npy")), np.asarray(load_array("offsets.npy")),
+                   load_array("rows.npy"), codebooks, codes, params, nprobe, rerank)
+
+    def candidates(self, query):
+        """Catalog rows of the ``nprobe`` lists closest to one query.
+
+        Returns:
+            (rows, base) where ``base`` is ``query . centroid`` of each row's list.
+        """
+        nprobe = min(self.nprobe, len(self.centroids))
+        sims = self.centroids @ query
+        probe = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        sizes = self.offsets[probe + 1] - self.offsets[probe]
+        rows = np.concatenate([self.rows[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+        return rows, np.repeat(sims[probe], sizes)
+
+    def search(self, queries, k, exclude_rows=None):
+        """Approximate top-k catalog rows for a (B x 384) batch of normalised queries.
+
+        ``exclude_rows`` is an optional list of B int arrays of rows to skip per query.
+        """
+        out_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            cand, base = self.candidates(query)
+            if exclude_rows is not None and len(exclude_rows[i]):
+                keep = ~np.isin(cand, exclude_rows[i])
+                cand, base = cand[keep], base[keep]
+            if len(cand) == 0:
+                continue
+            if self.codes is None:
+                # Sorted rows keep reads from the memory-mapped matrix sequential
+                cand = np.sort(cand)
+                scores = np.asarray(self.catalog.vectors[cand]) @ query
+            else:
+                scores = self._pq_scores(query, cand, base)
+                if self.rerank:
+                    shortlist, _ = top_k(scores[None, :], max(k, self.rerank))
+                    cand = np.sort(cand[shortlist[0]])
+                    scores = np.asarray(self.catalog.vectors[cand]) @ query
+            order, vals = top_k(scores[None, :], k)
+            out_rows[i, :order.shape[1]] = cand[order[0]]
+            out_scores[i, :order.shape[1]] = vals[0]
+        return out_rows, out_scores
+
+    def _pq_scores(self, query, cand, base):
+        # Asymmetric distance: per-sub-space lookup table of query . codeword
+        m, _, sub = self.codebooks.shape
+        tables = np.einsum("mcs,ms->mc", self.codebooks, query.reshape(m, sub))
+        return base + tables[np.arange(m), np.asarray(self.codes[cand])].sum(axis=1)
+
+    def nbytes(self):
+        """Bytes held by the index structures (excluding the catalog matrix)."""
+        arrays = [self.centroids, self.offsets, self.rows, self.codebooks, self.codes]
+        return int(sum(a.nbytes for a in arrays if a is not None))
+
+
+def ivf_path(domain, root=CATALOG_DIR):
+    return os.path.join(catalog_path(domain, root), "ivf")
+
+
+def load_ivf_index(catalog):
+    """Factory used by ``retrieval.engine`` for the "ivf" mode."""
+    return IVFIndex.load(catalog, ivf_path(catalog.domain))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the IVF(-PQ) index of a local catalog.")
+    parser.add_argument("domain", choices=["movie", "music", "product"])
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--pq-m", type=int, default=0)
+    parser.add_argument("--iters", type=int, default=20)
+    args = parser.parse_args()
+
+    catalog = get_catalog(args.domain)
+    if catalog is None:
+        raise SystemExit(f"No local catalog for {args.domain}; run `python -m retrieval.catalog` first.")
+    index = IVFIndex.build(catalog, nlist=args.nlist, pq_m=args.pq_m, iters=args.iters)
+    index.save(ivf_path(args.domain))
+    print(f"✅ Built IVF index for {args.domain}: {index.params}")
@@ -0,0 +1,102 @@
+"""Micro-batching in front of a local catalog index.
+
+Concurrent callers submit single query vectors; a background thread collects
+them for at most ``max_wait_ms`` (or until ``max_batch_size`` queries are
+waiting) and scores the whole batch with one ``(B x 384) @ (384 x N)``
+multiplication. Each caller gets a ``concurrent.futures.Future`` that resolves
+to its own top-k list.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from .catalog import normalize_rows
+
+
+class BatchScorer:
+    """Collects concurrent queries for one index and scores them together.
+
+    Args:
+        index: Any object with ``catalog`` and ``search(queries, k, exclude_rows) -> (rows, scores)``.
+        max_batch_size: Upper bound on queries scored in one multiplication.
+        max_wait_ms: How long the first query of a batch waits for company.
+    """
+
+    def __init__(self, index, max_batch_size=64, max_wait_ms=2.0):
+        self.index = index
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = {"batches": 0, "queries": 0, "max_batch": 0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, vector, k, exclude_ids=()):
+        """Queue one query.
+
+        Args:
+            vector: 384-dim query vector (any norm).
+            k: Number of results wanted after exclusions.
+            exclude_ids: Item IDs that must not be returned.
+
+        Returns:
+            A Future resolving to a list of (item_id, score), best first.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((np.asarray(vector, dtype=np.float32), k, exclude_ids, future))
+        return future
+
+    def search(self, vector, k, exclude_ids=()):
+        """Blocking convenience wrapper around ``submit``."""
+        return self.submit(vector, k, exclude_ids).result()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="batch-scorer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        # Any failure fails the batch's futures; it must never kill the scoring thread
+        try:
+            catalog = self.index.catalog
+            queries = normalize_rows(np.stack([item[0] for item in batch]))
+            # Exclusions are masked per query, so a long history only affects its own query
+            exclude_rows = [catalog.rows_for(exclude) for _, _, exclude, _ in batch]
+            rows, scores = self.index.search(queries, max(k for _, k, _, _ in batch), exclude_rows)
+
+            results = []
+            for i, (_, k, _, _) in enumerate(batch):
+                found = [(str(catalog.ids[row]), float(score)) for row, score in zip(rows[i], scores[i]) if row >= 0]
+                results.append(found[:k])
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (*_, future), found in zip(batch, results):
+            future.set_result(found)
+
+        self.stats["batches"] += 1
+        self.stats["queries"] += len(batch)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
@@ -0,0 +1,249 @@
+"""Local copies of the catalog indices as memory-mapped NumPy matrices.
+
+Each domain is exported once from Pinecone into ``databases/catalog/<domain>/``:
+
+    ids.npy        item IDs (unicode array, same IDs as in Pinecone)
+    vectors.npy    float32 matrix (N x 384), rows L2-normalised
+    manifest.json  row count, dimension and a digest of the ID order
+    metadata/      item metadata as columns (see ``retrieval.metadata_store``)
+
+Rows are normalised so that a dot product with a normalised query equals the
+cosine score Pinecone would return.
+"""
+
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from .config import CATALOG_DIR, DOMAINS, EMBEDDING_DIM, INDEX_NAMES
+from .pinecone_client import get_index
+
+
+class Catalog:
+    """Item IDs and normalised vectors of one domain."""
+
+    def __init__(self, domain, ids, vectors, manifest=None):
+        self.domain = domain
+        self.ids = ids
+        self.vectors = vectors
+        self.manifest = manifest or {}
+        self._row_of = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def digest(self):
+        return self.manifest.get("digest")
+
+    @property
+    def row_of(self):
+        """Mapping of item ID -> row number, built on first use."""
+        if self._row_of is None:
+            self._row_of = {str(item_id): row for row, item_id in enumerate(self.ids)}
+        return self._row_of
+
+    def rows_for(self, item_ids):
+        """Return the rows of the given item IDs, silently skipping unknown IDs."""
+        row_of = self.row_of
+        rows = [row_of[str(i)] for i in item_ids if str(i) in row_of]
+        return np.asarray(rows, dtype=np.int64)
+
+
+def normalize_rows(matrix):
+    """L2-normalise each row of ``matrix`` (zero rows are left as zeros)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores, k):
+    """Row-wise top-k of a score matrix.
+
+    Args:
+        scores: (B x N) score matrix.
+        k: Number of entries to keep per row.
+
+    Returns:
+        (rows, values), both (B x k), sorted by descending score.
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64), np.empty((scores.shape[0], 0), dtype=scores.dtype)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+def blocked_top_k(queries, vectors, k, exclude_rows=None, item_block=65536, scales=None):
+    """Exact top-k of ``queries @ vectors.T`` without materialising the full score matrix.
+
+    Args:
+        queries: (B x d) normalised query vectors.
+        vectors: (N x d) normalised catalog vectors, may be memory-mapped, float16 or int8.
+        k: Number of results per query.
+        exclude_rows: Optional list of B int arrays with catalog rows to skip per query.
+        item_block: Catalog rows scored at a time; peak memory is B x item_block floats.
+        scales: Optional per-row scales of int8 ``vectors`` (see ``retrieval.quantize``).
+
+    Returns:
+        (rows, scores), both (B x k). Rows are -1 where fewer than k items qualify.
+    """
+    n_queries = queries.shape[0]
+    best_rows = np.empty((n_queries, 0), dtype=np.int64)
+    best_scores = np.empty((n_queries, 0), dtype=np.float32)
+
+    for start in range(0, vectors.shape[0], item_block):
+        chunk = np.asarray(vectors[start:start + item_block], dtype=np.float32)
+        scores = queries @ chunk.T
+        if scales is not None:
+            scores *= scales[start:start + chunk.shape[0]]
+        if exclude_rows is not None:
+            end = start + chunk.shape[0]
+            for q, rows in enumerate(exclude_rows):
+                local = rows[(rows >= start) & (rows < end)] - start
+                scores[q, local] = -np.inf
+        rows, vals = top_k(scores, k)
+
+        merged_rows = np.concatenate([best_rows, rows + start], axis=1)
+        merged_scores = np.concatenate([best_scores, vals], axis=1)
+        order, best_scores = top_k(merged_scores, k)
+        best_rows = np.take_along_axis(merged_rows, order, axis=1)
+
+    best_rows[~np.isfinite(best_scores)] = -1
+    return best_rows, best_scores
+
+
+def ids_digest(ids):
+    """Short digest of an ID sequence, used to detect re-exported catalogs."""
+    h = hashlib.blake2b(digest_size=8)
+    for item_id in ids:
+        h.update(str(item_id).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ExactIndex:
+    """Brute-force cosine search over a catalog matrix."""
+
+    def __init__(self, catalog, item_block=65536):
+        self.catalog = catalog
+        self.item_block = item_block
+
+    def search(self, queries, k, exclude_rows=None):
+        """Top-k catalog rows for a (B x 384) batch of normalised queries."""
+        return blocked_top_k(queries, self.catalog.vectors, k, exclude_rows, self.item_block)
+
+
+def catalog_path(domain, root=CATALOG_DIR):
+    return os.path.join(root, domain)
+
+
+def save_catalog(domain, ids, vectors, root=CATALOG_DIR):
+    """Write a domain's IDs and (normalised) vectors to disk.
+
+    Args:
+        domain: One of "movie", "music", "product".
+        ids: Sequence of item IDs.
+        vectors: (N x 384) array-like of item embeddings, in the same order.
+        root: Catalog directory.
+
+    Returns:
+        The manifest that was written.
+    """
+    path = catalog_path(domain, root)
+    os.makedirs(path, exist_ok=True)
+    ids = np.asarray([str(i) for i in ids])
+    vectors = normalize_rows(vectors)
+    if vectors.shape != (len(ids), EMBEDDING_DIM):
+        raise ValueError(f"Expected {len(ids)} x {EMBEDDING_DIM} vectors, got {vectors.shape}")
+
+    np.save(os.path.join(path, "ids.npy"), ids)
+    np.save(os.path.join(path, "vectors.npy"), vectors)
+    manifest = {
+        "domain": domain,
+        "count": int(len(ids)),
+        "dim": EMBEDDING_DIM,
+        "digest": ids_digest(ids),
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_catalog(domain, root=CATALOG_DIR, mmap=True):
+    """Load a domain's catalog from disk, or return None if it was never exported."""
+    path = catalog_path(domain, root)
+    manifest_file = os.path.join(path, "manifest.json")
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    mmap_mode = "r" if mmap else None
+    ids = np.load(os.path.join(path, "ids.npy"), mmap_mode=mmap_mode)
+    vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mmap_mode)
+    return Catalog(domain, ids, vectors, manifest)
+
+
+@lru_cache(maxsize=None)
+def get_catalog(domain):
+    """Process-wide cached ``load_catalog``; returns None when no local copy exists."""
+    return load_catalog(domain)
+
+
+def export_catalog(domain, batch_size=200, root=CATALOG_DIR):
+    """Copy every vector and its metadata from a domain's Pinecone index to the local catalog.
+
+    Args:
+        domain: One of "movie", "music", "product".
+        batch_size: Number of IDs per fetch call.
+        root: Catalog directory.
+
+    Returns:
+        The manifest of the written catalog.
+    """
+    from .metadata_store import save_metadata
+
+    index = get_index(INDEX_NAMES[domain])
+    all_ids = [item_id for page in index.list() for item_id in page]
+    all_ids.sort()
+
+    vectors = np.zeros((len(all_ids), EMBEDDING_DIM), dtype=np.float32)
+    records = {}
+    for start in range(0, len(all_ids), batch_size):
+        batch = all_ids[start:start + batch_size]
+        response = index.fetch(ids=batch)
+        for offset, item_id in enumerate(batch):
+            vectors[start + offset] = response.vectors[item_id].values
+            records[item_id] = response.vectors[item_id].metadata or {}
+        print(f"[EXPORT] {domain}: {min(start + batch_size, len(all_ids))}/{len(all_ids)}")
+
+    manifest = save_catalog(domain, all_ids, vectors, root)
+    save_metadata(load_catalog(domain, root), records, root)
+    return manifest
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export catalog indices from Pinecone to local NumPy files.")
+    parser.add_argument("domains", nargs="*", default=list(DOMAINS), choices=DOMAINS)
+    parser.add_argument("--projection-dim", type=int, default=96,
+                        help="dimension of the two-stage search projection (0 to skip)")
+    parser.add_argument("--projection-method", choices=["pca", "random"], default="pca")
+    args = parser.parse_args()
+
+    from .projection import build_projection
+
+    for name in args.domains:
+        print(f"✅ Exported {name}: {export_catalog(name)}")
+        if args.projection_dim:
+            catalog = load_catalog(name)
+            print(f"✅ Projection for {name}: {build_projection(catalog, args.projection_dim, args.projection_method)}")
@@ -0,0 +1,52 @@
+"""Shared constants for the local retrieval engine.
+
+The layout mirrors what the agents already assume: three 384-dim catalog
+indices in Pinecone and a 1536-dim user vector made of four 384-dim slices
+``[movie_emb, music_emb, product_emb, collective_emb]``. How the slices are
+stored is up to ``retrieval.user_store``.
+"""
+
+import os
+
+DOMAINS = ("movie", "music", "product")
+EMBEDDING_DIM = 384
+
+# Slices of the user vector, one per domain plus the collective one, in concatenation order
+SLICE_NAMES = DOMAINS + ("collective",)
+USER_VECTOR_DIM = len(SLICE_NAMES) * EMBEDDING_DIM
+
+# Offsets of each 384-dim slice inside the concatenated user vector
+SLICES = {name: slice(i * EMBEDDING_DIM, (i + 1) * EMBEDDING_DIM) for i, name in enumerate(SLICE_NAMES)}
+
+INDEX_NAMES = {
+    "movie": "movies-list",
+    "music": "music-list",
+    "product": "products-list",
+}
+USER_INDEX_NAME = "user-preference-vector"
+
+# Metadata field holding the exact title an item is looked up by
+TITLE_FIELDS = {
+    "movie": "original_title",
+    "music": "track_name",
+    "product": "title",
+}
+
+# user_activity column holding the consumed item IDs of each domain
+ACTIVITY_FIELDS = {
+    "movie": "movies_watched",
+    "music": "listened_music",
+    "product": "products_purchased",
+}
+
+USER_ACTIVITY_DB = os.getenv(
+    "USER_ACTIVITY_DB", "D:/GoogleADK_ProjectWork/databases/user_activity.db"
+)
+
+# Local artifacts (catalog matrices, precomputed tables, ...) live next to the SQLite files
+DATA_DIR = os.getenv(
+    "RECSYS_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "databases"),
+)
+CATALOG_DIR = os.path.join(DATA_DIR, "catalog")
+PRECOMPUTED_DIR = os.path.join(DATA_DIR, "precomputed")
@@ -0,0 +1,14 @@
+"""Process-wide sentence embedding model (384-dim, matching the catalog indices)."""
+
+import os
+from functools import lru_cache
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+
+@lru_cache(maxsize=1)
+def get_embedding_model():
+    """Return the shared SentenceTransformer, loaded on first use."""
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(EMBEDDING_MODEL)
@@ -0,0 +1,64 @@
+"""Per-domain selection of the local retrieval engine.
+
+``RETRIEVAL_MODES`` picks the index type per domain, e.g.
+``RETRIEVAL_MODES="movie=exact,product=pinecone"``. Domains set to
+"pinecone", or without an exported catalog, keep querying Pinecone directly.
+"""
+
+import os
+import threading
+
+from .ann import load_ivf_index
+from .batching import BatchScorer
+from .catalog import ExactIndex, get_catalog
+from .projection import load_two_stage_index
+from .quantize import quantized_index_factory
+
+# mode name -> factory(catalog) returning an index with ``search(queries, k, exclude_rows)``,
+# or None when the index has not been built for this catalog
+INDEX_TYPES = {
+    "exact": ExactIndex,
+    "ivf": load_ivf_index,
+    "int8": quantized_index_factory("int8"),
+    "fp16": quantized_index_factory("fp16"),
+    "two_stage": load_two_stage_index,
+}
+
+DEFAULT_MODE = os.getenv("RETRIEVAL_DEFAULT_MODE", "exact")
+BATCH_SIZE = int(os.getenv("RETRIEVAL_BATCH_SIZE", "64"))
+MAX_WAIT_MS = float(os.getenv("RETRIEVAL_MAX_WAIT_MS", "2"))
+
+_scorers = {}
+_lock = threading.Lock()
+
+
+def configured_modes():
+    """Parse ``RETRIEVAL_MODES`` into {domain: mode}."""
+    modes = {}
+    for entry in os.getenv("RETRIEVAL_MODES", "").split(","):
+        if "=" in entry:
+            domain, mode = entry.split("=", 1)
+            modes[domain.strip()] = mode.strip()
+    return modes
+
+
+def mode_for(domain, overrides=None):
+    """Retrieval mode of a domain; ``overrides`` (e.g. from session state) win over the environment."""
+    if overrides and domain in overrides:
+        return overrides[domain]
+    return configured_modes().get(domain, DEFAULT_MODE)
+
+
+def get_scorer(domain, mode=None):
+    """Shared BatchScorer for (domain, mode), or None if the domain must use Pinecone."""
+    mode = mode or mode_for(domain)
+    if mode not in INDEX_TYPES:
+        return None
+    key = (domain, mode)
+    if key not in _scorers:
+        with _lock:
+            if key not in _scorers:
+                catalog = get_catalog(domain)
+                index = INDEX_TYPES[mode](catalog) if catalog is not None else None
+                _scorers[key] = BatchScorer(index, BATCH_SIZE, MAX_WAIT_MS) if index is not None else None
+    return _scorers[key]
@@ -0,0 +1,186 @@
+"""Local columnar store of catalog metadata, keyed by catalog row.
+
+Written next to each catalog in ``databases/catalog/<domain>/metadata/``:
+
+    <field>.npy                  typed column (float64 / int64 / bool)
+    <field>.missing.npy          bool mask of the rows without a value in that column
+    <field>.offsets.npy          int64 (N + 1) byte offsets of a string column
+    <field>.heap.bin             UTF-8 bytes of all values of that string column
+    schema.json                  field -> type, plus the catalog digest
+
+Everything is memory-mapped, so retrieval can ask Pinecone for IDs and scores
+only and hydrate just the final top-k items, and only the fields a caller needs.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from .catalog import CATALOG_DIR, catalog_path, get_catalog
+
+# Metadata uploaded by the index-generation notebooks
+SCHEMAS = {
+    "movie": {
+        "title": "str",
+        "original_title": "str",
+        "overview": "str",
+        "tagline": "str",
+        "genres": "str",
+        "keywords": "str",
+        "release_date": "str",
+        "vote_average": "float64",
+        "popularity": "float64",
+    },
+    "music": {
+        "track_name": "str",
+        "artists": "str",
+        "album_name": "str",
+        "track_genre": "str",
+        "popularity": "float64",
+        "explicit": "bool",
+        "duration_ms": "int64",
+    },
+    "product": {
+        "title": "str",
+        "stars": "float64",
+        "reviews": "int64",
+        "price": "float64",
+        "listPrice": "float64",
+        "category": "str",
+        "isBestSeller": "bool",
+        "boughtInLastMonth": "int64",
+    },
+}
+
+# Fields the recommendation agent presents for each domain
+RECOMMENDATION_FIELDS = {
+    "movie": ["title", "genres", "release_date", "tagline"],
+    "music": ["track_name", "artists", "album_name", "track_genre"],
+    "product": ["title", "category", "price", "stars"],
+}
+
+
+def metadata_path(domain, root=CATALOG_DIR):
+    return os.path.join(catalog_path(domain, root), "metadata")
+
+
+def save_metadata(catalog, records, root=CATALOG_DIR):
+    """Write the metadata of every catalog row.
+
+    Args:
+        catalog: Catalog whose row order the columns follow.
+        records: {item_id: metadata dict} as returned by Pinecone.
+        root: Catalog directory.
+    """
+    schema = SCHEMAS[catalog.domain]
+    path = metadata_path(catalog.domain, root)
+    os.makedirs(path, exist_ok=True)
+    rows = [records.get(str(item_id), {}) for item_id in catalog.ids]
+
+    for field, kind in schema.items():
+        values = [r.get(field) for r in rows]
+        if kind == "str":
+            encoded = [("" if v is None else str(v)).encode("utf-8") for v in values]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(e) for e in encoded])
+            np.save(os.path.join(path, f"{field}.offsets.npy"), offsets)
+            with open(os.path.join(path, f"{field}.heap.bin"), "wb") as f:
+                f.write(b"".join(encoded))
+        else:
+            missing = np.asarray([v is None for v in values], dtype=bool)
+            column = np.asarray([0 if v is None else v for v in values]).astype(kind)
+            np.save(os.path.join(path, f"{field}.npy"), column)
+            np.save(os.path.join(path, f"{field}.missing.npy"), missing)
+
+    with open(os.path.join(path, "schema.json"), "w") as f:
+        json.dump({"fields": schema, "digest": catalog.digest}, f, indent=2)
+
+
+class MetadataStore:
+    """Memory-mapped columns of one domain."""
+
+    def __init__(self, catalog, path, schema):
+        self.catalog = catalog
+        self.path = path
+        self.schema = schema
+        self._columns = {}
+
+    @classmethod
+    def load(cls, catalog, root=CATALOG_DIR):
+        path = metadata_path(catalog.domain, root)
+        schema_file = os.path.join(path, "schema.json")
+        if not os.path.exists(schema_file):
+            return None
+        with open(schema_file) as f:
+            schema = json.load(f)
+        if schema.get("digest") != catalog.digest:
+            return None
+        return cls(catalog, path, schema["fields"])
+
+    def _column(self, field):
+        # Columns are opened on first use so unused fields cost nothing
+        if field not in self._columns:
+            if self.schema[field] == "str":
+                offsets = np.load(os.path.join(self.path, f"{field}.offsets.npy"), mmap_mode="r")
+                heap_file = os.path.join(self.path, f"{field}.heap.bin")
+                heap = np.memmap(heap_file, dtype=np.uint8, mode="r") if os.path.getsize(heap_file) else b""
+                self._columns[field] = (offsets, heap)
+            else:
+                values = np.load(os.path.join(self.path, f"{field}.npy"), mmap_mode="r")
+                missing_file = os.path.join(self.path, f"{field}.missing.npy")
+                # Stores exported before the masks existed have no missing values on record
+                missing = np.load(missing_file, mmap_mode="r") if os.path.exists(missing_file) else None
+                self._columns[field] = (values, missing)
+        return self._columns[field]
+
+    def column(self, field):
+        """Whole numeric column as (values, missing mask); missing rows hold 0 in ``values``."""
+        if self.schema[field] == "str":
+            raise ValueError(f"{field} is a string column")
+        values, missing = self._column(field)
+        return np.asarray(values), np.zeros(len(values), dtype=bool) if missing is None else np.asarray(missing)
+
+    def value(self, row, field):
+        """Value of one cell; None for a missing number."""
+        column = self._column(field)
+        if self.schema[field] == "str":
+            offsets, heap = column
+            return bytes(heap[offsets[row]:offsets[row + 1]]).decode("utf-8")
+        values, missing = column
+        if missing is not None and missing[row]:
+            return None
+        if values.dtype == np.float32:
+            # Older exports stored float32; its shortest repr is the value that was exported
+            return float(str(values[row]))
+        return values[row].item()
+
+    def record(self, item_id, fields=None):
+        """Metadata dict of one item (all schema fields by default), or None if unknown."""
+        row = self.catalog.row_of.get(str(item_id))
+        if row is None:
+            return None
+        return {field: self.value(row, field) for field in fields or self.schema}
+
+    def records(self, item_ids, fields=None):
+        """Metadata dicts for the given IDs, in order; unknown IDs are skipped."""
+        found = (self.record(item_id, fields) for item_id in item_ids)
+        return [record for record in found if record is not None]
+
+    @property
+    def nbytes(self):
+        total = 0
+        for name in os.listdir(self.path):
+            total += os.path.getsize(os.path.join(self.path, name))
+        return total
+
+
+_stores = {}
+
+
+def get_metadata_store(domain):
+    """Process-wide cached store of a domain, or None if it has not been exported."""
+    if domain not in _stores:
+        catalog = get_catalog(domain)
+        _stores[domain] = MetadataStore.load(catalog) if catalog is not None else None
+    return _stores[domain]
@@ -0,0 +1,159 @@
+"""Precomputed item-to-item neighbour tables, within and across domains.
+
+For every item of every domain the job stores its top-N neighbours in each of
+the three catalogs (movie->movies, movie->music, movie->products, ...) in
+``databases/neighbours/``:
+
+    <src>_to_<dst>_rows.npy     int32 (N_src x N) rows of the destination catalog, -1 = none
+    <src>_to_<dst>_scores.npy   float16 (N_src x N) cosine scores
+    manifest.json               N and the digest of each catalog used
+
+Same-domain tables never list the item itself. Serving "Because you just
+watched X" is then an O(1) row lookup instead of a vector search.
+
+    python -m retrieval.neighbours --n 10
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from .catalog import CATALOG_DIR, ExactIndex, load_catalog
+from .config import DATA_DIR, DOMAINS
+
+NEIGHBOURS_DIR = os.path.join(DATA_DIR, "neighbours")
+
+
+def build_neighbour_tables(n=10, block=1024, catalog_root=CATALOG_DIR, out_dir=NEIGHBOURS_DIR):
+    """Compute and store the neighbour tables for every (source, destination) pair.
+
+    Args:
+        n: Neighbours kept per item and destination domain.
+        block: Source items scored per matrix multiplication.
+        catalog_root: Directory of the local catalogs.
+        out_dir: Output directory of the tables.
+
+    Returns:
+        The manifest of the written tables.
+    """
+    catalogs = {d: load_catalog(d, catalog_root) for d in DOMAINS}
+    catalogs = {d: c for d, c in catalogs.items() if c is not None}
+    if not catalogs:
+        raise RuntimeError(f"No local catalogs found in {catalog_root}; run `python -m retrieval.catalog` first.")
+
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.time()
+    for src, src_catalog in catalogs.items():
+        for dst, dst_catalog in catalogs.items():
+            index = ExactIndex(dst_catalog)
+            rows_out = np.lib.format.open_memmap(
+                os.path.join(out_dir, f"{src}_to_{dst}_rows.npy"), mode="w+", dtype=np.int32, shape=(len(src_catalog), n)
+            )
+            scores_out = np.lib.format.open_memmap(
+                os.path.join(out_dir, f"{src}_to_{dst}_scores.npy"), mode="w+", dtype=np.float16, shape=(len(src_catalog), n)
+            )
+            for start in range(0, len(src_catalog), block):
+                queries = np.asarray(src_catalog.vectors[start:start + block], dtype=np.float32)
+                exclude = None
+                if src == dst:
+                    exclude = [np.array([row]) for row in range(start, start + len(queries))]
+                rows, scores = index.search(queries, n, exclude)
+                rows_out[start:start + len(queries)] = rows
+                scores_out[start:start + len(queries)] = np.where(rows >= 0, scores, 0)
+            rows_out.flush()
+            scores_out.flush()
+            print(f"[NEIGHBOURS] {src} -> {dst}: {len(src_catalog)} items")
+
+    manifest = {
+        "n": n,
+        "catalogs": {d: c.digest for d, c in catalogs.items()},
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "seconds": round(time.time() - started, 2),
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class NeighbourTable:
+    """Read side of the neighbour tables, memory-mapped."""
+
+    def __init__(self, manifest, catalogs, tables):
+        self.manifest = manifest
+        self.catalogs = catalogs
+        self.tables = tables
+
+    @classmethod
+    def load(cls, path=NEIGHBOURS_DIR, catalog_root=CATALOG_DIR):
+        manifest_file = os.path.join(path, "manifest.json")
+        if not os.path.exists(manifest_file):
+            return None
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+        catalogs = {}
+        for domain, digest in manifest["catalogs"].items():
+            catalog = load_catalog(domain, catalog_root)
+            if catalog is not None and catalog.digest == digest:
+                catalogs[domain] = catalog
+
+        tables = {
+            (src, dst): (
+                np.load(os.path.join(path, f"{src}_to_{dst}_rows.npy"), mmap_mode="r"),
+                np.load(os.path.join(path, f"{src}_to_{dst}_scores.npy"), mmap_mode="r"),
+            )
+            for src in catalogs
+            for dst in catalogs
+        }
+        return cls(manifest, catalogs, tables)
+
+    def lookup(self, src_domain, item_id, dst_domain, exclude_ids=(), top_n=None):
+        """Neighbours of one item in a destination domain.
+
+        Returns:
+            List of (item_id, score), best first; empty if the item or domain is unknown.
+        """
+        table = self.tables.get((src_domain, dst_domain))
+        if table is None:
+            return []
+        row = self.catalogs[src_domain].row_of.get(str(item_id))
+        if row is None:
+            return []
+        rows, scores = table
+        dst_ids = self.catalogs[dst_domain].ids
+        exclude = {str(i) for i in exclude_ids}
+        results = []
+        for r, s in zip(rows[row], scores[row]):
+            if r < 0 or str(dst_ids[r]) in exclude:
+                continue
+            results.append((str(dst_ids[r]), float(s)))
+            if top_n is not None and len(results) == top_n:
+                break
+        return results
+
+
+_table_cache = {"mtime": None, "table": None}
+
+
+def get_neighbour_table(path=NEIGHBOURS_DIR):
+    """Return the current neighbour tables, reloading them after a rebuild."""
+    try:
+        mtime = os.path.getmtime(os.path.join(path, "manifest.json"))
+    except OSError:
+        return None
+    if _table_cache["mtime"] != mtime:
+        _table_cache["table"] = NeighbourTable.load(path)
+        _table_cache["mtime"] = mtime
+    return _table_cache["table"]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute item-to-item neighbour tables.")
+    parser.add_argument("--n", type=int, default=10)
+    parser.add_argument("--block", type=int, default=1024)
+    args = parser.parse_args()
+    print(f"✅ Neighbour tables written: {build_neighbour_tables(args.n, args.block)}")
@@ -0,0 +1,25 @@
+"""Process-wide Pinecone client and index handles."""
+
+import os
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def get_client():
+    """Return the shared Pinecone client, created on first use."""
+    from pinecone import Pinecone
+
+    return Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+
+
+@lru_cache(maxsize=None)
+def get_index(index_name: str):
+    """Return a cached handle to a Pinecone index.
+
+    Args:
+        index_name: Name of the index, e.g. "movies-list".
+
+    Returns:
+        The Pinecone Index object.
+    """
+    return get_client().Index(index_name)
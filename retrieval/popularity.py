@@ -0,0 +1,180 @@
+"""Precomputed per-domain popularity lists, served to cold-start users.
+
+A new user's vector is the near-zero random vector of
+``initialize_user_vector``, so a similarity search with it returns arbitrary
+items. Until the user has activity in a domain, recommendations for that
+domain come from these lists instead, without any vector search.
+
+The batch job ranks every catalog item from its local metadata columns
+(``retrieval.metadata_store``). Each field is turned into a percentile rank,
+so fields on different scales combine, and the ranks are blended with
+``WEIGHTS``:
+
+- movies: TMDB ``popularity`` (a recency-weighted trending score) and ``vote_average``;
+- music: Spotify ``popularity``;
+- products: ``boughtInLastMonth`` and ``stars``, plus a bonus for ``isBestSeller``.
+
+The top ``n`` rows per domain are written to ``databases/popular/``:
+
+    <domain>_rows.npy     int32 catalog rows, most popular first
+    <domain>_scores.npy   float32 blended scores
+    manifest.json         n, weights and the digest of each catalog used
+
+Refresh it with the catalog exports, e.g. nightly next to ``retrieval.precompute``:
+
+    python -m retrieval.popularity --n 200
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from .catalog import CATALOG_DIR, load_catalog
+from .config import DATA_DIR, DOMAINS
+from .metadata_store import MetadataStore
+
+POPULAR_DIR = os.path.join(DATA_DIR, "popular")
+
+# domain -> {metadata field: weight of its percentile rank}
+WEIGHTS = {
+    "movie": {"popularity": 0.6, "vote_average": 0.4},
+    "music": {"popularity": 1.0},
+    "product": {"boughtInLastMonth": 0.7, "stars": 0.3, "isBestSeller": 0.25},
+}
+
+
+def percentile_rank(values):
+    """Rank of each value in [0, 1] (ties share the lowest rank); a constant column ranks 0."""
+    values = np.asarray(values, dtype=np.float64)
+    if values.size < 2:
+        return np.zeros(values.size)
+    order = np.sort(values)
+    return np.searchsorted(order, values, side="left") / (values.size - 1)
+
+
+def popularity_scores(store, weights):
+    """Blended popularity score of every catalog row of a metadata store."""
+    scores = np.zeros(len(store.catalog), dtype=np.float64)
+    for field, weight in weights.items():
+        if field not in store.schema:
+            continue
+        values, missing = store.column(field)
+        # Items without a value rank lowest on that field and do not shift the ranks of the others
+        ranks = np.zeros(values.size)
+        if store.schema[field] == "bool":
+            ranks[~missing] = values[~missing]
+        else:
+            ranks[~missing] = percentile_rank(values[~missing])
+        scores += weight * ranks
+    return scores
+
+
+def build_popularity_lists(n=200, catalog_root=CATALOG_DIR, out_dir=POPULAR_DIR, weights=WEIGHTS):
+    """Rank every exported catalog and store its ``n`` most popular rows."""
+    started = time.time()
+    os.makedirs(out_dir, exist_ok=True)
+    catalogs = {}
+    for domain in DOMAINS:
+        catalog = load_catalog(domain, catalog_root)
+        store = MetadataStore.load(catalog, catalog_root) if catalog is not None else None
+        if store is None:
+            print(f"[SKIP] No local catalog metadata for {domain}")
+            continue
+        scores = popularity_scores(store, weights[domain])
+        top = min(n, scores.size)
+        rows = np.argpartition(-scores, top - 1)[:top] if top else np.empty(0, dtype=np.int64)
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        np.save(os.path.join(out_dir, f"{domain}_rows.npy"), rows.astype(np.int32))
+        np.save(os.path.join(out_dir, f"{domain}_scores.npy"), scores[rows].astype(np.float32))
+        catalogs[domain] = catalog.digest
+
+    manifest = {
+        "n": n,
+        "weights": {domain: weights[domain] for domain in catalogs},
+        "catalogs": catalogs,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "seconds": round(time.time() - started, 2),
+    }
+    # The manifest is written last so readers never see half-written lists
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class PopularityLists:
+    """Read side of the popularity lists."""
+
+    def __init__(self, manifest, catalogs, lists):
+        self.manifest = manifest
+        self.catalogs = catalogs
+        self.lists = lists
+
+    @classmethod
+    def load(cls, path=POPULAR_DIR, catalog_root=CATALOG_DIR):
+        manifest_file = os.path.join(path, "manifest.json")
+        if not os.path.exists(manifest_file):
+            return None
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+        catalogs, lists = {}, {}
+        for domain, digest in manifest["catalogs"].items():
+            catalog = load_catalog(domain, catalog_root)
+            # Rows only make sense against the exact catalog they were ranked on
+            if catalog is None or catalog.digest != digest:
+                continue
+            catalogs[domain] = catalog
+            lists[domain] = (
+                np.load(os.path.join(path, f"{domain}_rows.npy")),
+                np.load(os.path.join(path, f"{domain}_scores.npy")),
+            )
+        return cls(manifest, catalogs, lists)
+
+    def __contains__(self, domain):
+        return domain in self.lists
+
+    def lookup(self, domain, exclude_ids=(), top_n=None):
+        """Most popular items of a domain not in ``exclude_ids``.
+
+        Returns:
+            List of (item_id, score), most popular first; empty if the domain is not covered.
+        """
+        if domain not in self.lists:
+            return []
+        rows, scores = self.lists[domain]
+        ids = self.catalogs[domain].ids
+        exclude = {str(i) for i in exclude_ids}
+        results = []
+        for r, s in zip(rows, scores):
+            if str(ids[r]) in exclude:
+                continue
+            results.append((str(ids[r]), float(s)))
+            if top_n is not None and len(results) == top_n:
+                break
+        return results
+
+
+_table_cache = {"mtime": None, "table": None}
+
+
+def get_popularity_lists(path=POPULAR_DIR):
+    """Return the current popularity lists, reloading them after the batch job rewrote them."""
+    try:
+        mtime = os.path.getmtime(os.path.join(path, "manifest.json"))
+    except OSError:
+        return None
+    if _table_cache["mtime"] != mtime:
+        _table_cache["table"] = PopularityLists.load(path)
+        _table_cache["mtime"] = mtime
+    return _table_cache["table"]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute per-domain popularity lists for cold-start users.")
+    parser.add_argument("--n", type=int, default=200)
+    args = parser.parse_args()
+    print(f"✅ Popularity lists written: {build_popularity_lists(args.n)}")
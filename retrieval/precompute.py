@@ -0,0 +1,266 @@
+"""Nightly batch precomputation of per-user top-k recommendations.
+
+The job loads every user vector from the "user-preference-vector" index and
+the local catalog matrices (see ``retrieval.catalog``), scores all users
+against every domain with blocked matrix multiplications and stores the
+per-user top-k rows in ``databases/precomputed/``:
+
+    users.npy                      user IDs
+    versions.npy                   ``vector_version`` of the vector that was scored
+    <domain>_<source>_rows.npy     int32 (U x K) catalog rows, -1 = no candidate
+    <domain>_<source>_scores.npy   float16 (U x K) cosine scores
+    manifest.json                  K and the digest of each catalog used
+
+``source`` is "domain" (the domain slice of the user vector) or "collective".
+The online path in ``get_recommendations_based_on_activity`` serves from this
+table as long as the user's vector version is unchanged.
+
+Usage:
+    python -m retrieval.precompute --workers 8
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .catalog import CATALOG_DIR, ExactIndex, load_catalog, normalize_rows
+from .config import DOMAINS, PRECOMPUTED_DIR, SLICES
+from .quantize import RERANK, QuantizedIndex, load_quantized
+from .user_vectors import fetch_all_user_vectors, load_all_activity, vector_version
+
+SOURCES = ("domain", "collective")
+
+# get_recommendations_based_on_activity never asks for more than 3 items per
+# (domain, source); the spare candidates absorb items consumed after the run.
+SERVED_K = 3
+SPARE_K = 12
+
+
+_worker_indexes = {}
+
+
+def _init_worker(catalog_root, item_block, quantization, rerank):
+    # Catalogs are memory-mapped, so every worker shares the same page cache
+    for domain in DOMAINS:
+        catalog = load_catalog(domain, catalog_root)
+        if catalog is None:
+            continue
+        quantized = load_quantized(catalog, quantization, catalog_root) if quantization else None
+        if quantized is not None:
+            _worker_indexes[domain] = QuantizedIndex(catalog, quantized, rerank, item_block)
+        else:
+            _worker_indexes[domain] = ExactIndex(catalog, item_block)
+
+
+def _score_user_block(user_block, exclude_rows, k):
+    """Score one block of users against every domain (runs inside a worker)."""
+    collective = normalize_rows(user_block[:, SLICES["collective"]])
+    results = {}
+    for domain, index in _worker_indexes.items():
+        queries = {
+            "domain": normalize_rows(user_block[:, SLICES[domain]]),
+            "collective": collective,
+        }
+        for source in SOURCES:
+            results[(domain, source)] = index.search(queries[source], k, exclude_rows[domain])
+    return results
+
+
+def build_precomputed_table(
+    user_ids,
+    user_matrix,
+    activity,
+    k=SERVED_K + SPARE_K,
+    user_block=1024,
+    item_block=65536,
+    workers=None,
+    catalog_root=CATALOG_DIR,
+    out_dir=PRECOMPUTED_DIR,
+    versions=None,
+    quantization=None,
+    rerank=RERANK,
+):
+    """Compute and store the top-k table for every user.
+
+    Args:
+        user_ids: List of user IDs.
+        user_matrix: (U x 1536) float32 user vectors, same order as user_ids.
+        activity: {user_id: {domain: set of consumed item IDs}} used as exclusions.
+        k: Candidates kept per (user, domain, source).
+        user_block: Users per task; each task holds user_block x item_block scores.
+        item_block: Catalog rows scored per matrix multiplication.
+        workers: Process pool size (defaults to the CPU count).
+        catalog_root: Directory of the local catalogs.
+        out_dir: Output directory of the table.
+        versions: ``vector_version`` of each user, required when user_matrix is
+            a lossy (e.g. float16) copy; computed from user_matrix otherwise.
+        quantization: "int8" or "fp16" to score against the quantized catalogs
+            (domains without a quantized copy use float32).
+        rerank: Candidates re-scored exactly when scoring quantized data.
+
+    Returns:
+        The manifest of the written table.
+    """
+    catalogs = {d: load_catalog(d, catalog_root) for d in DOMAINS}
+    catalogs = {d: c for d, c in catalogs.items() if c is not None}
+    if not catalogs:
+        raise RuntimeError(f"No local catalogs found in {catalog_root}; run `python -m retrieval.catalog` first.")
+
+    n_users = len(user_ids)
+    outputs = {
+        (d, s): (np.full((n_users, k), -1, dtype=np.int32), np.zeros((n_users, k), dtype=np.float16))
+        for d in catalogs
+        for s in SOURCES
+    }
+
+    tasks = []
+    for start in range(0, n_users, user_block):
+        block_ids = user_ids[start:start + user_block]
+        exclude_rows = {
+            d: [catalog.rows_for(activity.get(u, {}).get(d, ())) for u in block_ids]
+            for d, catalog in catalogs.items()
+        }
+        tasks.append((start, user_matrix[start:start + user_block], exclude_rows))
+
+    started = time.time()
+    init_args = (catalog_root, item_block, quantization, rerank)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+        futures = [
+            (start, pool.submit(_score_user_block, block, exclude_rows, k))
+            for start, block, exclude_rows in tasks
+        ]
+        for start, future in futures:
+            for key, (rows, scores) in future.result().items():
+                end = start + rows.shape[0]
+                width = rows.shape[1]
+                outputs[key][0][start:end, :width] = rows
+                outputs[key][1][start:end, :width] = np.where(rows >= 0, scores, 0)
+            print(f"[PRECOMPUTE] {min(start + user_block, n_users)}/{n_users} users")
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "users.npy"), np.asarray(user_ids))
+    if versions is None:
+        versions = [vector_version(v) for v in user_matrix]
+    np.save(os.path.join(out_dir, "versions.npy"), np.asarray(versions))
+    for (domain, source), (rows, scores) in outputs.items():
+        np.save(os.path.join(out_dir, f"{domain}_{source}_rows.npy"), rows)
+        np.save(os.path.join(out_dir, f"{domain}_{source}_scores.npy"), scores)
+
+    manifest = {
+        "k": k,
+        "users": n_users,
+        "catalogs": {d: c.digest for d, c in catalogs.items()},
+        "quantization": quantization,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "seconds": round(time.time() - started, 2),
+    }
+    # The manifest is written last so readers never see a half-written table
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class PrecomputedTable:
+    """Read side of the precomputed table, memory-mapped."""
+
+    def __init__(self, path, manifest, users, versions, columns, catalogs):
+        self.path = path
+        self.manifest = manifest
+        self.versions = versions
+        self.columns = columns
+        self.catalogs = catalogs
+        self.row_of_user = {str(u): i for i, u in enumerate(users)}
+
+    @classmethod
+    def load(cls, path=PRECOMPUTED_DIR, catalog_root=CATALOG_DIR):
+        """Load the table, or return None if it does not exist."""
+        manifest_file = os.path.join(path, "manifest.json")
+        if not os.path.exists(manifest_file):
+            return None
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+        columns, catalogs = {}, {}
+        for domain, digest in manifest["catalogs"].items():
+            catalog = load_catalog(domain, catalog_root)
+            # Rows only make sense against the exact catalog they were computed on
+            if catalog is None or catalog.digest != digest:
+                continue
+            catalogs[domain] = catalog
+            for source in SOURCES:
+                columns[(domain, source)] = (
+                    np.load(os.path.join(path, f"{domain}_{source}_rows.npy"), mmap_mode="r"),
+                    np.load(os.path.join(path, f"{domain}_{source}_scores.npy"), mmap_mode="r"),
+                )
+        users = np.load(os.path.join(path, "users.npy"))
+        versions = np.load(os.path.join(path, "versions.npy"))
+        return cls(path, manifest, users, versions, columns, catalogs)
+
+    def lookup(self, user_id, version, domain, source):
+        """Precomputed candidates for one (user, domain, source).
+
+        Returns:
+            List of (item_id, score) pairs, best first, or None when the user is
+            unknown, the vector version changed or the domain is not covered.
+        """
+        row = self.row_of_user.get(str(user_id))
+        if row is None or self.versions[row] != version or (domain, source) not in self.columns:
+            return None
+        rows, scores = self.columns[(domain, source)]
+        ids = self.catalogs[domain].ids
+        return [(str(ids[r]), float(s)) for r, s in zip(rows[row], scores[row]) if r >= 0]
+
+
+_table_cache = {"mtime": None, "table": None}
+
+
+def get_precomputed_table(path=PRECOMPUTED_DIR):
+    """Return the current table, reloading it when the nightly job rewrote it."""
+    manifest_file = os.path.join(path, "manifest.json")
+    try:
+        mtime = os.path.getmtime(manifest_file)
+    except OSError:
+        return None
+    if _table_cache["mtime"] != mtime:
+        _table_cache["table"] = PrecomputedTable.load(path)
+        _table_cache["mtime"] = mtime
+    return _table_cache["table"]
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute top-k recommendations for all users.")
+    parser.add_argument("--k", type=int, default=SERVED_K + SPARE_K)
+    parser.add_argument("--user-block", type=int, default=1024)
+    parser.add_argument("--item-block", type=int, default=65536)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--quantization", choices=["int8", "fp16"], default=None,
+                        help="score against quantized catalogs and keep user vectors in float16")
+    parser.add_argument("--rerank", type=int, default=RERANK)
+    args = parser.parse_args()
+
+    dtype = np.float16 if args.quantization else np.float32
+    user_ids, user_matrix, versions = fetch_all_user_vectors(dtype=dtype)
+    activity = load_all_activity()
+    print(f"[INFO] Loaded {len(user_ids)} user vectors and {len(activity)} activity rows")
+    manifest = build_precomputed_table(
+        user_ids,
+        user_matrix,
+        activity,
+        k=args.k,
+        user_block=args.user_block,
+        item_block=args.item_block,
+        workers=args.workers,
+        versions=versions,
+        quantization=args.quantization,
+        rerank=args.rerank,
+    )
+    print(f"✅ Precomputed table written: {manifest}")
+
+
+if __name__ == "__main__":
+    main()
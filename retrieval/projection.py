@@ -0,0 +1,139 @@
+"""Two-stage retrieval: reduced-dimension candidate search, full-dimension re-rank.
+
+A projection ``W`` (384 x d, e.g. d=96) is fitted offline when a catalog is
+ingested, either by PCA on the catalog or as a random Gaussian projection, and
+the projected catalog is stored next to the index in
+``databases/catalog/<domain>/projection/``.
+
+Since ``q . x = q . mean + q . (x - mean)``, and the first term is the same for
+every item, candidates are ranked by ``(q W) . ((x - mean) W)``. The best
+``candidates`` rows are then re-scored exactly against the full 384-dim
+catalog vectors.
+
+    python -m retrieval.projection movie --dim 96 --method pca
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from .catalog import CATALOG_DIR, blocked_top_k, catalog_path, get_catalog
+from .quantize import rescore_exact
+
+CANDIDATES = int(os.getenv("TWO_STAGE_CANDIDATES", "300"))
+METHODS = ("pca", "random")
+
+
+class Projection:
+    """Linear map from 384 dims down to ``components.shape[1]``."""
+
+    def __init__(self, method, mean, components):
+        self.method = method
+        self.mean = mean
+        self.components = components
+
+    @classmethod
+    def fit(cls, vectors, dim=96, method="pca", sample=100000, seed=0):
+        rng = np.random.default_rng(seed)
+        full_dim = vectors.shape[1]
+        if method == "pca":
+            rows = np.sort(rng.choice(len(vectors), min(sample, len(vectors)), replace=False))
+            data = np.asarray(vectors[rows], dtype=np.float32)
+            mean = data.mean(axis=0)
+            # Right singular vectors of the centred sample are the principal axes
+            _, _, vt = np.linalg.svd(data - mean, full_matrices=False)
+            components = vt[:dim].T.astype(np.float32)
+        elif method == "random":
+            mean = np.zeros(full_dim, dtype=np.float32)
+            components = (rng.standard_normal((full_dim, dim)) / np.sqrt(dim)).astype(np.float32)
+        else:
+            raise ValueError(f"Unknown projection method: {method}. Must be one of {METHODS}.")
+        return cls(method, mean, components)
+
+    def project_items(self, vectors, chunk=65536):
+        out = np.empty((len(vectors), self.components.shape[1]), dtype=np.float32)
+        for start in range(0, len(vectors), chunk):
+            out[start:start + chunk] = (np.asarray(vectors[start:start + chunk]) - self.mean) @ self.components
+        return out
+
+    def project_queries(self, queries):
+        return queries @ self.components
+
+
+class TwoStageIndex:
+    """Candidate search on the projected catalog, exact re-rank on the full one."""
+
+    def __init__(self, catalog, projection, reduced, candidates=CANDIDATES, item_block=65536):
+        self.catalog = catalog
+        self.projection = projection
+        self.reduced = reduced
+        self.candidates = candidates
+        self.item_block = item_block
+
+    def search(self, queries, k, exclude_rows=None):
+        reduced_queries = self.projection.project_queries(queries)
+        rows, _ = blocked_top_k(reduced_queries, self.reduced, max(k, self.candidates), exclude_rows, self.item_block)
+        return rescore_exact(queries, self.catalog.vectors, rows, k)
+
+
+def projection_path(domain, root=CATALOG_DIR):
+    return os.path.join(catalog_path(domain, root), "projection")
+
+
+def build_projection(catalog, dim=96, method="pca", root=CATALOG_DIR):
+    """Fit the projection of a catalog and store it with the projected matrix."""
+    started = time.time()
+    projection = Projection.fit(catalog.vectors, dim, method)
+    reduced = projection.project_items(catalog.vectors)
+
+    path = projection_path(catalog.domain, root)
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "mean.npy"), projection.mean)
+    np.save(os.path.join(path, "components.npy"), projection.components)
+    np.save(os.path.join(path, "reduced.npy"), reduced)
+    params = {
+        "method": method,
+        "dim": int(dim),
+        "digest": catalog.digest,
+        "fit_seconds": round(time.time() - started, 2),
+    }
+    with open(os.path.join(path, "params.json"), "w") as f:
+        json.dump(params, f, indent=2)
+    return params
+
+
+def load_two_stage_index(catalog, root=CATALOG_DIR):
+    """Factory used by ``retrieval.engine`` for the "two_stage" mode."""
+    path = projection_path(catalog.domain, root)
+    params_file = os.path.join(path, "params.json")
+    if not os.path.exists(params_file):
+        return None
+    with open(params_file) as f:
+        params = json.load(f)
+    if params.get("digest") != catalog.digest:
+        return None
+    projection = Projection(
+        params["method"],
+        np.load(os.path.join(path, "mean.npy")),
+        np.load(os.path.join(path, "components.npy")),
+    )
+    reduced = np.load(os.path.join(path, "reduced.npy"), mmap_mode="r")
+    return TwoStageIndex(catalog, projection, reduced)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fit the reduced-dimension projection of local catalogs.")
+    parser.add_argument("domains", nargs="*", default=["movie", "music", "product"])
+    parser.add_argument("--dim", type=int, default=96)
+    parser.add_argument("--method", choices=METHODS, default="pca")
+    args = parser.parse_args()
+    for name in args.domains:
+        catalog = get_catalog(name)
+        if catalog is None:
+            print(f"[SKIP] No local catalog for {name}")
+            continue
+        print(f"✅ {name}: {build_projection(catalog, args.dim, args.method)}")
@@ -0,0 +1,212 @@
+"""Storage layouts of the user preference vector.
+
+The vector has one 384-dim slice per domain plus the collective slice.
+``USER_VECTOR_LAYOUT`` selects how it is stored in Pinecone:
+
+- ``1`` (default): one concatenated 1536-dim record per user in
+  "user-preference-vector". Every read and write moves all four slices.
+- ``2``: one 384-dim record per slice in "user-preference-slices",
+  with ID ``<user_id>#<slice>`` and metadata ``{"user_id", "slice", "layout"}``.
+  Reads fetch only the slices they need, and writes upsert only the slices
+  they change, in one round trip each. A new domain is a new slice name: users
+  get the record on their first activity in that domain, and until then the
+  slice reads as zeros. Nothing has to be rebuilt.
+
+Switching a deployment to layout 2: create the slice index
+(``utils/user_pref_index_generation.py`` with ``USER_VECTOR_LAYOUT=2``),
+migrate everyone with
+
+    python -m retrieval.user_store migrate
+
+then set ``USER_VECTOR_LAYOUT=2``. A user the migration missed is migrated
+the first time a layout-2 read finds no slice records for them.
+
+Pinecone calls go through ``call(key, fn, **kwargs)`` so the tools can route
+them through their call gate (``runtime.call_gate``); the default calls ``fn``
+directly.
+"""
+
+import os
+
+import numpy as np
+
+from .config import EMBEDDING_DIM, SLICE_NAMES, USER_INDEX_NAME
+from .pinecone_client import get_index
+
+# Layout 1 stays the default: layout 2 needs an index that only exists once it was created
+USER_VECTOR_LAYOUT = int(os.getenv("USER_VECTOR_LAYOUT", "1"))
+USER_SLICE_INDEX_NAME = "user-preference-slices"
+
+# Slices of a layout-1 record, in order. Its width is fixed, so domains added later exist in layout 2 only.
+LAYOUT_1_SLICES = ("movie", "music", "product", "collective")
+
+
+def _direct(key, fn, **kwargs):
+    return fn(**kwargs)
+
+
+def slice_id(user_id, name):
+    return f"{user_id}#{name}"
+
+
+def split_vector(vector, names=LAYOUT_1_SLICES):
+    """{slice name: 384-dim array} of a concatenated vector (a layout-1 record by default)."""
+    vector = np.asarray(vector, dtype=np.float32)
+    return {name: vector[i * EMBEDDING_DIM:(i + 1) * EMBEDDING_DIM] for i, name in enumerate(names)}
+
+
+def join_slices(slices, names=SLICE_NAMES):
+    """Concatenated float32 vector of ``slices`` in ``names`` order; missing slices are zeros."""
+    zeros = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    return np.concatenate([np.asarray(slices.get(name, zeros), dtype=np.float32) for name in names])
+
+
+def slice_records(user_id, slices):
+    """Layout-2 upsert payload of ``slices``."""
+    return [
+        {
+            "id": slice_id(user_id, name),
+            "values": np.asarray(values, dtype=np.float32).tolist(),
+            "metadata": {"user_id": user_id, "slice": name, "layout": 2},
+        }
+        for name, values in slices.items()
+    ]
+
+
+def _read_single(user_id, call, shared):
+    key = ("user", user_id) if shared else None
+    response = call(key, get_index(USER_INDEX_NAME).fetch, ids=[user_id])
+    record = response.vectors.get(user_id)
+    return split_vector(record.values) if record else {}
+
+
+def read_slices(user_id, names=SLICE_NAMES, call=_direct, layout=None, shared=True):
+    """Read some slices of a user's vector.
+
+    Args:
+        shared: Whether concurrent identical reads may share one request. Writers
+            reading the base of an update pass False.
+
+    Returns:
+        {slice name: float32 array} of the stored slices among ``names``;
+        empty if none of them is stored.
+    """
+    layout = layout or USER_VECTOR_LAYOUT
+    if layout == 1:
+        slices = _read_single(user_id, call, shared)
+        return {name: slices[name] for name in names if name in slices}
+
+    ids = [slice_id(user_id, name) for name in names]
+    key = ("user", user_id, tuple(names)) if shared else None
+    response = call(key, get_index(USER_SLICE_INDEX_NAME).fetch, ids=ids)
+    slices = {
+        name: np.asarray(response.vectors[record_id].values, dtype=np.float32)
+        for name, record_id in zip(names, ids)
+        if record_id in response.vectors
+    }
+    if slices:
+        return slices
+    # No slice records: the user may still be stored in layout 1
+    legacy = _read_single(user_id, call, shared)
+    if legacy:
+        write_slices(user_id, legacy, call, layout=2)
+        print(f"[USER VECTOR] Migrated {user_id} to per-slice storage")
+    return {name: legacy[name] for name in names if name in legacy}
+
+
+def write_slices(user_id, slices, call=_direct, layout=None, base=None):
+    """Store the given slices of a user's vector, leaving the others unchanged.
+
+    Args:
+        base: Other slices the caller just read. Layout 1 rewrites the whole
+            record and only reads it first when ``slices`` and ``base`` do not
+            cover every slice.
+    """
+    layout = layout or USER_VECTOR_LAYOUT
+    if layout == 2:
+        call(None, get_index(USER_SLICE_INDEX_NAME).upsert, vectors=slice_records(user_id, slices))
+        return
+    stored = {**(base or {}), **slices}
+    if not all(name in stored for name in LAYOUT_1_SLICES):
+        stored = {**_read_single(user_id, call, shared=False), **stored}
+    full = join_slices(stored, LAYOUT_1_SLICES)
+    call(None, get_index(USER_INDEX_NAME).upsert, vectors=[{"id": user_id, "values": full.tolist()}])
+
+
+def read_user_vector(user_id, call=_direct, layout=None):
+    """The user's full concatenated vector (unstored slices as zeros), or None if nothing is stored."""
+    slices = read_slices(user_id, SLICE_NAMES, call, layout)
+    return join_slices(slices) if slices else None
+
+
+def list_user_ids(layout=None):
+    """Sorted IDs of every user with a stored vector."""
+    layout = layout or USER_VECTOR_LAYOUT
+    if layout == 1:
+        return sorted(user_id for page in get_index(USER_INDEX_NAME).list() for user_id in page)
+    pages = get_index(USER_SLICE_INDEX_NAME).list()
+    return sorted({record_id.rsplit("#", 1)[0] for page in pages for record_id in page})
+
+
+def fetch_user_vectors(user_ids, layout=None):
+    """{user_id: full float32 vector} of a batch of users, in one fetch call."""
+    layout = layout or USER_VECTOR_LAYOUT
+    if layout == 1:
+        response = get_index(USER_INDEX_NAME).fetch(ids=list(user_ids))
+        return {
+            user_id: join_slices(split_vector(response.vectors[user_id].values))
+            for user_id in user_ids
+            if user_id in response.vectors
+        }
+    ids = [slice_id(user_id, name) for user_id in user_ids for name in SLICE_NAMES]
+    response = get_index(USER_SLICE_INDEX_NAME).fetch(ids=ids)
+    vectors = {}
+    for user_id in user_ids:
+        slices = {
+            name: response.vectors[slice_id(user_id, name)].values
+            for name in SLICE_NAMES
+            if slice_id(user_id, name) in response.vectors
+        }
+        if slices:
+            vectors[user_id] = join_slices(slices)
+    return vectors
+
+
+def migrate_all(batch_size=100):
+    """Copy layout-1 vectors into layout-2 slice records; returns the number of users migrated.
+
+    Users that already have slice records were migrated (or written) in layout 2
+    and are left alone, so the job can be rerun.
+    """
+    user_ids = list_user_ids(layout=1)
+    source, index = get_index(USER_INDEX_NAME), get_index(USER_SLICE_INDEX_NAME)
+    migrated = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        existing = index.fetch(ids=[slice_id(user_id, name) for user_id in batch for name in LAYOUT_1_SLICES])
+        done = {record_id.rsplit("#", 1)[0] for record_id in existing.vectors}
+        pending = [user_id for user_id in batch if user_id not in done]
+        # A batch that is already migrated needs no fetch (Pinecone rejects an empty ID list)
+        if pending:
+            response = source.fetch(ids=pending)
+            records = [
+                record
+                for user_id, vector in response.vectors.items()
+                for record in slice_records(user_id, split_vector(vector.values))
+            ]
+            migrated += len(response.vectors)
+            # Pinecone caps upserts at 1000 records per request
+            for offset in range(0, len(records), 400):
+                index.upsert(vectors=records[offset:offset + 400])
+        print(f"[MIGRATE] {min(start + batch_size, len(user_ids))}/{len(user_ids)} users")
+    return migrated
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the per-slice user vector storage.")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    print(f"✅ Migrated {migrate_all(args.batch_size)} users to {USER_SLICE_INDEX_NAME}")
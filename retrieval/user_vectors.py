@@ -0,0 +1,163 @@
+"""Helpers around the concatenated user preference vectors (stored by ``retrieval.user_store``)."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .config import ACTIVITY_FIELDS, EMBEDDING_DIM, USER_ACTIVITY_DB, USER_VECTOR_DIM
+from .quantize import dequantize_int8, quantize_int8
+from .user_store import fetch_user_vectors, list_user_ids
+
+
+def vector_version(values):
+    """Content version of a user vector.
+
+    Any write through ``calculate_user_embeddings`` changes the vector, so a
+    digest of its float32 bytes tells whether results computed from an older
+    copy are still valid.
+    """
+    data = np.asarray(values, dtype=np.float32).tobytes()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def fetch_all_user_vectors(batch_size=100, dtype=np.float32):
+    """Fetch every user vector from Pinecone.
+
+    Args:
+        batch_size: Number of IDs per fetch call.
+        dtype: Storage type of the returned matrix; float16 halves its size.
+
+    Returns:
+        (user_ids, matrix, versions) where matrix is (U x 1536) and versions are
+        computed from the exact float32 values before any down-casting.
+    """
+    user_ids = list_user_ids()
+
+    matrix = np.zeros((len(user_ids), USER_VECTOR_DIM), dtype=dtype)
+    versions = []
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        vectors = fetch_user_vectors(batch)
+        for offset, user_id in enumerate(batch):
+            values = vectors.get(user_id, matrix[start + offset].astype(np.float32))
+            matrix[start + offset] = values
+            versions.append(vector_version(values))
+    return user_ids, matrix, versions
+
+
+class UserVectorCache:
+    """LRU cache of user vectors, stored as float16 or per-slice int8.
+
+    The cache only feeds retrieval. Writers (``calculate_user_embeddings``)
+    always start from the exact vector in Pinecone and ``put`` the result, so
+    quantization error never accumulates in the stored vectors. Entries expire
+    after ``ttl`` seconds in case another process wrote the vector.
+    """
+
+    def __init__(self, max_users=10000, dtype="float16", ttl=300.0):
+        if dtype not in ("float16", "int8", "float32"):
+            raise ValueError(f"Unsupported cache dtype: {dtype}")
+        self.max_users = max_users
+        self.dtype = dtype
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, user_id, values, version=None):
+        values = np.asarray(values, dtype=np.float32)
+        version = version or vector_version(values)
+        if self.dtype == "int8":
+            # One scale per 384-dim slice: slices can differ by orders of magnitude
+            payload = quantize_int8(values.reshape(-1, EMBEDDING_DIM))
+        else:
+            payload = values.astype(self.dtype)
+        with self._lock:
+            self._entries[user_id] = (payload, version, time.monotonic())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def get(self, user_id):
+        """Return (float32 vector, version) or None."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry[2] > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+        payload, version, _ = entry
+        if self.dtype == "int8":
+            return dequantize_int8(*payload).reshape(-1), version
+        return payload.astype(np.float32), version
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            entries = list(self._entries.values())
+        if self.dtype == "int8":
+            return sum(codes.nbytes + scales.nbytes for (codes, scales), _, _ in entries)
+        return sum(payload.nbytes for payload, _, _ in entries)
+
+    def memory_usage(self):
+        """(bytes of the cached vectors, number of entries)."""
+        return self.nbytes, len(self._entries)
+
+    def evict_oldest(self, count):
+        """Drop the ``count`` least recently used vectors; returns how many were dropped."""
+        with self._lock:
+            count = min(count, len(self._entries))
+            for _ in range(count):
+                self._entries.popitem(last=False)
+        return count
+
+
+user_vector_cache = UserVectorCache(
+    max_users=int(os.getenv("USER_VECTOR_CACHE_SIZE", "10000")),
+    dtype=os.getenv("USER_VECTOR_CACHE_DTYPE", "float16"),
+    ttl=float(os.getenv("USER_VECTOR_CACHE_TTL", "300")),
+)
+
+
+def load_all_histories(db_path=USER_ACTIVITY_DB):
+    """Read the consumed item IDs of every user from SQLite, in consumption order.
+
+    Returns:
+        {user_id: {"movie": list, "music": list, "product": list}}, IDs as strings, oldest first.
+    """
+    domains = list(ACTIVITY_FIELDS)
+    columns = ", ".join(ACTIVITY_FIELDS[d] for d in domains)
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(f"SELECT user_id, {columns} FROM user_activity").fetchall()
+    finally:
+        conn.close()
+
+    return {
+        user_id: {domain: [str(i) for i in json.loads(raw)] if raw else [] for domain, raw in zip(domains, lists)}
+        for user_id, *lists in rows
+    }
+
+
+def load_all_activity(db_path=USER_ACTIVITY_DB):
+    """Read the consumed item IDs of every user from SQLite.
+
+    Returns:
+        {user_id: {"movie": set, "music": set, "product": set}}, IDs as strings.
+    """
+    return {
+        user_id: {domain: set(items) for domain, items in history.items()}
+        for user_id, history in load_all_histories(db_path).items()
+    }
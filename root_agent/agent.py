@@ -1,6 +1,4 @@
 from google.adk.agents import Agent
-from google.adk.models.lite_llm import LiteLlm
-import litellm
 from google.adk.tools.tool_context import ToolContext
 from .sub_agents.explainer_agent.agent import explainer_agent
 
@@ -10,7 +8,9 @@ from google.adk.agents.callback_context import CallbackContext
 from google.genai import types # For types.Content
 from typing import Optional
 from google.adk.models import LlmResponse, LlmRequest
-# litellm._turn_on_debug()
+from runtime.callbacks import after_agent, after_model, after_tool, before_agent, before_model, before_tool
+from runtime.prompts import agent_model, compact_instruction
+# LiteLLM debug logging is opt-in: set LITELLM_DEBUG=1 (see runtime.startup)
 
 
 def add_reminder(reminder: str, tool_context: ToolContext) -> dict:
@@ -166,62 +166,41 @@ def update_user_name(name: str, tool_context: ToolContext) -> dict:
 
 root_agent = Agent(
     name="root_agent",
-    model="gemini-2.0-flash",
-    description="""
-    A root coordinator agent responsible for 
-    1. setting user's name in {user_name} state if not already set
-    2. managing user interaction flow and forwarding valid user queries to the explainer agent.
-    
-    INPUT: {user_name}
-
-    FUNCTIONAL OVERVIEW:
-    - Handles user identification (collecting and remembering user name).
-    - Acts as a smart query router between the user and the explainer agent.
-    - Ensures only valid queries are routed to the explainer agent.
-
-    BEHAVIOR RULES:
-
-    1. User Name Handling:
-       - If the user's name is not available in user_name state:
-         - When the user asks "Do you know my name" or similar, respond by asking them to introduce themselves.
-         - When the user provides their name, store it using the update_user_name tool.
-         - YOU MUST NOT forward any name-related messages to the explainer agent.
-         - After storing the name, politely ask the user to send their actual query.
-       - If the user's name is already known, greet them using their name and say "PLEASE ENTER YOUR QUERY NOW {user_name}".
-
-    2. Query Routing:
-       - Forward queries to explainer agent ONLY AFTER the user's name is known.
-       - Do not forward any of these messages to explainer agent:
-         - "Do you know my name"
-         - "What's my name"
-         - "I am [name]"
-         - "My name is [name]"
-         - Any other name-related messages
-       - For all other messages (once name is known), forward them exactly as-is to the explainer agent.
-
-    3. Communication Style:
-       - Be brief, polite, and professional.
-       - For name-related messages, respond directly without involving explainer agent.
-       - For forwarded queries, acknowledge that the query is being forwarded.
-
-    4. Edge Case Handling:
-       - If name is not set and query is not name-related, first ask for name before proceeding.
-       - Never forward name-related messages to explainer agent.
-    """,
-    instruction="""
-    Follow these steps exactly:
-    1. Check if user_name is set in state
-    2. If not set:
-       - If message is name-related (asking if you know their name, providing name):
-         * Handle it directly (ask for name or store name)
-         * DO NOT FORWARD to explainer agent
-       - If message is not name-related:
-         * First ask user to introduce themselves
-    3. If name is set:
-       - Forward all non-name-related messages to explainer agent
-       - For name-related messages, respond directly (e.g., "Yes, your name is [name]")
-    """,
+    model=agent_model(),
+    description="Root coordinator that remembers the user's name and routes valid queries to the explainer agent.",
+    # Static text only: no state is templated in, so this prefix is identical on
+    # every turn and can be cached. The model learns the user's name from the
+    # update_user_name call and its result earlier in the conversation.
+    instruction=compact_instruction("""
+You are the root coordinator. You set the user's name in the user_name state if it is not already set, and forward valid user queries to the explainer agent.
+
+Follow these steps exactly:
+1. Check whether the user's name is already known (update_user_name was called earlier in this conversation)
+2. If not known:
+   - If message is name-related (asking if you know their name, providing name):
+     * Handle it directly (ask for name or store name with the update_user_name tool)
+     * DO NOT FORWARD to explainer agent
+     * After storing the name, politely ask the user to send their actual query.
+   - If message is not name-related:
+     * First ask user to introduce themselves
+3. If name is known:
+   - Forward all non-name-related messages exactly as-is to explainer agent, and acknowledge that the query is being forwarded
+   - For name-related messages, respond directly (e.g., "Yes, your name is [name]")
+   - When greeting, use their name and say "PLEASE ENTER YOUR QUERY NOW <user_name>".
+
+Name-related messages are never forwarded, for example:
+- "Do you know my name" / "What's my name"
+- "I am [name]" / "My name is [name]"
+
+Be brief, polite, and professional.
+""", agent_name="root_agent"),
     tools=[update_user_name],
     sub_agents=[explainer_agent],
+    before_agent_callback=before_agent,
+    after_agent_callback=after_agent,
+    before_model_callback=before_model,
+    after_model_callback=after_model,
+    before_tool_callback=before_tool,
+    after_tool_callback=after_tool,
 )
 
@@ -1,21 +1,27 @@
-from datetime import datetime
-from google.adk.models.lite_llm import LiteLlm
 from google.adk.agents import Agent
 from google.adk.tools.tool_context import ToolContext
 import sqlite3
 import json
+import numpy as np
 
 from .sub_agents.summarizer_agent.agent import summarizer_agent
 from .sub_agents.recommendation_agent.agent import recommendation_agent
 
-from pinecone import Pinecone
-import os
-import litellm
-
-import sqlite3
-from google.adk.tools.tool_context import ToolContext
-
-litellm._turn_on_debug()
+from retrieval.config import ACTIVITY_FIELDS, INDEX_NAMES, TITLE_FIELDS, USER_ACTIVITY_DB
+from retrieval.embeddings import get_embedding_model
+from retrieval.pinecone_client import get_index
+from retrieval.user_store import read_slices, write_slices
+from retrieval.user_vectors import user_vector_cache
+from runtime.call_gate import get_gate, off_loop
+from runtime.callbacks import after_agent, after_model, after_tool, before_agent, before_model, before_tool
+from runtime.prompts import agent_model, compact_instruction
+from runtime.tool_output import truncate_list
+from runtime.tracing import span
+from runtime.user_context import SUMMARY_COLUMNS, credit_prefetch, get_user_row, update_user_row
+
+# The bulk title query over-fetches so that duplicate catalog entries of one
+# title do not crowd out the others; titles still missing are looked up singly
+BULK_TITLE_OVERFETCH = 3
 
 def increment_step_no(tool_context: ToolContext) -> dict:
     """Increment the current step number in the workflow.
@@ -39,6 +45,56 @@ def increment_step_no(tool_context: ToolContext) -> dict:
     }
 
 
+def update_user_vector(user_id: str, new_embeddings: dict, row: dict):
+    """
+    Replaces the given domain slices of the user's 1536-dim vector, recomputes the collective slice
+    from the activity counts in `row` and writes the changed slices back with a single upsert.
+
+    Returns:
+        The per-domain weights of the collective slice, or None if the user has no activity.
+    """
+    # Get counts and compute weights
+    counts = {
+        "movie": len(row["movies_watched"]),
+        "music": len(row["listened_music"]),
+        "product": len(row["products_purchased"]),
+    }
+    total_count = sum(counts.values())
+    if total_count == 0:
+        return None
+
+    weights = {k: counts[k] / total_count for k in counts}
+
+    # Pinecone fetch of the domain slices that are kept (the stored slices are the base of
+    # the update, so they are not read from the cache); the collective slice is recomputed
+    credit_prefetch(user_id, "pinecone_handles")
+    pinecone_gate = get_gate("pinecone")
+    kept = [activity for activity in ("movie", "music", "product") if activity not in new_embeddings]
+    stored = read_slices(user_id, kept, pinecone_gate.call, shared=False) if kept else {}
+    zeros = np.zeros(384, dtype=np.float32)
+
+    # Update the relevant parts
+    movie_emb = np.asarray(new_embeddings.get("movie", stored.get("movie", zeros)), dtype=np.float32)
+    music_emb = np.asarray(new_embeddings.get("music", stored.get("music", zeros)), dtype=np.float32)
+    product_emb = np.asarray(new_embeddings.get("product", stored.get("product", zeros)), dtype=np.float32)
+
+    # Recalculate collective embedding
+    movie_wt, music_wt, product_wt = weights["movie"], weights["music"], weights["product"]
+    collective_emb = np.average(
+        [movie_emb, music_emb, product_emb],
+        axis=0,
+        weights=[movie_wt, music_wt, product_wt]
+    )
+
+    # Write only the replaced slices and the collective one; the cache keeps the full vector
+    domain_embs = {"movie": movie_emb, "music": music_emb, "product": product_emb}
+    changed = {activity: domain_embs[activity] for activity in new_embeddings}
+    write_slices(user_id, {**changed, "collective": collective_emb.astype(np.float32)}, pinecone_gate.call, base=stored)
+    full_vector = np.concatenate([movie_emb, music_emb, product_emb, collective_emb]).astype(np.float32)
+    user_vector_cache.put(user_id, full_vector)
+    return weights
+
+
 def calculate_user_embeddings(activity_type: str, user_query: str, description: str, tool_context: ToolContext) -> dict:
     """
     Updates the embedding vector for the user in Pinecone based on the provided activity type.
@@ -53,84 +109,25 @@ def calculate_user_embeddings(activity_type: str, user_query: str, description:
         A dictionary indicating success or error.
     """
     print("==================== INSIDE CALCULATE_USER_EMBEDDINGS ====================")
-    import os
-    import sqlite3
-    import json
-    from pinecone import Pinecone
-    from sentence_transformers import SentenceTransformer
-    import numpy as np
 
     user_id = tool_context.state.get("user_id")
     if not user_id:
         return {"status": "error", "message": "User ID not found."}
 
-    # Load model
-    model = SentenceTransformer("all-MiniLM-L6-v2")  # or any other 384-dim model
-    new_embedding = model.encode(description).tolist()  # 384-dim
-
-    # DB Connection to fetch list sizes
-    conn = sqlite3.connect("D:/GoogleADK_ProjectWork/databases/user_activity.db")
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT movies_watched, listened_music, products_purchased FROM user_activity WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
+    # Shared model (loaded once per process, usually by the session-start prefetch)
+    model = get_embedding_model()
+    credit_prefetch(user_id, "embedding_model")
+    with span("embedding.encode", texts=1):
+        new_embedding = model.encode(description)  # 384-dim ndarray
 
+    # List sizes from the user's cached activity row
+    row = get_user_row(user_id)
     if not row:
         return {"status": "error", "message": f"No user data found for {user_id}."}
 
-    movies_watched = json.loads(row[0]) if row[0] else []
-    listened_music = json.loads(row[1]) if row[1] else []
-    products_purchased = json.loads(row[2]) if row[2] else []
-
-    # Get counts and compute weights
-    counts = {
-        "movie": len(movies_watched),
-        "music": len(listened_music),
-        "product": len(products_purchased),
-    }
-    total_count = sum(counts.values())
-    if total_count == 0:
+    weights = update_user_vector(user_id, {activity_type: new_embedding}, row)
+    if weights is None:
         return {"status": "error", "message": "No activity history to calculate collective embedding."}
-
-    weights = {k: counts[k] / total_count for k in counts}
-
-    # Pinecone init and fetch
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    index = pc.Index("user-preference-vector")
-
-    response = index.fetch(ids=[user_id])
-    existing_vector = response.vectors.get(user_id)
-    if existing_vector:
-        existing_vector = existing_vector.values
-    else:
-        existing_vector = [0.0] * 1536
-
-    # Split current embedding into 4 parts
-    movie_emb = existing_vector[0:384]
-    music_emb = existing_vector[384:768]
-    product_emb = existing_vector[768:1152]
-    collective_emb = existing_vector[1152:1536]
-
-    # Update the relevant part
-    if activity_type == "movie":
-        movie_emb = new_embedding
-    elif activity_type == "music":
-        music_emb = new_embedding
-    elif activity_type == "product":
-        product_emb = new_embedding
-
-    # Recalculate collective embedding
-    movie_wt, music_wt, product_wt = weights["movie"], weights["music"], weights["product"]
-    collective_emb = np.average(
-        [movie_emb, music_emb, product_emb],
-        axis=0,
-        weights=[movie_wt, music_wt, product_wt]
-    ).tolist()
-
-    # Concatenate and update full vector
-    full_vector = movie_emb + music_emb + product_emb + collective_emb
-    index.upsert(vectors=[{"id": user_id, "values": full_vector}])
     print("==================== LEAVING CALCULATE_USER_EMBEDDINGS ====================")
 
     return {
@@ -183,14 +180,16 @@ def set_user_pref_summary(activity_type: str, new_summary: str, tool_context: To
         }
 
     try:
-        conn = sqlite3.connect("D:/GoogleADK_ProjectWork/databases/user_activity.db")
-        cursor = conn.cursor()
-        cursor.execute(
-            f"UPDATE user_activity SET {column_name} = ? WHERE user_id = ?",
-            (new_summary, user_id),
-        )
-        conn.commit()
-        conn.close()
+        with span("sqlite.update_summary", column=column_name):
+            conn = sqlite3.connect(USER_ACTIVITY_DB)
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE user_activity SET {column_name} = ? WHERE user_id = ?",
+                (new_summary, user_id),
+            )
+            conn.commit()
+            conn.close()
+        update_user_row(user_id, column_name, new_summary)
         print("==================== SUMMARY UPDATED SUCCESSFULLY ====================")
         return {
             "action": "set_user_pref_summary",
@@ -205,6 +204,45 @@ def set_user_pref_summary(activity_type: str, new_summary: str, tool_context: To
         }
 
 
+def format_item_description(activity_type: str, metadata: dict):
+    """Formats an item's catalog metadata as the structured description the summarizer expects."""
+    if activity_type == "movie":
+        description = (
+            f"Movie: {metadata.get('title')}\n"
+            f"Genres: {metadata.get('genres')}\n"
+            f"Keywords: {metadata.get('keywords')}\n"
+            f"Overview: {metadata.get('overview')}\n"
+            f"Tagline: {metadata.get('tagline')}\n"
+            f"Release Date: {metadata.get('release_date')}\n"
+            f"Popularity Score: {metadata.get('popularity')}\n"
+            f"Average Vote: {metadata.get('vote_average')}"
+        )
+    elif activity_type == "music":
+        description = (
+            f"Track: {metadata.get('track_name')}\n"
+            f"Artist(s): {metadata.get('artists')}\n"
+            f"Album: {metadata.get('album_name')}\n"
+            f"Genre: {metadata.get('track_genre')}\n"
+            f"Explicit: {'Yes' if metadata.get('explicit') else 'No'}\n"
+            f"Duration: {round(metadata.get('duration_ms') / 1000)} seconds\n"
+            f"Popularity Score: {metadata.get('popularity')}"
+        )
+    elif activity_type == "product":
+        description = (
+            f"Product: {metadata.get('title')}\n"
+            f"Category: {metadata.get('category')}\n"
+            f"Price: ${metadata.get('price')}\n"
+            f"List Price: ${metadata.get('listPrice')}\n"
+            f"Star Rating: {metadata.get('stars')}⭐\n"
+            f"Reviews: {metadata.get('reviews')}\n"
+            f"Best Seller: {'Yes' if metadata.get('isBestSeller') else 'No'}\n"
+            f"Recently Bought: {metadata.get('boughtInLastMonth')} times"
+        )
+    else:
+        return None
+    return description
+
+
 def get_item_description(activity_type: str, item_name: str, tool_context: ToolContext) -> dict:
     """
     Fetches a structured textual description of an item (movie, music, or product) from Pinecone
@@ -218,8 +256,6 @@ def get_item_description(activity_type: str, item_name: str, tool_context: ToolC
     Returns:
         A dictionary with status and formatted description string.
     """
-    from pinecone import Pinecone
-    import os
     print("==================== INSIDE GET_ITEM_DESCRIPTION ====================")
     index_map = {
         "movie": ("movies-list", "original_title"),
@@ -233,14 +269,15 @@ def get_item_description(activity_type: str, item_name: str, tool_context: ToolC
     index_name, filter_field = index_map[activity_type]
 
     try:
-        # Init Pinecone
-        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        index = pc.Index(index_name)
+        index = get_index(index_name)
 
         # Dummy vector (not used for scoring, only filtering)
         zero_vector = [0.0] * 384
 
-        response = index.query(
+        # Identical lookups from concurrent sessions share one Pinecone request
+        response = get_gate("pinecone").call(
+            ("title", index_name, filter_field, item_name),
+            index.query,
             vector=zero_vector,
             filter={filter_field: {"$eq": item_name}},
             top_k=1,
@@ -252,40 +289,8 @@ def get_item_description(activity_type: str, item_name: str, tool_context: ToolC
 
         metadata = matches[0]["metadata"]
 
-        # Format output string by type
-        if activity_type == "movie":
-            description = (
-                f"Movie: {metadata.get('title')}\n"
-                f"Genres: {metadata.get('genres')}\n"
-                f"Keywords: {metadata.get('keywords')}\n"
-                f"Overview: {metadata.get('overview')}\n"
-                f"Tagline: {metadata.get('tagline')}\n"
-                f"Release Date: {metadata.get('release_date')}\n"
-                f"Popularity Score: {metadata.get('popularity')}\n"
-                f"Average Vote: {metadata.get('vote_average')}"
-            )
-        elif activity_type == "music":
-            description = (
-                f"Track: {metadata.get('track_name')}\n"
-                f"Artist(s): {metadata.get('artists')}\n"
-                f"Album: {metadata.get('album_name')}\n"
-                f"Genre: {metadata.get('track_genre')}\n"
-                f"Explicit: {'Yes' if metadata.get('explicit') else 'No'}\n"
-                f"Duration: {round(metadata.get('duration_ms') / 1000)} seconds\n"
-                f"Popularity Score: {metadata.get('popularity')}"
-            )
-        elif activity_type == "product":
-            description = (
-                f"Product: {metadata.get('title')}\n"
-                f"Category: {metadata.get('category')}\n"
-                f"Price: ${metadata.get('price')}\n"
-                f"List Price: ${metadata.get('listPrice')}\n"
-                f"Star Rating: {metadata.get('stars')}⭐\n"
-                f"Reviews: {metadata.get('reviews')}\n"
-                f"Best Seller: {'Yes' if metadata.get('isBestSeller') else 'No'}\n"
-                f"Recently Bought: {metadata.get('boughtInLastMonth')} times"
-            )
-        else:
+        description = format_item_description(activity_type, metadata)
+        if description is None:
             return {"status": "error", "message": "Unexpected activity type."}
         print("==================== FETCHED ITEM DESCRIPTION ====================")
         print(f"Result: {description}")
@@ -341,11 +346,9 @@ def get_user_pref_summary(activity_type: str, tool_context: ToolContext) -> dict
         }
 
     try:
-        conn = sqlite3.connect("D:/GoogleADK_ProjectWork/databases/user_activity.db")
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT {column_name} FROM user_activity WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        conn.close()
+        # Served from the user's activity row, prefetched at session start
+        row = get_user_row(user_id)
+        result = (row[column_name],) if row else None
         print("==================== FETCHED SUMMARY ====================")
         print(f"Result: {result}")
         print("==================== END OF FETCHED SUMMARY ====================")
@@ -381,15 +384,15 @@ def exact_title_search(item: str, field: str):
         indexName = "music-list"
         filterBy = "track_name"
 
-    # Initialize Pinecone client
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    index = pc.Index(indexName)
+    index = get_index(indexName)
 
     try:
         # Using a zero vector since we're not doing vector search
         zero_vector = [0.0] * 384
 
-        response = index.query(
+        response = get_gate("pinecone").call(
+            ("title", indexName, filterBy, item),  # Same key as get_item_description's lookup
+            index.query,
             vector=zero_vector,  # Provide a zero vector of appropriate dimension
             filter={filterBy: {"$eq": item}},  # Explicit equality filter
             top_k=1,
@@ -418,6 +421,152 @@ def exact_title_search(item: str, field: str):
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+def bulk_title_search(activity_type: str, titles: list) -> dict:
+    """
+    Resolves several exact titles of one domain with a single Pinecone query.
+
+    Returns:
+        {title: {"id": ..., "metadata": {...}}} for every title found.
+    """
+    index_name, field = INDEX_NAMES[activity_type], TITLE_FIELDS[activity_type]
+    index = get_index(index_name)
+    pinecone_gate = get_gate("pinecone")
+    unique = list(dict.fromkeys(titles))
+    zero_vector = [0.0] * 384
+
+    response = pinecone_gate.call(
+        ("titles", index_name, field, tuple(unique)),
+        index.query,
+        vector=zero_vector,
+        filter={field: {"$in": unique}},
+        top_k=len(unique) * BULK_TITLE_OVERFETCH,
+        include_metadata=True
+    )
+    found = {}
+    for match in response.get("matches", []):
+        title = match["metadata"].get(field)
+        if title in unique and title not in found:
+            found[title] = {"id": match["id"], "metadata": match["metadata"]}
+
+    for title in unique:
+        if title in found:
+            continue
+        response = pinecone_gate.call(
+            ("title", index_name, field, title),
+            index.query,
+            vector=zero_vector,
+            filter={field: {"$eq": title}},
+            top_k=1,
+            include_metadata=True
+        )
+        matches = response.get("matches", [])
+        if matches:
+            found[title] = {"id": matches[0]["id"], "metadata": matches[0]["metadata"]}
+    return found
+
+
+def process_activity_batch(activity_types: list[str], item_names: list[str], tool_context: ToolContext) -> dict:
+    """
+    Records several consumed items, from one or more domains, in a single pass: one title lookup per
+    domain, one SQLite transaction for all activity lists, one batched embedding of the item descriptions
+    and one user-vector update in which each affected domain slice is replaced once.
+
+    Args:
+        activity_types: Activity type of each item, one of "movie", "music", "product".
+        item_names: Exact title of each item, in the same order as activity_types.
+        tool_context: ToolContext used to retrieve user_id.
+
+    Returns:
+        A dictionary with, per affected domain, the current summary and the combined description of the
+        new items (the summarizer inputs), plus the base activity for the recommendation pass.
+    """
+    print("==================== INSIDE PROCESS_ACTIVITY_BATCH ====================")
+    print(f"Items: {list(zip(activity_types, item_names))}")
+
+    user_id = tool_context.state.get("user_id")
+    if not user_id:
+        return {"action": "process_activity_batch", "status": "error", "message": "User ID not found in tool_context state."}
+    if len(activity_types) != len(item_names) or not item_names:
+        return {"action": "process_activity_batch", "status": "error", "message": "activity_types and item_names must be non-empty and of equal length."}
+    invalid = sorted(set(activity_types) - set(ACTIVITY_FIELDS))
+    if invalid:
+        return {"action": "process_activity_batch", "status": "error", "message": f"Invalid activity_type(s): {invalid}. Must be one of {list(ACTIVITY_FIELDS)}."}
+
+    titles_by_domain = {}
+    for activity_type, item_name in zip(activity_types, item_names):
+        titles_by_domain.setdefault(activity_type, []).append(item_name)
+
+    # 1. One title lookup per domain
+    resolved = {activity_type: bulk_title_search(activity_type, titles) for activity_type, titles in titles_by_domain.items()}
+    not_found = [title for activity_type, titles in titles_by_domain.items() for title in titles if title not in resolved[activity_type]]
+
+    # 2. All activity lists updated in one transaction
+    fields = [ACTIVITY_FIELDS[activity_type] for activity_type in titles_by_domain]
+    conn = sqlite3.connect(USER_ACTIVITY_DB)
+    try:
+        with span("sqlite.batch_update_activity", fields=len(fields)), conn:
+            row = conn.execute(f"SELECT {', '.join(fields)} FROM user_activity WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                return {"action": "process_activity_batch", "status": "error", "message": f"No user found with user_id: {user_id}"}
+            lists = {field: json.loads(value) if value else [] for field, value in zip(fields, row)}
+            for activity_type, titles in titles_by_domain.items():
+                current_list = lists[ACTIVITY_FIELDS[activity_type]]
+                for title in titles:
+                    item = resolved[activity_type].get(title)
+                    if item is not None and item["id"] not in current_list:
+                        current_list.append(item["id"])
+            conn.execute(
+                f"UPDATE user_activity SET {', '.join(f'{field} = ?' for field in fields)} WHERE user_id = ?",
+                [json.dumps(lists[field]) for field in fields] + [user_id],
+            )
+    finally:
+        conn.close()
+    for field in fields:
+        update_user_row(user_id, field, lists[field])
+
+    # 3. One batched encode; each slice takes its domain's newest item, as sequential runs would
+    descriptions = {
+        activity_type: [format_item_description(activity_type, resolved[activity_type][title]["metadata"]) for title in titles if title in resolved[activity_type]]
+        for activity_type, titles in titles_by_domain.items()
+    }
+    texts = [text for activity_type in descriptions for text in descriptions[activity_type]]
+    weights = None
+    if texts:
+        model = get_embedding_model()
+        credit_prefetch(user_id, "embedding_model")
+        with span("embedding.encode", texts=len(texts)):
+            embeddings = iter(model.encode(texts))
+        new_embeddings = {}
+        for activity_type, domain_texts in descriptions.items():
+            for _ in domain_texts:
+                new_embeddings[activity_type] = next(embeddings)
+        weights = update_user_vector(user_id, new_embeddings, get_user_row(user_id))
+
+    # 4. Summarizer inputs, one per affected domain
+    row = get_user_row(user_id)
+    domains = {
+        activity_type: {
+            "summary_field": SUMMARY_COLUMNS[activity_type],
+            "current_summary": row[SUMMARY_COLUMNS[activity_type]],
+            "description_of_query": "\n\n".join(domain_texts),
+            "items": [title for title in titles_by_domain[activity_type] if title in resolved[activity_type]],
+        }
+        for activity_type, domain_texts in descriptions.items()
+        if domain_texts
+    }
+    base_activity = max(titles_by_domain, key=lambda activity_type: len(titles_by_domain[activity_type]))
+    print("==================== LEAVING PROCESS_ACTIVITY_BATCH ====================")
+
+    return {
+        "action": "process_activity_batch",
+        "status": "success" if domains else "not_found",
+        "domains": domains,
+        "not_found": not_found,
+        "base_activity": base_activity,
+        "weights": weights,
+        "message": f"Recorded {sum(len(d['items']) for d in domains.values())} items for user {user_id}.",
+    }
+
 # (1)
 
 def update_user_activity(field: str, item: str, tool_context: ToolContext) -> dict:
@@ -464,12 +613,13 @@ def update_user_activity(field: str, item: str, tool_context: ToolContext) -> di
     print(id_from_pinecone)
     print("=====================================================")
     # Connect to the SQLite database
-    conn = sqlite3.connect("D:/GoogleADK_ProjectWork/databases/user_activity.db")
+    conn = sqlite3.connect(USER_ACTIVITY_DB)
     cursor = conn.cursor()
 
     # Fetch current data
-    cursor.execute(f"SELECT {field} FROM user_activity WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
+    with span("sqlite.select_activity", field=field):
+        cursor.execute(f"SELECT {field} FROM user_activity WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
 
     if row is None:
         conn.close()
@@ -488,39 +638,45 @@ def update_user_activity(field: str, item: str, tool_context: ToolContext) -> di
     # Append new item if not already present
     if id_from_pinecone not in current_list:
         current_list.append(id_from_pinecone)
-        cursor.execute(
-            f"UPDATE user_activity SET {field} = ? WHERE user_id = ?",
-            (json.dumps(current_list), user_id)
-        )
-        conn.commit()
+        with span("sqlite.update_activity", field=field):
+            cursor.execute(
+                f"UPDATE user_activity SET {field} = ? WHERE user_id = ?",
+                (json.dumps(current_list), user_id)
+            )
+            conn.commit()
+        update_user_row(user_id, field, current_list)
         updated = True
     else:
         updated = False  # Already exists, no change made
 
     conn.close()
 
+    # Only the newest entries go back to the LLM; the full list stays in SQLite
     return {
         "action": "update_user_activity",
         "user_id": user_id,
         "field": field,
-        "old_value": old_list,
-        "new_value": current_list,
+        "old_value": truncate_list(old_list),
+        "new_value": truncate_list(current_list),
+        "total_items": len(current_list),
         "updated": updated,
         "message": f"{'Added' if updated else 'No change'} to {field} for user {user_id}.",
     }
 
 explainer_agent = Agent(
     name="explainer_agent",
-    model="gemini-2.0-flash",
+    model=agent_model(),
     description="Agent that generates possible explanations for a user's action or query",
-    instruction = """
+    instruction = compact_instruction("""
 You are an explanation-processing agent with access to user activity tools and a summarization agent.
 
 Your task is to handle structured user queries that describe a recent action (such as watching a movie, purchasing a product, or listening to music), and update relevant user data and summaries accordingly. Your main goal is to proceed with all the flows mentioned in the workflow below, ensuring that you follow each step sequentially without skipping any.
-After each step, record the result into a variable, then explicitly check if you have completed all 8 steps before finishing. At each step, print "Currently in step X" to indicate your progress, where X is the step number.
+After each step, record the result into a variable. At each step, print "Currently in step X" to indicate your progress, where X is the step number.
 
-Also, after every step completion, you **must** call the tool `increment_step_no(tool_context)` to update the step count.
-At the end of each step, check whether the returned `step_no` equals 9. If yes, stop the workflow immediately, as all 8 steps are now completed.
+Step control (applies to EVERY step below, without exception):
+- When a step is done, ask yourself whether you have any more steps to perform, then you **must** call `increment_step_no(tool_context)`.
+- If the returned `step_no` equals 9, all 8 steps are completed: stop immediately. Otherwise continue with the next step.
+- Proceed through all 8 steps even if a tool returns a success message. DO NOT stop after printing.
 
 Input Format:
 - Natural language query of the form: "I <action> <item> (source: <Platform>)"
@@ -530,13 +686,19 @@ Source Mapping:
 - "Spotify" → "music"
 - "Amazon" → "product"
 
+Multi-Item Messages:
+If the query reports MORE THAN ONE item (e.g. "I watched Inception, Tenet and Dunkirk on Amazon Prime"), do not run the workflow below once per item. Instead:
+   B1. Extract every item and infer its activity type, then call `process_activity_batch(activity_types, item_names, tool_context)` once with all of them (two lists in the same order).
+   B2. For each domain in the returned `domains`, call the `summarizer_agent` once with (current_summary, user_query, description_of_query) from that entry, then store its result with `set_user_pref_summary(activity_type, new_summary, tool_context)`.
+   B3. Call the `recommendation_agent` once with "Recommend based on my recent activity (baseActivity)", using the returned `base_activity`.
+   B4. Mention any titles listed in `not_found`, then stop.
+For a single item, follow the workflow below.
+
 Workflow:
 
 STEP - 1. **Parse and Infer Activity Type**:
    - Extract the item (e.g., "Small Soldiers") and source (e.g., "Amazon Prime") from the input.
    - Infer `activity_type` using the Source Mapping.
-   - Ask yourself whether you have any more steps to perform or not.
-   - ✅ Then call: `increment_step_no(tool_context)` and check if `step_no == 9`. If yes, stop.
 
 STEP - 2. **Map Activity Type to DB Field**:
    - Map `activity_type` to:
@@ -544,55 +706,41 @@ STEP - 2. **Map Activity Type to DB Field**:
      → "music" → `listened_music`
      → "product" → `products_purchased`
    - Call `update_user_activity(field, item, tool_context)`.
-   - Ask yourself whether you have any more steps to perform or not.
-   - ✅ Then call: `increment_step_no(tool_context)` and check if `step_no == 9`. If yes, stop.
 
 STEP - 3. **Activity Type to Summary Field Mapping**:
    - Map `activity_type` to summary field:
      → "movie" → `movie_pref_summary`
      → "music" → `music_pref_summary`
      → "product" → `product_pref_summary`
-   - Ask yourself whether you have any more steps to perform or not.
-   - ✅ Then call: `increment_step_no(tool_context)` and check if `step_no == 9`. If yes, stop.
 
 STEP - 4. **Fetch**:
     - First, fetch the current summary by using the `get_user_pref_summary(activity_type, tool_context)` tool where you pass the activity type as either movie/music/product. 
-    - Store the response from the `get_user_pref_summary(activity_type, tool_context)` tool call in `current_summary`.
+    - Store the response from the `get_user_pref_summary(activity_type, tool_context)` tool call (its 'value' field) in `current_summary`.
     - Secondly, fetch the metadata-based description of the item using the tool `get_item_description(activity_type, item_name, tool_context)` where:
         - `activity_type` is one of ["movie", "music", "product"]
         - `item_name` is the exact item string extracted from the user query (e.g., movie title or product name)
     - Store the `description` field from the tool response in a variable called `description_of_query`.
-
-    NOTE: USE THE TOOL `get_user_pref_summary(activity_type, tool_context)` TO GET THE CURRENT SUMMARY AND `get_item_description(activity_type, item_name, tool_context)` TO GET THE DESCRIPTION OF THE USER'S ITEM. ONCE WE GET BOTH THE SUMMARY AND DESCRIPTION, THEN ONLY YOU SHOULD MAKE THE CALL TO SUMMARIZER AGENT - summarizer_agent (YOU HAVE ACCESS TO THIS)
-    - Ask yourself whether you have any more steps to perform or not.
-    - ✅ Then call: `increment_step_no(tool_context)` and check if `step_no == 9`. If yes, stop.
+    - Only once both `current_summary` and `description_of_query` are set, move on to the summarizer agent.
 
 STEP - 5. **Summarize**:
     - Now, call the summarizer agent (`summarizer_agent`) with the following input tuple:
         → `(current_summary, user_query, description_of_query)`
     IMP: YOU HAVE ACCESS TO THE SUMMARIZER AGENT, SO YOU CAN CALL IT OR TRANSFER THE CONTROL TO IT.
-    - Ask yourself whether you have any more steps to perform or not.
-    - ✅ Then call: `increment_step_no(tool_context)` and check if `step_no == 9`. If yes, stop.
 
 STEP - 6. **Update Summary in DB**:
     - Use set_user_pref_summary(activity_type, new_summary, tool_context) to update the corresponding summary field (movie_pref_summary, music_pref_summary, or product_pref_summary) in the database.
         - `activity_type` is one of ["movie", "music", "product"]
         - `new_summary` is the summary returned by the summarizer agent.
-    NOTE: TO UPDATE THE MOVIE PREFERENCE SUMMARY / MUSIC PREFERENCE SUMMARY / PRODUCT PREFERENCE SUMMARY, USE THE TOOL `set_user_pref_summary(activity_type, new_summary, tool_context)`.
-    - Ask yourself whether you have any more steps to perform or not.
-    - ✅ Then call: `increment_step_no(tool_context)` and check if `step_no == 9`. If yes, stop.
 
 STEP - 7. **Recalculate Embeddings**:
    - Call `calculate_user_embeddings(activity_type, user_query, description_of_query, tool_context)` to refresh the user vector in Pinecone.
-   - The embedding vector has 4 parts (movie_emb, music_emb, product_emb, collective_emb), each 384-dim, stored as one concatenated 1536-dim vector in the "user-preference-vector" index.
+   - The embedding vector has 4 parts (movie_emb, music_emb, product_emb, collective_emb), each 384-dim. The tool reads and writes the parts in Pinecone itself; you never handle the vector.
    - `collective_emb` is a weighted average of the individual embeddings, with weights proportional to the number of items watched/listened/purchased:
        - movies_watched → `movie_emb`
        - listened_music → `music_emb`
        - products_purchased → `product_emb`
        - Weights = (count / total_count), obtained from the SQLite database.
    - Only the updated section and collective part are recomputed and written back.
-   - Ask yourself whether you have any more steps to perform or not.
-   - ✅ Then call: `increment_step_no(tool_context)` and check if `step_no == 9`. If yes, stop.
 
 STEP - 8. **Call Recommendation Agent**:
    - Once you have updated the embeddings using `calculate_user_embeddings`, immediately trigger a recommendation request to the `recommendation_agent`.
@@ -600,22 +748,13 @@ STEP - 8. **Call Recommendation Agent**:
    - Format the query as: "Recommend based on my recent activity (baseActivity)"
        - Example: "Recommend based on my recent activity (movie)"
    - Call the `recommendation_agent`, passing this formatted query and you must make sure this step is completed
-   - Ask yourself whether you have any more steps to perform or not.
-   - ✅ Then call: `increment_step_no(tool_context)` and check if `step_no == 9`. If yes, stop.
 
 Rules:
 - Always extract `item` and `source` accurately.
 - Do not generate explanations — only structured updates.
 - Perform all eight steps sequentially for each query - MUST REQUIREMENT
-- After each step, verify whether you have any remaining steps to perform or not. This will ensure that you do not skip any step.
-
-MUST TO FOLLOW INFO NO MATER WHAT: 
 - After calling any tool, you MUST use its output.
-- Store the value of 'value' from `get_user_pref_summary(...)` into a variable called `current_summary`.
-- Store the 'description' field from `get_item_description(...)` into a variable called `description_of_query`.
-- Once both variables are populated, call the `summarizer_agent` with: (current_summary, user_query, description_of_query)
-- MOST IMPORTANT OF ALL (FAILING TO DO SO WILL COST US MILLIONS): You MUST proceed through all 8 steps, even if some tool returns a success message. DO NOT stop after printing.
-""",
+""", agent_name="explainer_agent"),
 #     instruction = """
 # You are an explanation-processing agent with access to user activity tools and a summarization agent.
 
@@ -706,6 +845,17 @@ MUST TO FOLLOW INFO NO MATER WHAT:
 # - Once both variables are populated, call the `summarizer_agent` with: (current_summary, user_query, description_of_query)
 # - MOST IMPORTANT OF ALL (FAILING TO DO SO WILL COST US MILLIONS): You MUST proceed through all 8 steps, even if some tool returns a success message. DO NOT stop after printing.
 # """,
-    tools=[update_user_activity, get_user_pref_summary, get_item_description, set_user_pref_summary, calculate_user_embeddings, increment_step_no],
+    # Tools that touch SQLite, Pinecone or the embedding model run off the event loop
+    tools=[
+        off_loop(update_user_activity), off_loop(get_user_pref_summary), off_loop(get_item_description),
+        off_loop(set_user_pref_summary), off_loop(calculate_user_embeddings), increment_step_no,
+        off_loop(process_activity_batch),
+    ],
     sub_agents=[summarizer_agent, recommendation_agent],
+    before_agent_callback=before_agent,
+    after_agent_callback=after_agent,
+    before_model_callback=before_model,
+    after_model_callback=after_model,
+    before_tool_callback=before_tool,
+    after_tool_callback=after_tool,
 )
\ No newline at end of file
@@ -1,10 +1,31 @@
-from pinecone import Pinecone
 import os
-import json
-import sqlite3
+from concurrent.futures import Future
+
 from google.adk.tools.tool_context import ToolContext
 from google.adk.agents import Agent
 
+from retrieval.config import SLICE_NAMES
+from retrieval.engine import get_scorer, mode_for
+from retrieval.metadata_store import RECOMMENDATION_FIELDS, get_metadata_store
+from retrieval.neighbours import get_neighbour_table
+from retrieval.pinecone_client import get_index
+from retrieval.popularity import get_popularity_lists
+from retrieval.precompute import get_precomputed_table
+from retrieval.user_store import join_slices, read_slices
+from retrieval.user_vectors import user_vector_cache, vector_version
+from runtime.call_gate import get_gate, off_loop
+from runtime.callbacks import after_agent, after_model, after_tool, before_agent, before_model, before_tool
+from runtime.prompts import agent_model, compact_instruction
+from runtime.tool_output import ROW_SEPARATOR, compact_rows
+from runtime.tracing import span
+from runtime.user_context import credit_prefetch, get_user_row
+
+# Items per domain added from the item-to-item tables for the newest consumption
+NEIGHBOUR_RECS = int(os.getenv("NEIGHBOUR_RECS", "2"))
+# Below this many consumed items a slice is still the random initial vector: serve
+# the popularity list instead (per domain for domain slices, in total for the collective one)
+COLD_START_MIN_ITEMS = int(os.getenv("COLD_START_MIN_ITEMS", "1"))
+
 
 def get_recommendations_based_on_activity(base_activity: str, tool_context: ToolContext) -> dict:
     """
@@ -17,12 +38,6 @@ def get_recommendations_based_on_activity(base_activity: str, tool_context: Tool
     Returns:
         A dictionary containing recommendations for each activity.
     """
-    import os
-    import sqlite3
-    import json
-    import numpy as np
-    from pinecone import Pinecone
-
     print("========== ENTERING get_recommendations_based_on_activity ==========")
     print(f"[INFO] Base activity: {base_activity}")
 
@@ -33,51 +48,81 @@ def get_recommendations_based_on_activity(base_activity: str, tool_context: Tool
 
     print(f"[INFO] Retrieved user_id: {user_id}")
 
-    # Initialize Pinecone client and fetch user vector
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    user_index = pc.Index("user-preference-vector")
-    print("[INFO] Fetching user vector from Pinecone...")
-    
-    response = user_index.fetch(ids=[user_id])
-    vector = response.vectors.get(user_id)
-    if not vector:
-        print("[ERROR] No embedding vector found in Pinecone for this user.")
-        return {"status": "error", "message": "No embedding vector found for user."}
-    
-    vector = vector.values
-    print("[INFO] User vector fetched and unpacked.")
-
-    # Split unified vector into sections
-    movie_emb = vector[0:384]
-    music_emb = vector[384:768]
-    product_emb = vector[768:1152]
-    collective_emb = vector[1152:1536]
-    print("[INFO] Split 1536D unified embedding into 4 x 384D components.")
-
-    # Fetch user activity history
-    print("[INFO] Fetching watched/listened/purchased history from SQLite...")
-    conn = sqlite3.connect("D:/GoogleADK_ProjectWork/databases/user_activity.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT movies_watched, listened_music, products_purchased FROM user_activity WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
+    # Fetch user activity history (first: it decides whether the user vector is needed at all)
+    print("[INFO] Fetching watched/listened/purchased history...")
+    row = get_user_row(user_id)
 
     if not row:
         print("[ERROR] No row found in user_activity table.")
         return {"status": "error", "message": "No activity data found for user."}
 
-    movies_watched = set(json.loads(row[0]) if row[0] else [])
-    listened_music = set(json.loads(row[1]) if row[1] else [])
-    products_purchased = set(json.loads(row[2]) if row[2] else [])
+    movies_watched = row["movies_watched"]
+    listened_music = row["listened_music"]
+    products_purchased = row["products_purchased"]
     print(f"[INFO] Watched movies: {movies_watched}")
     print(f"[INFO] Listened music: {listened_music}")
     print(f"[INFO] Purchased products: {products_purchased}")
 
-    exclusion_map = {
+    # Lists are appended in consumption order, so the last entry is the newest item
+    history_map = {
         "movie": movies_watched,
         "music": listened_music,
         "product": products_purchased,
     }
+    exclusion_map = {activity: {str(i) for i in items} for activity, items in history_map.items()}
+
+    # Cold start: slices without enough activity behind them are served from the popularity lists
+    popular = get_popularity_lists()
+    total_items = sum(len(items) for items in history_map.values())
+
+    def is_cold(activity: str, source: str) -> bool:
+        if popular is None or activity not in popular:
+            return False
+        consumed = len(history_map[activity]) if source == "domain" else total_items
+        return consumed < COLD_START_MIN_ITEMS
+
+    # Only the slices of warm queries are read
+    needed = [activity for activity in history_map if not is_cold(activity, "domain")]
+    if not all(is_cold(activity, "collective") for activity in history_map):
+        needed.append("collective")
+    needs_vector = bool(needed)
+
+    # Fetch user vector (cached after each write and by the session-start prefetch)
+    pinecone_gate = get_gate("pinecone")
+    cached = user_vector_cache.get(user_id) if needs_vector else None
+    if not needs_vector:
+        vector, version = None, None
+        print("[COLD START] No activity yet; serving popularity lists without a vector search.")
+    elif cached is not None:
+        vector, version = cached
+        credit_prefetch(user_id, "user_vector")
+        print("[INFO] User vector served from the in-process cache.")
+    else:
+        print(f"[INFO] Fetching user vector slices {needed} from Pinecone...")
+        slices = read_slices(user_id, needed, pinecone_gate.call)
+        if not slices:
+            print("[ERROR] No embedding vector found in Pinecone for this user.")
+            return {"status": "error", "message": "No embedding vector found for user."}
+
+        # Slices that were not read are zeros; their queries are served from the popularity lists
+        vector = join_slices(slices)
+        version = vector_version(vector)
+        if len(slices) == len(SLICE_NAMES):
+            user_vector_cache.put(user_id, vector, version)
+        print("[INFO] User vector fetched and unpacked.")
+
+    # Split unified vector into sections
+    if vector is not None:
+        movie_emb = vector[0:384]
+        music_emb = vector[384:768]
+        product_emb = vector[768:1152]
+        collective_emb = vector[1152:1536]
+        print("[INFO] Split 1536D unified embedding into 4 x 384D components.")
+    else:
+        movie_emb = music_emb = product_emb = collective_emb = None
+
+    # Nightly precomputed results stay valid while the vector is unchanged
+    precomputed = get_precomputed_table()
 
     index_map = {
         "movie": {"name": "movies-list", "emb": movie_emb},
@@ -85,45 +130,156 @@ def get_recommendations_based_on_activity(base_activity: str, tool_context: Tool
         "product": {"name": "products-list", "emb": product_emb},
     }
 
-    def query_index(index_name: str, vector: list, top_k: int, exclude_ids: set):
+    # Metadata already returned by Pinecone queries, keyed by item ID
+    known_metadata = {}
+    # Domains with a local metadata store only ask Pinecone for IDs and scores
+    metadata_stores = {activity: get_metadata_store(activity) for activity in index_map}
+
+    def query_index(activity: str, vector: list, top_k: int, exclude_ids: set):
+        index_name = index_map[activity]["name"]
+        include_metadata = metadata_stores[activity] is None
         print(f"[QUERY] Index: {index_name} | TopK: {top_k} | Excluding IDs: {exclude_ids}")
-        index = pc.Index(index_name)
-        results = index.query(vector=vector, top_k=top_k + len(exclude_ids), include_metadata=True)
-        recs = []
+        index = get_index(index_name)
+        results = pinecone_gate.call(
+            None, index.query, vector=vector.tolist(), top_k=top_k + len(exclude_ids), include_metadata=include_metadata
+        )
+        ids = []
         for match in results.matches:
             if match.id not in exclude_ids:
-                recs.append(match.metadata)
-            if len(recs) == top_k:
+                ids.append(match.id)
+                if include_metadata:
+                    known_metadata[match.id] = match.metadata
+            if len(ids) == top_k:
                 break
-        print(f"[RESULT] Retrieved {len(recs)} items from {index_name}")
-        return recs
+        print(f"[RESULT] Retrieved {len(ids)} items from {index_name}")
+        return ids
 
-    recommendations = {}
+    def hydrate(activity: str, ids: list):
+        missing = [i for i in dict.fromkeys(ids) if i not in known_metadata]
+        store = metadata_stores[activity]
+        if missing and store is not None:
+            with span("metadata.local_hydrate", domain=activity, items=len(missing)):
+                for i in missing:
+                    record = store.record(i, RECOMMENDATION_FIELDS[activity])
+                    if record is not None:
+                        known_metadata[i] = record
+        elif missing:
+            response = pinecone_gate.call(
+                ("fetch", activity, tuple(missing)), get_index(index_map[activity]["name"]).fetch, ids=missing
+            )
+            for i in missing:
+                if i in response.vectors:
+                    known_metadata[i] = response.vectors[i].metadata
+        return [known_metadata[i] for i in ids if i in known_metadata]
+
+    def serve_precomputed(activity: str, source: str, top_k: int, exclude_ids: set):
+        if precomputed is None:
+            return None
+        candidates = precomputed.lookup(user_id, version, activity, source)
+        if candidates is None:
+            return None
+        ids = [item_id for item_id, _ in candidates if item_id not in exclude_ids][:top_k]
+        if len(ids) < top_k:
+            # Too many candidates consumed since the batch run, fall back to a live query
+            return None
+        print(f"[PRECOMPUTED] {activity}/{source} | TopK: {top_k} | IDs: {ids}")
+        return ids
+
+    # Popular items already picked for a domain, so its two cold slices do not repeat them
+    popular_taken = {activity: set() for activity in history_map}
+
+    def serve_popular(activity: str, source: str, top_k: int, exclude_ids: set):
+        picks = popular.lookup(activity, exclude_ids | popular_taken[activity], top_n=top_k)
+        ids = [item_id for item_id, _ in picks]
+        popular_taken[activity].update(ids)
+        print(f"[COLD START] {activity}/{source} | TopK: {top_k} | Popular IDs: {ids}")
+        return ids
+
+    # Local catalogs are searched through a shared micro-batching scorer, so the
+    # six queries of this call (and those of concurrent calls) share one matmul
+    retrieval_modes = tool_context.state.get("retrieval_modes") or {}
+    credit_prefetch(user_id, "local_indices")
+    pending = {}
 
     for activity in ["movie", "music", "product"]:
         print(f"\n---------- RECOMMENDING FOR: {activity.upper()} ----------")
         if activity == base_activity:
             print("[MODE] Base activity mode: 3 domain + 2 common")
-            domain_recs = query_index(index_map[activity]["name"], index_map[activity]["emb"], 3, exclusion_map[activity])
-            common_recs = query_index(index_map[activity]["name"], collective_emb, 2, exclusion_map[activity])
+            domain_k, common_k = 3, 2
         else:
             print("[MODE] Secondary activity mode: 3 common + 2 domain")
-            domain_recs = query_index(index_map[activity]["name"], index_map[activity]["emb"], 2, exclusion_map[activity])
-            common_recs = query_index(index_map[activity]["name"], collective_emb, 3, exclusion_map[activity])
-        recommendations[activity] = domain_recs + common_recs
+            domain_k, common_k = 2, 3
+        scorer = get_scorer(activity, mode_for(activity, retrieval_modes))
+        for source, emb, top_k in (
+            ("domain", index_map[activity]["emb"], domain_k),
+            ("collective", collective_emb, common_k),
+        ):
+            if is_cold(activity, source):
+                pending[(activity, source)] = serve_popular(activity, source, top_k, exclusion_map[activity])
+                continue
+            ids = serve_precomputed(activity, source, top_k, exclusion_map[activity])
+            if ids is None and scorer is not None:
+                print(f"[LOCAL] {activity}/{source} | TopK: {top_k} | Excluding IDs: {exclusion_map[activity]}")
+                ids = scorer.submit(emb, top_k, exclusion_map[activity])
+            elif ids is None:
+                ids = query_index(activity, emb, top_k, exclusion_map[activity])
+            pending[(activity, source)] = ids
 
-    print("========== LEAVING get_recommendations_based_on_activity ==========")
-    return {
+    recommended_ids = {}
+    with span("vector.local_search_wait"):
+        for activity in ["movie", "music", "product"]:
+            recommended_ids[activity] = []
+            for source in ("domain", "collective"):
+                ids = pending[(activity, source)]
+                if isinstance(ids, Future):
+                    ids = [item_id for item_id, _ in ids.result()]
+                recommended_ids[activity].extend(ids)
+
+    # "Because you just consumed X": O(1) lookups in the item-to-item tables
+    base_history = history_map.get(base_activity, [])
+    recent_item = str(base_history[-1]) if base_history else None
+    neighbour_ids = {}
+    neighbours = get_neighbour_table()
+    if neighbours is not None and recent_item is not None:
+        for activity in ["movie", "music", "product"]:
+            exclude = exclusion_map[activity] | set(recommended_ids[activity])
+            picks = neighbours.lookup(base_activity, recent_item, activity, exclude, top_n=NEIGHBOUR_RECS)
+            if picks:
+                neighbour_ids[activity] = [item_id for item_id, _ in picks]
+        print(f"[NEIGHBOURS] Because of {base_activity} {recent_item}: {neighbour_ids}")
+
+    recommendations = {}
+    for activity in ["movie", "music", "product"]:
+        # One metadata fetch per domain covers both result sets (and the recent item)
+        extra = [recent_item] if neighbour_ids and activity == base_activity else []
+        hydrate(activity, recommended_ids[activity] + neighbour_ids.get(activity, []) + extra)
+        recommendations[activity] = compact_rows(hydrate(activity, recommended_ids[activity]), RECOMMENDATION_FIELDS[activity])
+
+    # Items are returned as one " | "-joined row of these fields to keep the LLM context small
+    result = {
         "status": "success",
         "message": f"Recommendations fetched for base activity '{base_activity}'.",
+        "fields": {activity: ROW_SEPARATOR.join(fields) for activity, fields in RECOMMENDATION_FIELDS.items()},
         "recommendations": recommendations
     }
+    if neighbour_ids:
+        recent_record = known_metadata.get(recent_item)
+        result["because_you_just_consumed"] = {
+            "item": compact_rows([recent_record], RECOMMENDATION_FIELDS[base_activity])[0] if recent_record else recent_item,
+            **{
+                activity: compact_rows(hydrate(activity, ids), RECOMMENDATION_FIELDS[activity])
+                for activity, ids in neighbour_ids.items()
+            },
+        }
+
+    print("========== LEAVING get_recommendations_based_on_activity ==========")
+    return result
 
 recommendation_agent = Agent(
     name="recommendation_agent",
-    model="gemini-2.0-flash",
+    model=agent_model(),
     description="Agent that generates recommendations for a user's action or query",
-    instruction = """
+    instruction = compact_instruction("""
 You are a recommendation agent with access to user activity tools.
 
 Your task is to handle structured user queries that describe a base activity (such as movie, music, or product), and call the `get_recommendations_based_on_activity` function.
@@ -141,13 +297,21 @@ Workflow:
 STEP - 1. **Use get_recommendations_based_on_activity**:
    - Call the function `get_recommendations_based_on_activity` with the baseActivity type and the tool context.
    - This function will return a dictionary with recommendations for each activity type based on the user's past activity and preferences.
+   - Each recommended item is a single row whose values are separated by " | ", in the order given by `fields` for its domain:
+        -> movies: title, genres, release_date, tagline
+        -> music: track_name, artists, album_name, track_genre
+        -> products: title, category, price, stars
    - Just return the recommendations as is in a structured format.
-        -> For movies, just give title, genre, release_date, and tagline.
-        -> For music, just give track_name, artists, album_name, and track_genre.
-        -> For products, just give title, category, price, and stars.
+   - If the result contains `because_you_just_consumed`, also list those items (same fields) under a heading such as "Because you just watched <item title>".
 
 MUST DO: 
 - YOU MUST RETURN THE RESULT AND CONTROL BACK TO THE AGENT WHO CALLED YOU. DON'T TERMINATE WITHOUT DOING THIS.
-""",
-    tools=[get_recommendations_based_on_activity],
+""", agent_name="recommendation_agent"),
+    tools=[off_loop(get_recommendations_based_on_activity)],
+    before_agent_callback=before_agent,
+    after_agent_callback=after_agent,
+    before_model_callback=before_model,
+    after_model_callback=after_model,
+    before_tool_callback=before_tool,
+    after_tool_callback=after_tool,
 )
\ No newline at end of file
@@ -1,10 +1,13 @@
 from google.adk.agents import Agent
 
+from runtime.callbacks import after_agent, after_model, before_agent, before_model
+from runtime.prompts import agent_model, compact_instruction
+
 summarizer_agent = Agent(
     name="summarizer_agent",
-    model="gemini-2.0-flash",
+    model=agent_model(),
     description="Agent that summarizes user preferences given a current summary, user query, and item description.",
-    instruction="""
+    instruction=compact_instruction("""
 You are a summarization agent that maintains concise summaries of user preferences across categories like movies, music, and products.
 
 You will be passed a tuple of the form: (current_summary: str, user_query: str, description_of_query: str)
@@ -51,16 +54,16 @@ Loved Products: [Air fryer, Noise-canceling headphones]
 Okish Products: [Smartwatch]
 Did not like Products: [Electric toothbrush]
 
-(If any of these lists are empty or missing from the current summary, initialize and populate them accordingly.)
-
 IMPORTANT:
 - DO NOT drop any part of the old summary unless it’s clearly redundant.
-- Use detailed elaboration especially for sparse summaries, using movie genres, music styles, product features etc.
 - Summary will be used for future recommendations, so it must reflect the **essence** of user preferences—not just surface-level details.
-- Do not exceed character or line limits under any circumstance.
 - YOU SHOULD FOLLOW THE STRUCTURE MENTIONED ABOVE TO RETURN THE SUMMARY AND THE LISTS IN THE SAME RESPONSE. FAILING TO DO SO WILL RESULT IN AN ERROR.
 
 MUST DO: 
 - YOU MUST RETURN THE RESULT AND CONTROL BACK TO THE AGENT WHO CALLED YOU. DON'T TERMINATE WITHOUT DOING THIS.
-"""
+""", agent_name="summarizer_agent"),
+    before_agent_callback=before_agent,
+    after_agent_callback=after_agent,
+    before_model_callback=before_model,
+    after_model_callback=after_model,
 )
\ No newline at end of file
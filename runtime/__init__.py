@@ -0,0 +1 @@
+"""Serving-side helpers shared by the agents: tool output shaping, sessions, instrumentation."""
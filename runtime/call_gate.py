@@ -0,0 +1,295 @@
+"""Shared gate for calls to external services (Pinecone, Gemini).
+
+Each upstream gets one ``CallGate`` that, in order:
+
+1. coalesces identical in-flight requests (singleflight): concurrent callers
+   with the same key wait for the leader's result instead of re-issuing it;
+2. bounds concurrency with an AIMD limit that shrinks when a call is throttled
+   or much slower than the recent latency of its operation (fetch, query,
+   upsert, ...), and slowly grows back while the upstream is fast;
+3. paces requests with a token bucket;
+4. retries retryable failures (429 / 5xx / timeouts) with full-jitter
+   exponential backoff.
+
+Limits are configured per upstream through ``GATE_<NAME>_RATE``,
+``GATE_<NAME>_BURST`` and ``GATE_<NAME>_CONCURRENCY``; ``gate_stats`` reports
+coalesced calls, throttling events and retries.
+
+``call`` waits by blocking its thread. ADK runs synchronous tools on the
+event loop, so tools that call through a gate are registered with
+``off_loop``, which runs them in a worker thread; a pacing wait or a retry
+backoff then only delays its own session. Coroutines on the loop use
+``call_async`` instead: model requests go through it from the agents'
+models (``runtime.prompts.agent_model``).
+"""
+
+import asyncio
+import functools
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from .tracing import span
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = ("Timeout", "ResourceExhausted", "ServiceUnavailable", "TooManyRequests", "RateLimit")
+
+MAX_RETRIES = int(os.getenv("GATE_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("GATE_BACKOFF_BASE", "0.2"))
+BACKOFF_CAP = float(os.getenv("GATE_BACKOFF_CAP", "5.0"))
+
+# upstream -> (requests per second, burst, max concurrency)
+DEFAULT_LIMITS = {
+    "pinecone": (50.0, 20, 16),
+    "gemini": (10.0, 5, 8),
+}
+
+
+def is_retryable(exc):
+    """Whether a failure is transient (throttled, unavailable or timed out)."""
+    for attr in ("status", "status_code", "code"):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int) and status in RETRYABLE_STATUS:
+            return True
+    return any(name in type(exc).__name__ for name in RETRYABLE_NAMES)
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second, holding at most ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token and return how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit driven by latency and throttling.
+
+    The limit grows by ``1 / limit`` per fast success and is cut by
+    ``decrease`` when a call is throttled or takes longer than ``tolerance``
+    times the baseline latency of its operation. The baseline is an EWMA
+    (weight ``alpha``) per operation, so fast fetches do not make every query
+    look slow, and it follows lasting shifts in upstream latency. An operation
+    is not judged until it has ``warmup`` samples.
+    """
+
+    def __init__(self, max_limit, min_limit=1, tolerance=2.0, decrease=0.7, alpha=0.1, warmup=5):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.tolerance = tolerance
+        self.decrease = decrease
+        self.alpha = alpha
+        self.warmup = warmup
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        # operation -> (EWMA latency in seconds, samples)
+        self.baselines = {}
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self, poll=0.005):
+        """``acquire`` for the event loop: polls instead of blocking the thread."""
+        while True:
+            with self._cond:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+            await asyncio.sleep(poll)
+
+    def release(self, latency=None, throttled=False, op="call"):
+        with self._cond:
+            self.in_flight -= 1
+            slow = False
+            if latency is not None:
+                baseline, samples = self.baselines.get(op, (latency, 0))
+                slow = samples >= self.warmup and latency > self.tolerance * baseline
+                self.baselines[op] = (baseline + self.alpha * (latency - baseline), samples + 1)
+            if throttled or slow:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class CallGate:
+    """Singleflight + adaptive concurrency + token bucket + retries for one upstream."""
+
+    def __init__(self, name, rate, burst, max_concurrency, max_retries=MAX_RETRIES):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = AdaptiveLimit(max_concurrency)
+        self.max_retries = max_retries
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0, "throttled": 0, "retries": 0, "failures": 0}
+
+    def call(self, key, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` through the gate.
+
+        Calls sharing a non-None ``key`` while one of them is in flight are
+        coalesced into a single upstream request; pass ``key=None`` for
+        writes and other calls that must not be shared.
+        """
+        with span(f"{self.name}.{getattr(fn, '__name__', 'call')}"):
+            return self._call(key, fn, args, kwargs)
+
+    def _call(self, key, fn, args, kwargs):
+        if key is None:
+            return self._execute(fn, args, kwargs)
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1  # guarded by self._lock
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(self._execute(fn, args, kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return future.result()
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _retry_delay(self, exc, attempt, op):
+        """Release the limit after a failure; re-raise it or return the backoff before the next attempt."""
+        retryable = is_retryable(exc)
+        self.limit.release(throttled=retryable, op=op)
+        if not retryable or attempt >= self.max_retries:
+            self._count("failures")
+            raise exc
+        self._count("retries")
+        delay = backoff_delay(attempt)
+        print(f"[GATE] {self.name}: {type(exc).__name__}, retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+    def _execute(self, fn, args, kwargs):
+        self._count("calls")
+        op = getattr(fn, "__name__", "call")
+        attempt = 0
+        while True:
+            self._pace()
+            self.limit.acquire()
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                time.sleep(self._retry_delay(exc, attempt, op))
+                attempt += 1
+                continue
+            self.limit.release(latency=time.perf_counter() - started, op=op)
+            return result
+
+    async def call_async(self, fn, op="call"):
+        """Await ``fn()`` (a new coroutine per attempt) through the gate without blocking the loop.
+
+        Pacing, the adaptive limit and retries work as in ``call``; nothing is coalesced.
+        """
+        self._count("calls")
+        attempt = 0
+        while True:
+            await self.pace_async()
+            await self.limit.acquire_async()
+            started = time.perf_counter()
+            try:
+                result = await fn()
+            except Exception as exc:
+                await asyncio.sleep(self._retry_delay(exc, attempt, op))
+                attempt += 1
+                continue
+            self.limit.release(latency=time.perf_counter() - started, op=op)
+            return result
+
+    def _pace(self):
+        wait = self.bucket.reserve()
+        if wait > 0:
+            self._count("throttled")
+            time.sleep(wait)
+
+    async def pace_async(self):
+        """Token-bucket pacing for calls issued on the event loop."""
+        wait = self.bucket.reserve()
+        if wait > 0:
+            self._count("throttled")
+            await asyncio.sleep(wait)
+
+    def snapshot(self):
+        baselines = {op: round(latency * 1000, 2) for op, (latency, _) in list(self.limit.baselines.items())}
+        return {**self.stats, "limit": round(self.limit.limit, 2), "in_flight": self.limit.in_flight,
+                "baseline_ms": baselines}
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def get_gate(name):
+    """The process-wide gate of an upstream, created from env/default limits."""
+    with _gates_lock:
+        gate = _gates.get(name)
+        if gate is None:
+            rate, burst, concurrency = DEFAULT_LIMITS.get(name, (20.0, 10, 8))
+            prefix = f"GATE_{name.upper()}_"
+            gate = _gates[name] = CallGate(
+                name,
+                rate=float(os.getenv(prefix + "RATE", rate)),
+                burst=int(os.getenv(prefix + "BURST", burst)),
+                max_concurrency=int(os.getenv(prefix + "CONCURRENCY", concurrency)),
+            )
+        return gate
+
+
+def gate_stats():
+    """Metrics of every gate created so far."""
+    with _gates_lock:
+        return {name: gate.snapshot() for name, gate in _gates.items()}
+
+
+def off_loop(tool):
+    """Wrap a synchronous ADK tool so it runs in a worker thread.
+
+    ADK awaits coroutine tools and calls synchronous ones on the event loop,
+    where a gate's pacing wait or retry backoff would stall every session.
+    The wrapper keeps the tool's name, docstring and signature, which ADK uses
+    for the function declaration and to inject ``tool_context``. Call the
+    original function directly outside ADK.
+    """
+    @functools.wraps(tool)
+    async def run(**kwargs):
+        return await asyncio.to_thread(tool, **kwargs)
+
+    return run
+
@@ -0,0 +1,58 @@
+"""The ADK callbacks every agent is built with.
+
+ADK takes a single callable per callback slot, so the runtime hooks
+(budgets and token accounting, pacing, tool output size, metrics, tracing) are chained here and
+the agents only reference the combined callbacks.
+"""
+
+import inspect
+
+from .llm_usage import enforce_budget, record_llm_usage, record_tool_completion
+from .metrics import metric_model_end, metric_model_start, metric_tool_end, metric_tool_start
+from .tool_output import report_tool_output
+from .tracing import (
+    trace_agent_end,
+    trace_agent_start,
+    trace_model_end,
+    trace_model_start,
+    trace_tool_end,
+    trace_tool_start,
+)
+
+
+def chain_callbacks(*callbacks):
+    """One callback running ``callbacks`` in order.
+
+    The first non-None result short-circuits the rest and is returned, as ADK
+    does for a single callback. The chain is a coroutine function if any of
+    ``callbacks`` is one.
+    """
+    if not any(inspect.iscoroutinefunction(callback) for callback in callbacks):
+        def chained(*args, **kwargs):
+            for callback in callbacks:
+                result = callback(*args, **kwargs)
+                if result is not None:
+                    return result
+            return None
+        return chained
+
+    async def chained_async(*args, **kwargs):
+        for callback in callbacks:
+            result = callback(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            if result is not None:
+                return result
+        return None
+    return chained_async
+
+
+before_agent = trace_agent_start
+after_agent = trace_agent_end
+# The budget check comes first: a degraded (local) answer skips the model and its gate.
+# Model requests are gated by the model itself (runtime.prompts.agent_model), so the
+# model timers include the gate's pacing, limit waits and retries.
+before_model = chain_callbacks(enforce_budget, metric_model_start, trace_model_start)
+after_model = chain_callbacks(record_llm_usage, metric_model_end, trace_model_end)
+before_tool = chain_callbacks(metric_tool_start, trace_tool_start)
+after_tool = chain_callbacks(report_tool_output, record_tool_completion, metric_tool_end, trace_tool_end)
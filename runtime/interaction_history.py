@@ -0,0 +1,106 @@
+"""Append-only interaction history in an indexed SQLite table.
+
+The table is the whole history: a turn's entries are inserted in one
+transaction, the newest ``HISTORY_RING_SIZE`` are read back with ``recent``
+and older ones page by page. Nothing is written to the session, so neither
+recording an interaction nor loading a session grows with the length of the
+conversation.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from .tracing import span
+
+HISTORY_DB = os.getenv("INTERACTION_HISTORY_DB", "./databases/agent_data.db")
+HISTORY_RING_SIZE = int(os.getenv("HISTORY_RING_SIZE", "10"))
+HISTORY_PAGE_SIZE = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS interaction_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_interaction_history_session
+    ON interaction_history (app_name, user_id, session_id, id);
+"""
+
+
+class InteractionHistory:
+    """Indexed, append-only store of interaction entries."""
+
+    def __init__(self, db_path=HISTORY_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path)
+            conn.executescript(SCHEMA)
+        return conn
+
+    def append(self, app_name, user_id, session_id, entries):
+        """Insert entries in one transaction; returns them with their row ``id`` set."""
+        conn = self._conn()
+        stored = []
+        with span("sqlite.append_history", entries=len(entries)), conn:
+            for entry in entries:
+                entry = dict(entry)
+                entry.setdefault("timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                cursor = conn.execute(
+                    "INSERT INTO interaction_history (app_name, user_id, session_id, action, timestamp, entry) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (app_name, user_id, session_id, entry.get("action", "interaction"), entry["timestamp"], json.dumps(entry)),
+                )
+                entry["id"] = cursor.lastrowid
+                stored.append(entry)
+        return stored
+
+    def page(self, app_name, user_id, session_id, before_id=None, limit=HISTORY_PAGE_SIZE):
+        """Newest-first page of entries older than ``before_id`` (keyset pagination).
+
+        Returns ``(entries, next_before_id)``; ``next_before_id`` is None on the last page.
+        """
+        query = "SELECT id, entry FROM interaction_history WHERE app_name = ? AND user_id = ? AND session_id = ?"
+        params = [app_name, user_id, session_id]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        rows = self._conn().execute(query, params).fetchall()
+        entries = [{**json.loads(entry), "id": row_id} for row_id, entry in rows]
+        next_before_id = rows[-1][0] if len(rows) == limit else None
+        return entries, next_before_id
+
+    def recent(self, app_name, user_id, session_id, limit=HISTORY_RING_SIZE):
+        """The newest ``limit`` entries, oldest first."""
+        entries, _ = self.page(app_name, user_id, session_id, limit=limit)
+        return entries[::-1]
+
+    def count(self, app_name, user_id, session_id):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM interaction_history WHERE app_name = ? AND user_id = ? AND session_id = ?",
+            (app_name, user_id, session_id),
+        ).fetchone()[0]
+
+
+def legacy_entries(state_history):
+    """Entries of an in-state ``interaction_history`` that are not in the table yet.
+
+    Older sessions kept the whole history (entries without an ``id``) or a ring
+    of table rows (entries with one) in state.
+    """
+    return [entry for entry in state_history or [] if isinstance(entry, dict) and "id" not in entry]
+
+
+interaction_history = InteractionHistory()
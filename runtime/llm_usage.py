@@ -0,0 +1,174 @@
+"""LLM calls, tokens and model time per agent, per turn and per user, with per-turn budgets.
+
+A turn is one ADK invocation: the root agent and every agent it transfers
+to. ``record_llm_usage`` (``after_model_callback``) accounts each model call
+to its agent in the turn; ``finish_turn`` closes the turn, folds it into the
+user's running totals and returns the summary printed by ``helper``.
+
+Budgets (0 disables a limit):
+- ``TURN_MAX_LLM_CALLS`` (default 40) model calls per turn,
+- ``TURN_MAX_TOKENS`` (default 250000) prompt + completion tokens per turn,
+- ``TURN_MAX_MS`` (default 120000) wall time since the turn's first model call.
+
+Degradation path: once a limit is reached, ``enforce_budget``
+(``before_model_callback``) stops sending requests to the model for the rest
+of the turn. Each further model call is answered locally with a final text
+response naming the limit and the tool calls that did complete. A text-only
+response ends the agent's step loop, so the turn stops instead of the explainer
+spinning through its remaining steps.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+
+from google.adk.models import LlmResponse
+from google.genai import types
+
+from .metrics import registry
+
+TURN_MAX_LLM_CALLS = int(os.getenv("TURN_MAX_LLM_CALLS", "40"))
+TURN_MAX_TOKENS = int(os.getenv("TURN_MAX_TOKENS", "250000"))
+TURN_MAX_MS = float(os.getenv("TURN_MAX_MS", "120000"))
+
+BUDGET_BREACHES = registry.counter("llm_budget_breaches_total", "Turns that reached an LLM budget.", ["limit"])
+DEGRADED_CALLS = registry.counter("llm_degraded_calls_total", "Model calls answered locally after a budget breach.", ["agent"])
+
+USAGE_FIELDS = ("calls", "prompt_tokens", "cached_tokens", "completion_tokens", "ms")
+
+
+def _empty_usage():
+    return dict.fromkeys(USAGE_FIELDS, 0)
+
+
+class TurnUsage:
+    """Model usage of one invocation, per agent."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.started = time.perf_counter()
+        self.agents = defaultdict(_empty_usage)
+        self.completed_tools = []
+        self.breached = None
+        self._model_started = {}
+
+    def totals(self):
+        totals = _empty_usage()
+        for usage in self.agents.values():
+            for field in USAGE_FIELDS:
+                totals[field] += usage[field]
+        return totals
+
+    def over_budget(self):
+        """(limit, used, maximum) of the first limit reached, or None."""
+        totals = self.totals()
+        wall_ms = (time.perf_counter() - self.started) * 1000
+        for limit, used, maximum in (
+            ("calls", totals["calls"], TURN_MAX_LLM_CALLS),
+            ("tokens", totals["prompt_tokens"] + totals["completion_tokens"], TURN_MAX_TOKENS),
+            ("ms", wall_ms, TURN_MAX_MS),
+        ):
+            if maximum and used >= maximum:
+                return limit, used, maximum
+        return None
+
+
+_turns = {}
+# user id -> totals over every finished turn of this process
+user_usage = defaultdict(lambda: {**_empty_usage(), "turns": 0, "budget_breaches": 0})
+_lock = threading.Lock()
+
+
+def _turn(context):
+    with _lock:
+        turn = _turns.get(context.invocation_id)
+        if turn is None:
+            turn = _turns[context.invocation_id] = TurnUsage(context.state.get("user_id"))
+        return turn
+
+
+def degraded_response(turn):
+    limit, used, maximum = turn.breached
+    done = ", ".join(dict.fromkeys(turn.completed_tools)) or "none"
+    text = (
+        f"I had to stop early: this request reached its per-turn {limit} budget "
+        f"({used:.0f} of {maximum:.0f}). Steps completed: {done}. "
+        "Anything already saved is kept; please send the rest again as a new message."
+    )
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def enforce_budget(callback_context, llm_request):
+    """ADK ``before_model_callback``: answer locally once the turn is over budget."""
+    turn = _turn(callback_context)
+    if turn.breached is None:
+        turn.breached = turn.over_budget()
+        if turn.breached is not None:
+            limit, used, maximum = turn.breached
+            BUDGET_BREACHES.labels(limit).inc()
+            print(f"[BUDGET] Turn reached its {limit} budget ({used:.0f}/{maximum:.0f}); degrading")
+    if turn.breached is not None:
+        DEGRADED_CALLS.labels(callback_context.agent_name).inc()
+        return degraded_response(turn)
+    turn._model_started[callback_context.agent_name] = time.perf_counter()
+    return None
+
+
+def record_llm_usage(callback_context, llm_response):
+    """ADK ``after_model_callback``: account the call's tokens and time to its agent and turn.
+
+    Returns None so the model response is passed on unchanged.
+    """
+    turn = _turn(callback_context)
+    agent = callback_context.agent_name
+    started = turn._model_started.pop(agent, None)
+    usage = llm_response.usage_metadata
+    prompt = getattr(usage, "prompt_token_count", None) or 0
+    cached = getattr(usage, "cached_content_token_count", None) or 0
+    completion = getattr(usage, "candidates_token_count", None) or 0
+    elapsed = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    with _lock:
+        stats = turn.agents[agent]
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt
+        stats["cached_tokens"] += cached
+        stats["completion_tokens"] += completion
+        stats["ms"] += elapsed
+    print(f"[PROMPT] {agent}: prompt={prompt} cached={cached} completion={completion} tokens, {elapsed:.0f} ms")
+    return None
+
+
+def record_tool_completion(tool, args, tool_context, tool_response):
+    """ADK ``after_tool_callback``: remember completed tools for the degraded answer."""
+    if not (isinstance(tool_response, dict) and tool_response.get("status") == "error"):
+        _turn(tool_context).completed_tools.append(tool.name)
+    return None
+
+
+def finish_turn(invocation_id):
+    """Close a turn and add it to its user's totals.
+
+    Returns:
+        {"agents": {agent: usage}, "turn": usage, "user": user totals, "breached": limit or None},
+        or None if the turn made no model calls.
+    """
+    with _lock:
+        turn = _turns.pop(invocation_id, None)
+    if turn is None:
+        return None
+    totals = turn.totals()
+    with _lock:
+        user = user_usage[turn.user_id]
+        for field in USAGE_FIELDS:
+            user[field] += totals[field]
+        user["turns"] += 1
+        user["budget_breaches"] += turn.breached is not None
+        user = dict(user)
+    return {
+        "agents": {agent: dict(usage) for agent, usage in turn.agents.items()},
+        "turn": totals,
+        "user": user,
+        "breached": turn.breached[0] if turn.breached else None,
+    }
@@ -0,0 +1,271 @@
+"""Memory accounting for the in-process models, indices and caches, with global caps.
+
+``memory_report()`` attributes memory to:
+- the embedding model (parameter and buffer tensors);
+- each domain's catalog matrix, local index structures and metadata store;
+- the precomputed recommendation, neighbour and popularity tables;
+- the evictable caches: user vectors, user activity rows and sessions.
+
+Arrays memory-mapped from disk are reported as ``mapped``: they are backed by
+the page cache and only partly resident. Everything else is ``heap``. The
+process RSS is reported for comparison. With ``MEMORY_TRACEMALLOC=N`` (frames
+per trace) ``tracemalloc`` is started at import and the report adds the
+largest Python allocation sites.
+
+Caps (0 disables them):
+- ``MEMORY_CACHE_CAP_MB``: cap on the evictable caches together. When they
+  exceed it, the least recently used entries of every cache are evicted in
+  the same proportion until the total fits.
+- ``MEMORY_RSS_CAP_MB``: cap on the process RSS. When it is exceeded, every
+  cache is shrunk by ``MEMORY_RSS_SHRINK`` (default 25%) of its entries.
+
+``enforce_memory_caps()`` runs after each turn, at most every
+``MEMORY_CHECK_INTERVAL`` seconds. The report is printed by the ``/memory``
+command of ``main.py`` and exported as the ``memory_bytes`` metric.
+"""
+
+import math
+import mmap
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from .metrics import registry
+
+MEMORY_CACHE_CAP_MB = float(os.getenv("MEMORY_CACHE_CAP_MB", "0"))
+MEMORY_RSS_CAP_MB = float(os.getenv("MEMORY_RSS_CAP_MB", "0"))
+MEMORY_RSS_SHRINK = float(os.getenv("MEMORY_RSS_SHRINK", "0.25"))
+MEMORY_CHECK_INTERVAL = float(os.getenv("MEMORY_CHECK_INTERVAL", "10"))
+MEMORY_TRACEMALLOC = int(os.getenv("MEMORY_TRACEMALLOC", "0"))
+
+if MEMORY_TRACEMALLOC and not tracemalloc.is_tracing():
+    tracemalloc.start(MEMORY_TRACEMALLOC)
+
+MB = 1024 * 1024
+
+# name -> (usage() -> (bytes, entries), evict_oldest(count) -> evicted)
+_caches = {}
+_lock = threading.Lock()
+_last_check = 0.0
+cap_stats = {"checks": 0, "evictions": 0}
+
+
+def register_cache(name, usage, evict_oldest):
+    """Make a cache visible to the report and subject to the caps."""
+    with _lock:
+        _caches[name] = (usage, evict_oldest)
+
+
+def deep_sizeof(obj, _seen=None):
+    """Approximate bytes of a tree of dicts, lists, strings and arrays."""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes if obj.base is None else 0
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+    return size
+
+
+def _is_mapped(array):
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+def _attributes(obj):
+    # Catalogs are accounted on their own, not inside each index or table that references them
+    return [v for k, v in vars(obj).items() if k not in ("catalog", "catalogs")]
+
+
+def array_bytes(*objects, exclude=(), depth=2):
+    """(heap, mapped) bytes of the numpy arrays held by ``objects``.
+
+    Containers are walked, and objects' attributes up to ``depth`` levels.
+    Arrays in ``exclude`` (e.g. a catalog matrix shared with an index) are not counted.
+    """
+    seen = {id(a) for a in exclude}
+    heap = mapped = 0
+    pending = [(obj, depth) for obj in objects]
+    while pending:
+        obj, level = pending.pop()
+        if isinstance(obj, np.ndarray):
+            if id(obj) not in seen:
+                seen.add(id(obj))
+                if _is_mapped(obj):
+                    mapped += obj.nbytes
+                else:
+                    heap += obj.nbytes
+        elif isinstance(obj, dict):
+            pending.extend((v, level) for v in obj.values())
+        elif isinstance(obj, (list, tuple)):
+            pending.extend((v, level) for v in obj)
+        elif level > 0 and hasattr(obj, "__dict__") and not isinstance(obj, type):
+            pending.extend((v, level - 1) for v in _attributes(obj))
+    return heap, mapped
+
+
+def rss_bytes():
+    """Current resident set size of the process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _model_bytes():
+    from retrieval.embeddings import get_embedding_model
+
+    if not get_embedding_model.cache_info().currsize:
+        return None
+    model = get_embedding_model()
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def component_sizes():
+    """[(component, heap bytes, mapped bytes, entries or None)] of everything loaded so far."""
+    from retrieval.engine import _scorers
+    from retrieval.metadata_store import _stores
+    from retrieval.neighbours import _table_cache as neighbour_cache
+    from retrieval.popularity import _table_cache as popularity_cache
+    from retrieval.precompute import _table_cache as precomputed_cache
+
+    rows = []
+    model = _model_bytes()
+    if model is not None:
+        rows.append(("embedding_model", model, 0, None))
+
+    catalogs = {}
+    for (domain, mode), scorer in list(_scorers.items()):
+        if scorer is None:
+            continue
+        catalog = scorer.index.catalog
+        catalogs[domain] = catalog
+        heap, mapped = array_bytes(scorer.index, exclude=(catalog.vectors, catalog.ids))
+        rows.append((f"index:{domain}/{mode}", heap, mapped, None))
+    for domain, store in list(_stores.items()):
+        if store is not None:
+            catalogs.setdefault(domain, store.catalog)
+            heap, mapped = array_bytes(list(store._columns.values()))
+            rows.append((f"metadata:{domain}", heap, mapped, None))
+    for domain, catalog in catalogs.items():
+        heap, mapped = array_bytes(catalog.vectors, catalog.ids)
+        if catalog._row_of is not None:
+            heap += deep_sizeof(catalog._row_of)
+        rows.append((f"catalog:{domain}", heap, mapped, len(catalog)))
+
+    for name, cache in (
+        ("precomputed_recommendations", precomputed_cache),
+        ("neighbour_tables", neighbour_cache),
+        ("popularity_lists", popularity_cache),
+    ):
+        if cache["table"] is not None:
+            heap, mapped = array_bytes(cache["table"])
+            rows.append((name, heap, mapped, None))
+
+    for name, (usage, _) in _registered():
+        size, entries = usage()
+        rows.append((f"cache:{name}", size, 0, entries))
+    return rows
+
+
+def _registered():
+    _default_caches()
+    with _lock:
+        return list(_caches.items())
+
+
+def _default_caches():
+    if "user_vectors" in _caches:
+        return
+    from retrieval.user_vectors import user_vector_cache
+
+    from .user_context import evict_rows, row_cache_usage
+
+    register_cache("user_vectors", user_vector_cache.memory_usage, user_vector_cache.evict_oldest)
+    register_cache("user_rows", lambda: row_cache_usage(deep_sizeof), evict_rows)
+
+
+def memory_report(top_allocations=10):
+    """Multi-line report of component sizes, process RSS and (if tracing) allocation sites."""
+    rows = component_sizes()
+    lines = [f"{'component':<36} {'heap MB':>9} {'mapped MB':>10} {'entries':>9}"]
+    for name, heap, mapped, entries in sorted(rows, key=lambda r: -(r[1] + r[2])):
+        lines.append(f"{name:<36} {heap / MB:9.1f} {mapped / MB:10.1f} {'' if entries is None else entries:>9}")
+    cache_total = sum(heap for name, heap, _, _ in rows if name.startswith("cache:"))
+    lines.append(
+        f"accounted heap {sum(r[1] for r in rows) / MB:.1f} MB | caches {cache_total / MB:.1f} MB"
+        f"{f' (cap {MEMORY_CACHE_CAP_MB:.0f} MB)' if MEMORY_CACHE_CAP_MB else ''} | "
+        f"process RSS {rss_bytes() / MB:.1f} MB{f' (cap {MEMORY_RSS_CAP_MB:.0f} MB)' if MEMORY_RSS_CAP_MB else ''}"
+    )
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        lines.append(f"tracemalloc: {current / MB:.1f} MB traced (peak {peak / MB:.1f} MB); largest allocation sites:")
+        for stat in snapshot.statistics("lineno")[:top_allocations]:
+            frame = stat.traceback[0]
+            lines.append(f"  {stat.size / MB:8.2f} MB {stat.count:>8} blocks  {frame.filename}:{frame.lineno}")
+    return "\n".join(lines)
+
+
+def _shrink(fraction, caches):
+    evicted = 0
+    for name, (usage, evict_oldest) in caches:
+        _, entries = usage()
+        if entries:
+            evicted += evict_oldest(math.ceil(entries * fraction))
+    return evicted
+
+
+def enforce_memory_caps(force=False):
+    """Evict cache entries while a cap is exceeded; returns the number of entries evicted."""
+    global _last_check
+    if not (MEMORY_CACHE_CAP_MB or MEMORY_RSS_CAP_MB):
+        return 0
+    now = time.monotonic()
+    if not force and now - _last_check < MEMORY_CHECK_INTERVAL:
+        return 0
+    _last_check = now
+    cap_stats["checks"] += 1
+
+    caches = _registered()
+    evicted = 0
+    if MEMORY_CACHE_CAP_MB:
+        cap = MEMORY_CACHE_CAP_MB * MB
+        for _ in range(5):  # entry sizes vary, so re-measure after each round
+            total = sum(usage()[0] for _, (usage, _) in caches)
+            if total <= cap:
+                break
+            evicted += _shrink((total - cap) / total, caches)
+    if MEMORY_RSS_CAP_MB and rss_bytes() > MEMORY_RSS_CAP_MB * MB:
+        evicted += _shrink(MEMORY_RSS_SHRINK, caches)
+    if evicted:
+        cap_stats["evictions"] += evicted
+        print(f"[MEMORY] Evicted {evicted} cache entries to stay under the memory caps")
+    return evicted
+
+
+@registry.collector
+def memory_samples():
+    for name, heap, mapped, _ in component_sizes():
+        yield "memory_bytes", "gauge", "Memory attributed to a component.", {"component": name, "kind": "heap"}, heap
+        if mapped:
+            yield "memory_bytes", "gauge", "Memory attributed to a component.", {"component": name, "kind": "mapped"}, mapped
+    yield "process_resident_memory_bytes", "gauge", "Resident set size.", {}, rss_bytes()
+    yield "memory_cap_evictions_total", "counter", "Cache entries evicted by the memory caps.", {}, cap_stats["evictions"]
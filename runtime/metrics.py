@@ -0,0 +1,363 @@
+"""Always-on counters, gauges and latency histograms in Prometheus text format.
+
+Recording is a couple of attribute updates (plus a ``bisect`` for
+histograms), well under a microsecond, so it stays on in the tool hot paths;
+``python -m runtime.metrics`` measures it. Updates take no lock: under the
+GIL a concurrent increment can very rarely be lost, which is acceptable for
+dashboards and keeps locks off the hot path.
+
+Labelled metrics hand out one child per label-value tuple; hot paths may
+keep the child (``TOOL_SECONDS.labels("get_item_description")``) to skip the
+dict lookup. Statistics the runtime already keeps (gate, prefetch and cache
+counters, queue depths) are read at scrape time by collectors instead of
+being counted twice.
+
+Exposition:
+- ``METRICS_PORT=9464`` serves ``/metrics`` from a background thread;
+- ``METRICS_DUMP_FILE=metrics.prom`` rewrites that file every
+  ``METRICS_DUMP_INTERVAL`` seconds (default 15) and on exit, for the CLI.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = os.getenv("METRICS_PORT", "")
+METRICS_DUMP_FILE = os.getenv("METRICS_DUMP_FILE", "")
+METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", "15"))
+
+# Seconds; spans 1 ms SQLite reads to multi-second LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        # bisect_left: a value equal to a bound belongs to that bound's ("le") bucket
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Family:
+    """A named metric and its children, one per tuple of label values."""
+
+    def __init__(self, name, help, kind, labelnames, make):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._make = make
+        self._children = {}
+        self._lock = threading.Lock()
+        self._default = self.labels() if not self.labelnames else None
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._make())
+        return child
+
+    # Unlabelled families record on their single child directly
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            yield dict(zip(self.labelnames, values)), child
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._families = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _family(self, name, help, kind, labelnames, make):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = Family(name, help, kind, labelnames, make)
+            return family
+
+    def counter(self, name, help, labelnames=()):
+        return self._family(name, help, "counter", labelnames, Counter)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._family(name, help, "gauge", labelnames, Gauge)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        buckets = tuple(sorted(buckets))
+        return self._family(name, help, "histogram", labelnames, lambda: Histogram(buckets))
+
+    def collector(self, fn):
+        """Register ``fn() -> iterable of (name, kind, help, labels, value)``, called at scrape time."""
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            families = list(self._families.values())
+            collectors = list(self._collectors)
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for labels, child in family.samples():
+                if family.kind != "histogram":
+                    lines.append(f"{family.name}{_format_labels(labels)} {_format_value(child.value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(child.bounds + (float("inf"),), list(child.counts)):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{family.name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+                lines.append(f"{family.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+                lines.append(f"{family.name}_count{_format_labels(labels)} {cumulative}")
+
+        collected = {}
+        for fn in collectors:
+            try:
+                for name, kind, help, labels, value in fn():
+                    collected.setdefault(name, (kind, help, []))[2].append((labels, value))
+            except Exception as e:
+                lines.append(f"# collector {getattr(fn, '__name__', fn)} failed: {e}")
+        for name, (kind, help, samples) in collected.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+TOOL_SECONDS = registry.histogram("tool_duration_seconds", "Tool call latency.", ["tool"])
+TOOL_ERRORS = registry.counter("tool_errors_total", "Tool calls that returned status=error.", ["tool"])
+LLM_SECONDS = registry.histogram("llm_request_duration_seconds", "Model call latency per agent.", ["agent"])
+LLM_TOKENS = registry.histogram(
+    "llm_tokens", "Tokens per model call.", ["agent", "kind"], buckets=TOKEN_BUCKETS
+)
+OPERATION_SECONDS = registry.histogram(
+    "operation_duration_seconds",
+    "Latency of SQLite, Pinecone, embedding and local vector operations (by span name).",
+    ["operation"],
+)
+ACTIVE_TURNS = registry.gauge("active_turns", "Turns currently being processed.")
+
+
+# ADK callbacks, chained in runtime.callbacks. Start times are matched by
+# invocation and agent (models) or function call (tools).
+_started = {}
+
+
+def metric_model_start(callback_context, llm_request):
+    _started[("model", callback_context.invocation_id, callback_context.agent_name)] = time.perf_counter()
+    return None
+
+
+def metric_model_end(callback_context, llm_response):
+    agent = callback_context.agent_name
+    started = _started.pop(("model", callback_context.invocation_id, agent), None)
+    if started is not None:
+        LLM_SECONDS.labels(agent).observe(time.perf_counter() - started)
+    usage = llm_response.usage_metadata
+    if usage is not None:
+        LLM_TOKENS.labels(agent, "prompt").observe(usage.prompt_token_count or 0)
+        LLM_TOKENS.labels(agent, "completion").observe(usage.candidates_token_count or 0)
+    return None
+
+
+def metric_tool_start(tool, args, tool_context):
+    _started[("tool", tool_context.invocation_id, tool_context.function_call_id)] = time.perf_counter()
+    return None
+
+
+def metric_tool_end(tool, args, tool_context, tool_response):
+    started = _started.pop(("tool", tool_context.invocation_id, tool_context.function_call_id), None)
+    if started is not None:
+        TOOL_SECONDS.labels(tool.name).observe(time.perf_counter() - started)
+    if isinstance(tool_response, dict) and tool_response.get("status") == "error":
+        TOOL_ERRORS.labels(tool.name).inc()
+    return None
+
+
+@registry.collector
+def runtime_stats():
+    """Counters the runtime already keeps: gates, caches and queues."""
+    from retrieval.engine import _scorers
+    from retrieval.user_vectors import user_vector_cache
+
+    from .call_gate import gate_stats
+    from .user_context import prefetch_stats
+
+    for upstream, stats in gate_stats().items():
+        for stat in ("calls", "coalesced", "throttled", "retries", "failures"):
+            yield f"gate_{stat}_total", "counter", f"Upstream calls through the gate: {stat}.", {"upstream": upstream}, stats[stat]
+        yield "gate_in_flight", "gauge", "Upstream requests in flight.", {"upstream": upstream}, stats["in_flight"]
+        yield "gate_concurrency_limit", "gauge", "Adaptive concurrency limit.", {"upstream": upstream}, stats["limit"]
+        for op, ms in stats["baseline_ms"].items():
+            labels = {"upstream": upstream, "operation": op}
+            yield "gate_baseline_latency_ms", "gauge", "EWMA latency the limit compares calls against.", labels, ms
+    for cache, hits, misses in (
+        ("user_vector", user_vector_cache.hits, user_vector_cache.misses),
+        ("user_row", prefetch_stats["hits"], prefetch_stats["misses"]),
+    ):
+        yield "cache_requests_total", "counter", "Cache lookups.", {"cache": cache, "result": "hit"}, hits
+        yield "cache_requests_total", "counter", "Cache lookups.", {"cache": cache, "result": "miss"}, misses
+    for (domain, mode), scorer in list(_scorers.items()):
+        if scorer is not None:
+            labels = {"domain": domain, "mode": mode}
+            yield "scorer_queue_depth", "gauge", "Queries waiting for the local batch scorer.", labels, scorer._queue.qsize()
+            yield "scorer_batches_total", "counter", "Batches scored by the local scorer.", labels, scorer.stats["batches"]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port):
+    """Serve ``/metrics`` on ``port`` from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer(("", int(port)), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def dump(path):
+    """Write the current metrics to ``path`` atomically."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+def start_periodic_dump(path, interval=METRICS_DUMP_INTERVAL):
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                dump(path)
+            except OSError as e:
+                print(f"[METRICS] Dump to {path} failed: {e}")
+
+    threading.Thread(target=loop, name="metrics-dump", daemon=True).start()
+
+
+def start_exporters():
+    """Start the exporters configured by METRICS_PORT / METRICS_DUMP_FILE."""
+    if METRICS_PORT:
+        serve(METRICS_PORT)
+        print(f"[METRICS] Serving http://localhost:{METRICS_PORT}/metrics")
+    if METRICS_DUMP_FILE:
+        start_periodic_dump(METRICS_DUMP_FILE)
+        print(f"[METRICS] Writing {METRICS_DUMP_FILE} every {METRICS_DUMP_INTERVAL:.0f}s")
+
+
+if __name__ == "__main__":
+    import timeit
+
+    n = 1_000_000
+    histogram = registry.histogram("benchmark_seconds", "Recording cost benchmark.", ["op"])
+    child = histogram.labels("x")
+    counter = registry.counter("benchmark_total", "Recording cost benchmark.", ["op"]).labels("x")
+    for label, fn in (
+        ("counter.inc", counter.inc),
+        ("histogram.observe", lambda: child.observe(0.012)),
+        ("histogram.labels(...).observe", lambda: histogram.labels("x").observe(0.012)),
+    ):
+        per_call = timeit.timeit(fn, number=n) / n * 1e9
+        print(f"{label:>32}: {per_call:6.0f} ns")
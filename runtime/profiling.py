@@ -0,0 +1,175 @@
+"""On-demand profiling of single turns.
+
+A turn is profiled only when asked for, so there is no cost otherwise:
+- ``PROFILE_TURNS=N`` profiles the first N turns of the process;
+- ``request_profile()`` profiles the next turn. ``main.py`` calls it for the
+  ``/profile`` command, and a serving path can call it from a request flag
+  or header.
+
+``PROFILE_MODE=sample`` (default) samples the stack of the event-loop
+thread every ``PROFILE_INTERVAL_MS`` (default 5) from a background thread. It
+writes collapsed stacks (``frame;frame;frame count`` lines, the input of
+flamegraph.pl, speedscope and inferno) to
+``PROFILE_DIR/turn-<session>-<time>.collapsed``. Set
+``PROFILE_ALL_THREADS=1`` to also sample the worker threads (batch scorer,
+session write-back, ...), each stack prefixed with its thread name.
+``PROFILE_MODE=cprofile`` runs ``cProfile`` instead and writes a ``.prof``
+file for pstats or snakeviz. Either way, a top-N summary of the hottest
+functions is printed and written next to the profile as ``.txt``.
+"""
+
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_TURNS = int(os.getenv("PROFILE_TURNS", "0"))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_ALL_THREADS = os.getenv("PROFILE_ALL_THREADS", "0") == "1"
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "15"))
+
+_remaining = PROFILE_TURNS
+_lock = threading.Lock()
+
+
+def request_profile(turns=1):
+    """Profile the next ``turns`` turns."""
+    global _remaining
+    with _lock:
+        _remaining += turns
+
+
+def _take_request():
+    global _remaining
+    if not _remaining:  # Fast path: nothing requested, no lock taken
+        return False
+    with _lock:
+        if _remaining <= 0:
+            return False
+        _remaining -= 1
+        return True
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", os.path.basename(code.co_filename))
+    return f"{module}:{code.co_name}"
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return names[::-1]  # root first, as collapsed stacks expect
+
+
+class StackSampler:
+    """Samples thread stacks from a daemon thread into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval_ms=PROFILE_INTERVAL_MS, all_threads=PROFILE_ALL_THREADS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.all_threads = all_threads
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (not self.all_threads and thread_id != self.thread_id):
+                    continue
+                stack = _stack(frame)
+                if self.all_threads:
+                    if thread_id not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    stack.insert(0, names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(stack)] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, n=PROFILE_TOP_N):
+        """(function, self samples, total samples) of the ``n`` functions with most self samples."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return [(name, count, total[name]) for name, count in own.most_common(n)]
+
+
+def _summary_sampled(sampler, wall_ms, n):
+    lines = [f"{sampler.samples} samples every {sampler.interval * 1000:.0f} ms over {wall_ms:.0f} ms"]
+    lines.append(f"{'self %':>7} {'total %':>8}  function")
+    for name, own, total in sampler.top(n):
+        lines.append(f"{own * 100 / max(sampler.samples, 1):6.1f}% {total * 100 / max(sampler.samples, 1):7.1f}%  {name}")
+    return "\n".join(lines)
+
+
+def _summary_cprofile(profiler, wall_ms, n):
+    out = io.StringIO()
+    out.write(f"cProfile over {wall_ms:.0f} ms\n")
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(n)
+    return out.getvalue()
+
+
+@contextlib.contextmanager
+def _profile(session_id, mode, directory, top_n):
+    os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    stem = os.path.join(directory, f"turn-{session_id}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}")
+    started = time.perf_counter()
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            wall_ms = (time.perf_counter() - started) * 1000
+            path = f"{stem}.prof"
+            profiler.dump_stats(path)
+            summary = _summary_cprofile(profiler, wall_ms, top_n)
+    else:
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            wall_ms = (time.perf_counter() - started) * 1000
+            path = f"{stem}.collapsed"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(sampler.collapsed())
+            summary = _summary_sampled(sampler, wall_ms, top_n)
+    with open(f"{stem}.txt", "w", encoding="utf-8") as f:
+        f.write(f"session {session_id}\n{summary}\n")
+    print(f"[PROFILE] Session {session_id}: {path}\n{summary}")
+
+
+def maybe_profile(session_id):
+    """Context manager profiling this turn if one was requested, else a no-op."""
+    if not _take_request():
+        return contextlib.nullcontext()
+    return _profile(session_id, PROFILE_MODE, PROFILE_DIR, PROFILE_TOP_N)
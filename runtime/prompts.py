@@ -0,0 +1,128 @@
+"""Prompt management for the agent hierarchy.
+
+- ``compact_instruction`` normalises whitespace and hoists bullet lines that
+  are repeated across workflow steps into a single block, so the static
+  prefix sent on every round trip is smaller and byte-for-byte stable.
+  Step-control lines (``increment_step_no`` checks) are never hoisted: a
+  prompt states that rule once itself, as the explainer's does.
+- ``agent_model`` returns the model for an agent, with every request sent
+  through the "gemini" call gate (``runtime.call_gate``): paced, bounded by
+  the adaptive concurrency limit and retried on 429/5xx. With
+  ``PROMPT_CACHE=1`` it routes through ADK's ``LiteLlm`` with a client that
+  marks the system prompt as cacheable (``cache_control``), letting the
+  provider reuse the prefix.
+
+Prompt, cached and completion tokens are accounted in ``runtime.llm_usage``.
+"""
+
+import os
+import re
+import time
+from collections import Counter
+
+from .call_gate import get_gate, is_retryable
+
+AGENT_MODEL = os.getenv("AGENT_MODEL", "gemini-2.0-flash")
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "0") == "1"
+LITELLM_PROVIDER = os.getenv("LITELLM_PROVIDER", "gemini")
+
+# agent name -> {"original_chars": int, "compact_chars": int}
+instruction_stats = {}
+
+# Lines containing any of these drive the step loop and are never hoisted out of their steps
+STEP_CONTROL_MARKERS = ("increment_step_no", "Ask yourself")
+
+
+def compact_instruction(text, agent_name=None, min_repeats=3, keep=STEP_CONTROL_MARKERS):
+    """Deduplicate boilerplate in an instruction.
+
+    Bullet lines occurring at least ``min_repeats`` times are removed from
+    their individual steps and stated once at the end, except lines containing
+    one of ``keep``. Trailing whitespace and runs of blank lines are collapsed.
+    """
+    lines = [line.rstrip() for line in text.strip("\n").splitlines()]
+    counts = Counter(
+        line.strip()
+        for line in lines
+        if line.strip().startswith("- ") and not any(marker in line for marker in keep)
+    )
+    repeated = [line for line, n in counts.items() if n >= min_repeats]
+
+    kept = [line for line in lines if line.strip() not in repeated]
+    if repeated:
+        kept += ["", "Applies after EVERY step above:"] + [f"   {line}" for line in repeated]
+    compact = re.sub(r"\n{3,}", "\n\n", "\n".join(kept)) + "\n"
+
+    if agent_name:
+        instruction_stats[agent_name] = {"original_chars": len(text), "compact_chars": len(compact)}
+    return compact
+
+
+def gated(model_class):
+    """Subclass of an ADK model class whose requests go through the "gemini" call gate.
+
+    A streamed response cannot be retried once part of it was delivered, so
+    streaming requests are only paced and bounded, not retried.
+    """
+    class GatedModel(model_class):
+        async def generate_content_async(self, llm_request, stream=False):
+            gate = get_gate("gemini")
+            generate = super().generate_content_async
+            if stream:
+                await gate.pace_async()
+                await gate.limit.acquire_async()
+                started = time.perf_counter()
+                try:
+                    async for response in generate(llm_request, stream=True):
+                        yield response
+                except Exception as exc:
+                    gate.limit.release(throttled=is_retryable(exc), op="generate_content")
+                    raise
+                gate.limit.release(latency=time.perf_counter() - started, op="generate_content")
+                return
+
+            async def attempt():
+                return [response async for response in generate(llm_request, stream=False)]
+
+            for response in await gate.call_async(attempt, op="generate_content"):
+                yield response
+
+    GatedModel.__name__ = f"Gated{model_class.__name__}"
+    return GatedModel
+
+
+def agent_model():
+    """Model for an agent: gated Gemini, or a gated prefix-caching LiteLlm wrapper."""
+    if not PROMPT_CACHE:
+        from google.adk.models import Gemini
+
+        return gated(Gemini)(model=AGENT_MODEL)
+
+    from google.adk.models.lite_llm import LiteLlm, LiteLLMClient
+
+    class PrefixCachingClient(LiteLLMClient):
+        """Marks the system prompt as a cacheable prefix before calling litellm."""
+
+        async def acompletion(self, model, messages, tools, **kwargs):
+            return await super().acompletion(model=model, messages=mark_cacheable(messages), tools=tools, **kwargs)
+
+        def completion(self, model, messages, tools, stream=False, **kwargs):
+            return super().completion(model=model, messages=mark_cacheable(messages), tools=tools, stream=stream, **kwargs)
+
+    return gated(LiteLlm)(model=f"{LITELLM_PROVIDER}/{AGENT_MODEL}", llm_client=PrefixCachingClient())
+
+
+def mark_cacheable(messages):
+    """Return messages with the leading system prompt flagged for provider-side caching."""
+    if not messages:
+        return messages
+    first = messages[0]
+    role = first.get("role") if isinstance(first, dict) else getattr(first, "role", None)
+    content = first.get("content") if isinstance(first, dict) else getattr(first, "content", None)
+    if role != "system" or not isinstance(content, str):
+        return messages
+    cached = {
+        "role": "system",
+        "content": [{"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}],
+    }
+    return [cached] + list(messages[1:])
@@ -0,0 +1,285 @@
+"""In-memory session cache over a persistent ADK session service.
+
+``CachingSessionService`` keeps hot sessions in an LRU so the several
+``get_session`` calls of a turn (runner, history, state display) do not each
+deserialize the full state and event list from the database. Appended events
+(which carry the state deltas) are applied to the cached session immediately
+and written back to the wrapped service by a background thread, in order.
+
+``list_sessions`` is answered from a per-user index, populated by one
+indexed query on ``sessions(app_name, user_id, update_time)`` that returns the
+most recently updated session first.
+
+Cached sessions see ``app:``/``user:`` state changed through this process
+only; run a single caching service per database.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import BaseSessionService, ListSessionsResponse
+
+from .memory import register_cache
+from .metrics import registry
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+
+
+class SessionStats:
+    """Counts and latency (ms) of session loads from and saves to the backend."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+        self.latency = {"load": [0, 0.0, 0.0], "save": [0, 0.0, 0.0], "list": [0, 0.0, 0.0]}
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def observe(self, op, started):
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            entry = self.latency[op]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            latency = {
+                op: {"count": n, "avg_ms": round(total / n, 2) if n else 0.0, "max_ms": round(worst, 2)}
+                for op, (n, total, worst) in self.latency.items()
+            }
+            return {**self.counters, **latency}
+
+
+def _view(session, config=None):
+    """Copy of a cached session the caller may mutate, honouring GetSessionConfig."""
+    events = session.events
+    if config is not None:
+        if config.after_timestamp:
+            events = [event for event in events if event.timestamp >= config.after_timestamp]
+        if config.num_recent_events:
+            events = events[-config.num_recent_events:]
+    return session.model_copy(update={"state": dict(session.state), "events": list(events)})
+
+
+class CachingSessionService(BaseSessionService):
+    """LRU session cache with asynchronous, ordered write-back to ``backend``."""
+
+    def __init__(self, backend, max_sessions=SESSION_CACHE_SIZE):
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.stats = SessionStats()
+        self._sessions = OrderedDict()
+        # Session objects handed to the backend: their last_update_time tracks
+        # the stored row, which the backend checks for staleness on append
+        self._shadows = {}
+        self._pending = {}
+        self._user_sessions = {}
+        self._lock = threading.RLock()
+        self._writes = queue.Queue()
+        self._index_ready = False
+        threading.Thread(target=self._write_back, name="session-write-back", daemon=True).start()
+        registry.collector(self.metric_samples)
+        register_cache("sessions", self.memory_usage, self.evict_oldest)
+
+    # ----- cache -----
+
+    def _remember(self, key, session):
+        with self._lock:
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._evict_one()
+
+    def _evict_one(self):
+        evicted, _ = self._sessions.popitem(last=False)
+        if not self._pending.get(evicted):
+            self._shadows.pop(evicted, None)
+        self.stats.count("evictions")
+
+    def memory_usage(self):
+        """(approximate bytes as serialized JSON, number of cached sessions)."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return sum(len(session.model_dump_json()) for session in sessions), len(sessions)
+
+    def evict_oldest(self, count):
+        """Drop the ``count`` least recently used sessions (pending writes still land)."""
+        with self._lock:
+            count = min(count, len(self._sessions))
+            for _ in range(count):
+                self._evict_one()
+        return count
+
+    def _cached(self, key):
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+            return session
+
+    # ----- write-back -----
+
+    def _write_back(self):
+        while True:
+            key, event = self._writes.get()
+            started = time.perf_counter()
+            try:
+                self.backend.append_event(self._shadows[key], event)
+                # The backend keeps its own copy of the events; the shadow only needs state and timestamps
+                self._shadows[key].events.clear()
+            except Exception as e:
+                print(f"[SESSION] Write-back failed for session {key[2]}: {e}")
+            finally:
+                self.stats.observe("save", started)
+                with self._lock:
+                    self._pending[key] -= 1
+                    if not self._pending[key] and key not in self._sessions:
+                        self._shadows.pop(key, None)
+                self._writes.task_done()
+
+    def flush(self):
+        """Block until every queued event is written to the backend."""
+        self._writes.join()
+
+    # ----- BaseSessionService -----
+
+    def create_session(self, *, app_name, user_id, state=None, session_id=None):
+        session = self.backend.create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        key = (app_name, user_id, session.id)
+        with self._lock:
+            self._shadows[key] = session.model_copy(deep=True)
+            self._remember(key, session)
+            if (app_name, user_id) in self._user_sessions:
+                self._user_sessions[(app_name, user_id)].insert(0, session.id)
+        return _view(session)
+
+    def get_session(self, *, app_name, user_id, session_id, config=None):
+        key = (app_name, user_id, session_id)
+        session = self._cached(key)
+        if session is not None:
+            self.stats.count("hits")
+            return _view(session, config)
+
+        self.stats.count("misses")
+        with self._lock:
+            pending = self._pending.get(key)
+        if pending:
+            # Evicted with writes in flight: let them land before reading back
+            self.flush()
+        started = time.perf_counter()
+        session = self.backend.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        self.stats.observe("load", started)
+        if session is None:
+            return None
+        with self._lock:
+            self._shadows[key] = session.model_copy(update={"state": dict(session.state), "events": []})
+            self._remember(key, session)
+        return _view(session, config)
+
+    def append_event(self, session, event):
+        if event.partial:
+            return event
+        key = (session.app_name, session.user_id, session.id)
+        with self._lock:
+            cached = self._sessions.get(key)
+            if cached is None or key not in self._shadows:
+                # Not loaded through this cache: write through
+                return self.backend.append_event(session, event)
+            super().append_event(session=cached, event=event)
+            self._pending[key] = self._pending.get(key, 0) + 1
+            self._writes.put((key, event))
+            self._touch_user_index(key)
+        if session is not cached:
+            super().append_event(session=session, event=event)
+        return event
+
+    def list_sessions(self, *, app_name, user_id):
+        """Sessions of a user, most recently updated first."""
+        with self._lock:
+            ids = self._user_sessions.get((app_name, user_id))
+        if ids is None:
+            started = time.perf_counter()
+            ids = self._query_user_sessions(app_name, user_id)
+            self.stats.observe("list", started)
+            with self._lock:
+                self._user_sessions[(app_name, user_id)] = ids
+        sessions = [
+            Session(id=session_id, app_name=app_name, user_id=user_id, state={}, events=[])
+            for session_id in ids
+        ]
+        return ListSessionsResponse(sessions=sessions)
+
+    def _query_user_sessions(self, app_name, user_id):
+        engine = getattr(self.backend, "db_engine", None)
+        if engine is None:
+            response = self.backend.list_sessions(app_name=app_name, user_id=user_id)
+            return [session.id for session in response.sessions]
+
+        from sqlalchemy import text
+
+        with engine.begin() as conn:
+            if not self._index_ready:
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS idx_sessions_user_update "
+                    "ON sessions (app_name, user_id, update_time)"
+                ))
+                self._index_ready = True
+            rows = conn.execute(
+                text(
+                    "SELECT id FROM sessions WHERE app_name = :app_name AND user_id = :user_id "
+                    "ORDER BY update_time DESC"
+                ),
+                {"app_name": app_name, "user_id": user_id},
+            )
+            return [row[0] for row in rows]
+
+    def _touch_user_index(self, key):
+        ids = self._user_sessions.get(key[:2])
+        if ids and ids[0] != key[2] and key[2] in ids:
+            ids.remove(key[2])
+            ids.insert(0, key[2])
+
+    def delete_session(self, *, app_name, user_id, session_id):
+        self.flush()
+        key = (app_name, user_id, session_id)
+        with self._lock:
+            self._sessions.pop(key, None)
+            self._shadows.pop(key, None)
+            ids = self._user_sessions.get((app_name, user_id))
+            if ids and session_id in ids:
+                ids.remove(session_id)
+        self.backend.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    def list_events(self, *, app_name, user_id, session_id):
+        self.flush()
+        return self.backend.list_events(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    def close_session(self, *, session):
+        self.flush()
+        self.backend.close_session(session=session)
+
+    def metric_samples(self):
+        """Collector for ``runtime.metrics``: cache hits, cached sessions and write-back depth."""
+        counters = self.stats.snapshot()
+        for result, counter in (("hit", "hits"), ("miss", "misses")):
+            yield "cache_requests_total", "counter", "Cache lookups.", {"cache": "session", "result": result}, counters[counter]
+        yield "sessions_cached", "gauge", "Sessions held in the session cache.", {}, len(self._sessions)
+        yield "session_write_queue_depth", "gauge", "Session events waiting to be written back.", {}, self._writes.unfinished_tasks
+
+    def report(self):
+        """One-line summary of cache hits and backend load/save latency."""
+        s = self.stats.snapshot()
+        return (
+            f"[SESSION] hits={s['hits']} misses={s['misses']} evictions={s['evictions']} | "
+            f"load avg {s['load']['avg_ms']} ms (max {s['load']['max_ms']}) over {s['load']['count']} | "
+            f"save avg {s['save']['avg_ms']} ms (max {s['save']['max_ms']}) over {s['save']['count']} | "
+            f"pending writes {self._writes.unfinished_tasks}"
+        )
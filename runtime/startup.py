@@ -0,0 +1,120 @@
+"""Fast CLI startup: background warm-up of heavy imports and an import-time profile.
+
+``main.py`` shows its prompt right away and imports the agent tree (ADK,
+LiteLLM, Pinecone, numpy, the retrieval engine) in a warm-up thread while the
+user types; ``warm_up().wait()`` blocks only if the warm-up has not finished.
+
+Profile what startup imports with::
+
+    python -m runtime.startup            # top 15 modules by cumulative import time
+    python -m runtime.startup --top 30 --module main
+"""
+
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# Imported in this order by the warm-up thread; the agent tree comes first
+# because the first turn cannot start without it
+WARM_UP_MODULES = (
+    "root_agent.agent",
+    "google.adk.runners",
+    "google.adk.sessions",
+    "helper",
+    "runtime.session_cache",
+    "runtime.user_context",
+    "pinecone",
+)
+
+LITELLM_DEBUG = os.getenv("LITELLM_DEBUG", "0") == "1"
+
+
+def configure_debug_logging(enabled=LITELLM_DEBUG):
+    """Turn on LiteLLM's verbose logging when ``LITELLM_DEBUG=1`` (off by default)."""
+    if enabled:
+        import litellm
+
+        litellm._turn_on_debug()
+
+
+class WarmUp:
+    """Imports ``modules`` in a daemon thread; ``wait`` re-raises the first failure."""
+
+    def __init__(self, modules=WARM_UP_MODULES):
+        self.modules = modules
+        self.elapsed_ms = None
+        self._error = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            for name in self.modules:
+                importlib.import_module(name)
+        except BaseException as e:
+            self._error = e
+        finally:
+            self.elapsed_ms = (time.perf_counter() - started) * 1000
+            self._done.set()
+
+    def wait(self):
+        """Block until the warm-up is done; returns the milliseconds spent waiting."""
+        started = time.perf_counter()
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return (time.perf_counter() - started) * 1000
+
+
+def warm_up(modules=WARM_UP_MODULES):
+    """Start importing ``modules`` in the background."""
+    return WarmUp(modules).start()
+
+
+def import_profile(module="root_agent.agent", top=15):
+    """Run ``python -X importtime -c 'import <module>'`` and return the slowest imports.
+
+    Returns:
+        A list of (cumulative_us, self_us, module_name), slowest first.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else f"import {module} failed")
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of the CLI startup path.")
+    parser.add_argument("--module", default="root_agent.agent")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = import_profile(args.module, args.top)
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in rows:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
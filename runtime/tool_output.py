@@ -0,0 +1,58 @@
+"""Compact tool results so they cost fewer input tokens per LLM round trip.
+
+Tools project their results to the fields the agents actually use, truncate
+long strings and lists, and return recommendation items as single
+``" | "``-joined rows instead of repeated key/value dicts. The
+``report_tool_output`` callback measures the serialized size of every tool
+result so the savings can be tracked.
+"""
+
+import json
+import os
+import threading
+
+MAX_TEXT_CHARS = int(os.getenv("TOOL_MAX_TEXT_CHARS", "200"))
+MAX_LIST_ITEMS = int(os.getenv("TOOL_MAX_LIST_ITEMS", "10"))
+ROW_SEPARATOR = " | "
+
+# tool name -> {"calls": int, "bytes": int, "max_bytes": int}
+tool_output_stats = {}
+_stats_lock = threading.Lock()
+
+
+def serialized_size(value):
+    """Bytes of the compact JSON encoding of a tool result."""
+    return len(json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def truncate_text(value, max_chars=MAX_TEXT_CHARS):
+    text = "" if value is None else str(value)
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+def truncate_list(values, max_items=MAX_LIST_ITEMS):
+    """Keep the newest ``max_items`` entries (lists are appended in time order)."""
+    values = list(values)
+    if len(values) <= max_items:
+        return values
+    return [f"... (+{len(values) - max_items} earlier)"] + values[-max_items:]
+
+
+def compact_rows(records, fields, max_chars=MAX_TEXT_CHARS):
+    """Project metadata dicts to ``fields`` and join each into one row string."""
+    return [ROW_SEPARATOR.join(truncate_text(r.get(f), max_chars) for f in fields) for r in records]
+
+
+def report_tool_output(tool, args, tool_context, tool_response):
+    """ADK ``after_tool_callback``: record the serialized size of each tool result.
+
+    Returns None so the tool response is passed on unchanged.
+    """
+    size = serialized_size(tool_response)
+    with _stats_lock:
+        stats = tool_output_stats.setdefault(tool.name, {"calls": 0, "bytes": 0, "max_bytes": 0})
+        stats["calls"] += 1
+        stats["bytes"] += size
+        stats["max_bytes"] = max(stats["max_bytes"], size)
+    print(f"[TOOL OUTPUT] {tool.name}: {size} bytes")
+    return None
@@ -0,0 +1,296 @@
+"""Per-turn tracing spans, written as OTLP JSON.
+
+A turn (``helper.call_agent_async``) opens a root span. The ADK callbacks
+below open child spans for every agent run (so root → explainer →
+summarizer/recommendation transfers nest), every model call and every tool
+call. Tools and the retrieval code open spans around SQLite, Pinecone,
+embedding and local vector operations with ``span(name, **attributes)``.
+
+Every ``span`` also records its duration in the always-on
+``operation_duration_seconds`` histogram of ``runtime.metrics``. Tracing
+itself is off unless ``TRACE_FILE`` is set; when it is off, ``span`` only
+does that and the callbacks return immediately. When it is on, each finished trace (a turn, or a background prefetch) is appended to
+``TRACE_FILE`` as one line of OTLP/JSON ``ExportTraceServiceRequest``, the
+format of the OpenTelemetry collector's file exporter, so it can be loaded
+by OTLP-aware tools (Jaeger, otel-desktop-viewer, ...) or read with
+``python -m runtime.tracing TRACE_FILE``.
+"""
+
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+
+from .metrics import OPERATION_SECONDS
+
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "cross-domain-recsys")
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.end_ns = None
+        self.start_ns = time.time_ns()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def to_otlp(spans):
+    """An OTLP/JSON ExportTraceServiceRequest holding ``spans``."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "runtime.tracing"},
+                "spans": [
+                    {
+                        "traceId": s.trace_id,
+                        "spanId": s.span_id,
+                        "parentSpanId": s.parent.span_id if s.parent is not None else "",
+                        "name": s.name,
+                        "kind": 1,  # SPAN_KIND_INTERNAL
+                        "startTimeUnixNano": str(s.start_ns),
+                        "endTimeUnixNano": str(s.end_ns),
+                        "attributes": [_attribute(k, v) for k, v in s.attributes.items() if v is not None],
+                        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+                    }
+                    for s in spans
+                ],
+            }],
+        }]
+    }
+
+
+class FileExporter:
+    """Appends each finished trace to a JSON-lines file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        line = json.dumps(to_otlp(spans), separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class Tracer:
+    """Collects the spans of each trace and exports them when its root span ends."""
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+        self._finished = defaultdict(list)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def start(self, name, parent=None, **attributes):
+        return Span(name, parent if parent is not None else _current.get(), attributes)
+
+    def end(self, span, error=None):
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+        with self._lock:
+            trace = self._finished[span.trace_id]
+            trace.append(span)
+            if span.parent is not None:
+                return
+            del self._finished[span.trace_id]
+        self.exporter.export(trace)
+
+
+tracer = Tracer(FileExporter(TRACE_FILE) if TRACE_FILE else None)
+
+
+class _SpanScope:
+    __slots__ = ("span", "_token")
+
+    def __init__(self, name, attributes):
+        self.span = tracer.start(name, **attributes)
+
+    def __enter__(self):
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        tracer.end(self.span, exc)
+        OPERATION_SECONDS.labels(self.span.name).observe((self.span.end_ns - self.span.start_ns) / 1e9)
+        return False
+
+
+class _TimedOperation:
+    """What ``span`` returns when tracing is off: the latency metric only."""
+
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        OPERATION_SECONDS.labels(self.name).observe(time.perf_counter() - self.started)
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+def span(name, **attributes):
+    """Context manager timing ``name`` as a child of the current span."""
+    if not tracer.enabled:
+        return _TimedOperation(name)
+    return _SpanScope(name, attributes)
+
+
+def current_span():
+    return _current.get()
+
+
+# ADK callbacks. Before/after pairs are matched by invocation and agent (or
+# function call) and the current span is moved down and back up, so the
+# operations a tool runs nest under its tool span.
+_open = {}
+
+
+def _push(key, name, **attributes):
+    opened = tracer.start(name, **attributes)
+    _open[key] = opened
+    _current.set(opened)
+
+
+def _pop(key, error=None, **attributes):
+    opened = _open.pop(key, None)
+    if opened is None:
+        return None
+    opened.set(**attributes)
+    _current.set(opened.parent)
+    tracer.end(opened, error)
+    return opened
+
+
+def trace_agent_start(callback_context):
+    """ADK ``before_agent_callback``."""
+    if tracer.enabled:
+        key = ("agent", callback_context.invocation_id, callback_context.agent_name)
+        _push(key, f"agent {callback_context.agent_name}", agent=callback_context.agent_name)
+    return None
+
+
+def trace_agent_end(callback_context):
+    """ADK ``after_agent_callback``."""
+    if tracer.enabled:
+        _pop(("agent", callback_context.invocation_id, callback_context.agent_name))
+    return None
+
+
+def trace_model_start(callback_context, llm_request):
+    """ADK ``before_model_callback``."""
+    if tracer.enabled:
+        key = ("model", callback_context.invocation_id, callback_context.agent_name)
+        _push(key, f"llm {llm_request.model or 'model'}", agent=callback_context.agent_name,
+              contents=len(llm_request.contents))
+    return None
+
+
+def trace_model_end(callback_context, llm_response):
+    """ADK ``after_model_callback``: closes the model span with its token usage."""
+    if tracer.enabled:
+        usage = llm_response.usage_metadata
+        _pop(
+            ("model", callback_context.invocation_id, callback_context.agent_name),
+            error=llm_response.error_message,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            completion_tokens=getattr(usage, "candidates_token_count", None),
+            cached_tokens=getattr(usage, "cached_content_token_count", None),
+        )
+    return None
+
+
+def trace_tool_start(tool, args, tool_context):
+    """ADK ``before_tool_callback``."""
+    if tracer.enabled:
+        key = ("tool", tool_context.invocation_id, tool_context.function_call_id)
+        attributes = {"tool": tool.name, "agent": tool_context.agent_name}
+        if tool.name == "transfer_to_agent":
+            attributes["transfer_to"] = args.get("agent_name")
+        _push(key, f"tool {tool.name}", **attributes)
+    return None
+
+
+def trace_tool_end(tool, args, tool_context, tool_response):
+    """ADK ``after_tool_callback``."""
+    if tracer.enabled:
+        status = tool_response.get("status") if isinstance(tool_response, dict) else None
+        error = tool_response.get("message") if status == "error" else None
+        _pop(("tool", tool_context.invocation_id, tool_context.function_call_id), error=error, status=status)
+    return None
+
+
+def close_invocation(invocation_id):
+    """End spans of an invocation left open by a tool or model call that raised."""
+    for key in [key for key in _open if key[1] == invocation_id]:
+        _pop(key, error="callback pair not completed")
+
+
+def summarize_trace(otlp):
+    """(name, depth, duration ms) rows of one exported trace, in start order."""
+    spans = [s for rs in otlp["resourceSpans"] for ss in rs["scopeSpans"] for s in ss["spans"]]
+    children = defaultdict(list)
+    for s in spans:
+        children[s["parentSpanId"]].append(s)
+    rows = []
+
+    def walk(parent_id, depth):
+        for s in sorted(children[parent_id], key=lambda s: int(s["startTimeUnixNano"])):
+            duration = (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6
+            rows.append((s["name"], depth, duration))
+            walk(s["spanId"], depth + 1)
+
+    walk("", 0)
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    with open(sys.argv[1] if len(sys.argv) > 1 else TRACE_FILE, encoding="utf-8") as f:
+        for line in f:
+            for name, depth, duration in summarize_trace(json.loads(line)):
+                print(f"{duration:10.1f} ms  {'  ' * depth}{name}")
+            print()
@@ -0,0 +1,203 @@
+"""Per-user context cache, prefetched concurrently when a session starts.
+
+The first activity message of a session used to pay every cold fetch in
+sequence: the user's activity row and summaries from SQLite, the user vector
+from Pinecone, the catalog/index handles and the embedding model.
+``prefetch_user_context`` loads all of them in parallel while the user is
+still typing; tools then read the activity row and summaries through
+``get_user_row`` and keep it current with ``update_user_row``.
+
+Writes from this process go through ``update_user_row``; writes from other
+processes sharing the SQLite file (a second server, the CLI) are not seen,
+so a cached row is reloaded once it is older than ``USER_ROW_TTL`` seconds
+(default 30, 0 disables the row cache).
+
+Each prefetched item remembers how long it took to load; the first time a
+tool uses it (``credit_prefetch``), that time is added to
+``prefetch_stats["saved_ms"]``: latency the first turn no longer pays.
+"""
+
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from retrieval.config import ACTIVITY_FIELDS, DOMAINS, INDEX_NAMES, USER_ACTIVITY_DB, USER_INDEX_NAME
+
+from .tracing import span
+
+SUMMARY_COLUMNS = {domain: f"{domain}_pref_summary" for domain in DOMAINS}
+USER_ROW_TTL = float(os.getenv("USER_ROW_TTL", "30"))
+
+# user_id -> {column: value}, least recently used first
+_rows = OrderedDict()
+# user_id -> time.monotonic() when its row was read from SQLite
+_loaded_at = {}
+# (user_id, item) -> load time in ms of prefetched items not used yet
+_unused = {}
+_lock = threading.Lock()
+prefetch_stats = {"saved_ms": 0.0, "hits": 0, "misses": 0}
+
+
+def credit_prefetch(user_id, item):
+    """Record that a tool used a prefetched item instead of loading it cold."""
+    with _lock:
+        prefetch_stats["saved_ms"] += _unused.pop((user_id, item), 0.0)
+
+
+def _load_row(user_id, db_path=USER_ACTIVITY_DB):
+    """Activity lists (decoded) and summaries of a user, or None if the user is unknown."""
+    columns = list(ACTIVITY_FIELDS.values()) + list(SUMMARY_COLUMNS.values())
+    conn = sqlite3.connect(db_path)
+    try:
+        with span("sqlite.load_user_row"):
+            row = conn.execute(f"SELECT {', '.join(columns)} FROM user_activity WHERE user_id = ?", (user_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    values = dict(zip(columns, row))
+    for field in ACTIVITY_FIELDS.values():
+        values[field] = json.loads(values[field]) if values[field] else []
+    return values
+
+
+def get_user_row(user_id):
+    """Cached activity lists and summaries of a user ({column: value}), or None."""
+    with _lock:
+        row = _rows.get(user_id)
+        if row is not None and time.monotonic() - _loaded_at[user_id] >= USER_ROW_TTL:
+            # May have been changed by another process since it was read
+            del _rows[user_id], _loaded_at[user_id]
+            row = None
+        if row is not None:
+            _rows.move_to_end(user_id)
+            prefetch_stats["hits"] += 1
+            prefetch_stats["saved_ms"] += _unused.pop((user_id, "activity_row"), 0.0)
+            return dict(row)
+        prefetch_stats["misses"] += 1
+    loaded_at = time.monotonic()
+    row = _load_row(user_id)
+    if row is not None:
+        with _lock:
+            _rows[user_id], _loaded_at[user_id] = row, loaded_at
+    return dict(row) if row is not None else None
+
+
+def row_cache_usage(sizeof):
+    """(approximate bytes, entries) of the cached rows; ``sizeof`` measures one row."""
+    with _lock:
+        rows = list(_rows.values())
+    return sum(sizeof(row) for row in rows), len(rows)
+
+
+def evict_rows(count):
+    """Drop the ``count`` least recently used rows; returns how many were dropped."""
+    with _lock:
+        count = min(count, len(_rows))
+        for _ in range(count):
+            user_id, _ = _rows.popitem(last=False)
+            del _loaded_at[user_id]
+    return count
+
+
+def update_user_row(user_id, column, value):
+    """Write-through hook for tools that just updated a column in SQLite."""
+    with _lock:
+        if user_id in _rows:
+            _rows[user_id][column] = value
+
+
+def _prefetch_row(user_id):
+    loaded_at = time.monotonic()
+    row = _load_row(user_id)
+    if row is not None:
+        with _lock:
+            if user_id not in _rows:
+                _rows[user_id], _loaded_at[user_id] = row, loaded_at
+
+
+def _prefetch_vector(user_id):
+    from retrieval.user_store import read_user_vector
+    from retrieval.user_vectors import user_vector_cache, vector_version
+
+    from .call_gate import get_gate
+
+    if user_vector_cache.get(user_id) is None:
+        values = read_user_vector(user_id, get_gate("pinecone").call)
+        if values is not None:
+            user_vector_cache.put(user_id, values, vector_version(values))
+
+
+def _prefetch_handles():
+    from retrieval.pinecone_client import get_index
+    from retrieval.user_store import USER_SLICE_INDEX_NAME, USER_VECTOR_LAYOUT
+
+    user_index = USER_SLICE_INDEX_NAME if USER_VECTOR_LAYOUT == 2 else USER_INDEX_NAME
+    for name in list(INDEX_NAMES.values()) + [user_index]:
+        get_index(name)
+
+
+def _prefetch_local_indices():
+    from retrieval.engine import get_scorer
+    from retrieval.metadata_store import get_metadata_store
+    from retrieval.neighbours import get_neighbour_table
+    from retrieval.precompute import get_precomputed_table
+
+    for domain in DOMAINS:
+        get_scorer(domain)
+        get_metadata_store(domain)
+    get_precomputed_table()
+    get_neighbour_table()
+
+
+def _prefetch_embedding_model():
+    from retrieval.embeddings import get_embedding_model
+
+    get_embedding_model()
+
+
+def prefetch_user_context(user_id):
+    """Load a user's context and the shared handles concurrently.
+
+    Returns:
+        {"tasks": {name: ms or error string}, "wall_ms": float, "serial_ms": float}
+    """
+    tasks = {
+        "activity_row": (_prefetch_row, user_id),
+        "user_vector": (_prefetch_vector, user_id),
+        "pinecone_handles": (_prefetch_handles,),
+        "local_indices": (_prefetch_local_indices,),
+        "embedding_model": (_prefetch_embedding_model,),
+    }
+
+    def run(name, fn, *args):
+        task_started = time.perf_counter()
+        with span(f"prefetch.{name}"):
+            fn(*args)
+        elapsed = (time.perf_counter() - task_started) * 1000
+        with _lock:
+            _unused[(user_id, name)] = elapsed
+        return elapsed
+
+    started = time.perf_counter()
+    results = {}
+    # Each task runs in a copy of this context so that its spans nest under the prefetch span
+    with span("prefetch", user_id=user_id), ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="prefetch") as pool:
+        futures = {
+            name: pool.submit(contextvars.copy_context().run, run, name, fn, *args)
+            for name, (fn, *args) in tasks.items()
+        }
+        for name, future in futures.items():
+            try:
+                results[name] = round(future.result(), 1)
+            except Exception as e:
+                results[name] = f"failed: {e}"
+    wall_ms = (time.perf_counter() - started) * 1000
+    serial_ms = sum(ms for ms in results.values() if isinstance(ms, float))
+    print(f"[PREFETCH] {user_id}: {results} | wall {wall_ms:.0f} ms vs {serial_ms:.0f} ms serial")
+    return {"tasks": results, "wall_ms": wall_ms, "serial_ms": serial_ms}
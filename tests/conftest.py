@@ -0,0 +1,50 @@
+"""Shared fixtures: scratch data paths and in-memory Pinecone fakes.
+
+The retrieval modules read their paths when first imported, so the scratch
+directory is set here, before any test module imports them.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("RECSYS_DATA_DIR", tempfile.mkdtemp(prefix="recsys-tests-"))
+os.environ.setdefault("USER_ACTIVITY_DB", os.path.join(os.environ["RECSYS_DATA_DIR"], "user_activity.db"))
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+from benchmarks.fakes import FakeIndex, FakePinecone, install_fake_pinecone  # noqa: E402
+from retrieval.catalog import Catalog, ids_digest, load_catalog, normalize_rows, save_catalog  # noqa: E402
+from retrieval.config import EMBEDDING_DIM, USER_INDEX_NAME, USER_VECTOR_DIM  # noqa: E402
+from retrieval.user_store import USER_SLICE_INDEX_NAME  # noqa: E402
+
+
+@pytest.fixture
+def user_indexes():
+    """Empty fake user indexes of both layouts, installed as the Pinecone client."""
+    client = FakePinecone({
+        USER_INDEX_NAME: FakeIndex(USER_INDEX_NAME, USER_VECTOR_DIM),
+        USER_SLICE_INDEX_NAME: FakeIndex(USER_SLICE_INDEX_NAME, EMBEDDING_DIM),
+    })
+    install_fake_pinecone(client)
+    yield client
+    install_fake_pinecone(FakePinecone())
+
+
+def make_catalog(n=500, domain="movie", seed=0, prefix="item", root=None):
+    """Catalog of ``n`` random normalised rows, exported to ``root`` and memory-mapped if given."""
+    vectors = normalize_rows(np.random.default_rng(seed).standard_normal((n, EMBEDDING_DIM)))
+    ids = np.asarray([f"{prefix}{i}" for i in range(n)])
+    if root is not None:
+        save_catalog(domain, ids, vectors, root)
+        return load_catalog(domain, root)
+    return Catalog(domain, ids, vectors, {"count": n, "dim": EMBEDDING_DIM, "digest": ids_digest(ids)})
+
+
+def exact_top_k(queries, vectors, k, exclude_rows=None):
+    """Reference top-k by scoring every row and sorting."""
+    scores = queries @ np.asarray(vectors, dtype=np.float32).T
+    if exclude_rows is not None:
+        for q, rows in enumerate(exclude_rows):
+            scores[q, rows] = -np.inf
+    return np.argsort(-scores, axis=1, kind="stable")[:, :k]
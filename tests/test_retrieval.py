@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from retrieval.ann import IVFIndex
+from retrieval.batching import BatchScorer
+from retrieval.catalog import ExactIndex, blocked_top_k, normalize_rows
+from retrieval.quantize import QuantizedIndex, load_quantized, save_quantized
+
+from conftest import exact_top_k, make_catalog
+
+
+def _queries(n, seed=1):
+    return normalize_rows(np.random.default_rng(seed).standard_normal((n, 384)))
+
+
+def test_blocked_top_k_matches_exact_search():
+    catalog = make_catalog(1000)
+    queries = _queries(6)
+    rows, scores = blocked_top_k(queries, catalog.vectors, 10, item_block=128)
+
+    np.testing.assert_array_equal(rows, exact_top_k(queries, catalog.vectors, 10))
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def test_blocked_top_k_exclusions_are_per_query():
+    catalog = make_catalog(1000)
+    queries = _queries(3)
+    best = exact_top_k(queries, catalog.vectors, 5)
+    # Query 0 excludes its own best rows, query 1 excludes query 0's, query 2 nothing
+    exclude = [best[0][:3], best[0][:3], np.empty(0, dtype=np.int64)]
+    rows, _ = blocked_top_k(queries, catalog.vectors, 5, exclude, item_block=100)
+
+    np.testing.assert_array_equal(rows, exact_top_k(queries, catalog.vectors, 5, exclude))
+    assert not np.isin(best[0][:3], rows[0]).any()
+    np.testing.assert_array_equal(rows[2], best[2])
+
+
+def test_blocked_top_k_pads_when_too_few_rows_qualify():
+    catalog = make_catalog(20)
+    rows, _ = blocked_top_k(_queries(1), catalog.vectors, 5, [np.arange(17)], item_block=8)
+
+    assert sorted(rows[0][:3]) == [17, 18, 19]
+    assert list(rows[0][3:]) == [-1, -1]
+
+
+def test_batch_scorer_respects_each_query_k_and_exclusions():
+    catalog = make_catalog(800)
+    queries = _queries(4)
+    ks = [3, 10, 1, 7]
+    best = exact_top_k(queries, catalog.vectors, 20)
+    excludes = [[], [str(catalog.ids[row]) for row in best[1][:4]], [str(catalog.ids[best[2][0]])], ["unknown"]]
+    scorer = BatchScorer(ExactIndex(catalog), max_batch_size=8, max_wait_ms=50)
+
+    futures = [scorer.submit(q, k, exclude) for q, k, exclude in zip(queries, ks, excludes)]
+    results = [future.result(timeout=10) for future in futures]
+
+    for i, (found, k, exclude) in enumerate(zip(results, ks, excludes)):
+        expected = [str(catalog.ids[row]) for row in best[i] if str(catalog.ids[row]) not in exclude][:k]
+        assert [item_id for item_id, _ in found] == expected
+    assert scorer.stats["queries"] == 4
+
+
+@pytest.mark.parametrize("kind", ["int8", "fp16"])
+def test_quantized_search_with_rerank_matches_exact(tmp_path, kind):
+    catalog = make_catalog(1000, root=str(tmp_path))
+    queries = _queries(4)
+    quantized = save_quantized(catalog, kind, root=str(tmp_path))
+    rows, _ = QuantizedIndex(catalog, quantized, rerank=50).search(queries, 5)
+
+    np.testing.assert_array_equal(rows, exact_top_k(queries, catalog.vectors, 5))
+
+
+def test_quantized_copy_of_another_catalog_is_rejected(tmp_path):
+    save_quantized(make_catalog(300, root=str(tmp_path)), "int8", root=str(tmp_path))
+    assert load_quantized(make_catalog(300, root=str(tmp_path)), "int8", root=str(tmp_path)) is not None
+
+    # Re-exported with the same size but other items
+    reexported = make_catalog(300, prefix="other", root=str(tmp_path))
+    assert load_quantized(reexported, "int8", root=str(tmp_path)) is None
+
+
+@pytest.mark.parametrize("pq_m", [0, 8])
+def test_ivf_probing_every_list_matches_exact(pq_m):
+    catalog = make_catalog(1000)
+    queries = _queries(4)
+    index = IVFIndex.build(catalog, nlist=4, pq_m=pq_m, iters=5)
+    index.nprobe, index.rerank = 4, 1000
+    best = exact_top_k(queries, catalog.vectors, 5)
+    exclude = [best[i][:2] for i in range(len(queries))]
+    rows, _ = index.search(queries, 5, exclude)
+
+    np.testing.assert_array_equal(rows, exact_top_k(queries, catalog.vectors, 5, exclude))
+
+
+def test_ivf_index_of_another_catalog_is_rejected(tmp_path):
+    catalog = make_catalog(400)
+    IVFIndex.build(catalog, nlist=4, pq_m=8, iters=5).save(str(tmp_path))
+
+    loaded = IVFIndex.load(catalog, str(tmp_path))
+    assert loaded is not None and loaded.params["pq_m"] == 8
+    assert IVFIndex.load(make_catalog(400, prefix="other"), str(tmp_path)) is None
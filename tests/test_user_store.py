@@ -0,0 +1,58 @@
+import numpy as np
+
+from retrieval.config import USER_VECTOR_DIM
+from retrieval.user_store import (
+    list_user_ids,
+    migrate_all,
+    read_slices,
+    read_user_vector,
+    split_vector,
+    write_slices,
+)
+
+
+def _vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {f"user_{i}": rng.standard_normal(USER_VECTOR_DIM).astype(np.float32) for i in range(n)}
+
+
+def test_migrate_round_trip(user_indexes):
+    vectors = _vectors(7)
+    for user_id, vector in vectors.items():
+        write_slices(user_id, split_vector(vector), layout=1)
+
+    assert migrate_all(batch_size=3) == 7
+    assert list_user_ids(layout=2) == sorted(vectors)
+    for user_id, vector in vectors.items():
+        np.testing.assert_array_equal(read_user_vector(user_id, layout=2), vector)
+
+
+def test_migrate_rerun_is_a_no_op(user_indexes):
+    vectors = _vectors(5)
+    for user_id, vector in vectors.items():
+        write_slices(user_id, split_vector(vector), layout=1)
+    migrate_all(batch_size=2)
+
+    slice_index = user_indexes.Index("user-preference-slices")
+    upserts = slice_index.calls["upsert"]
+    assert migrate_all(batch_size=2) == 0
+    assert slice_index.calls["upsert"] == upserts
+
+
+def test_layout_2_write_only_touches_its_slices(user_indexes):
+    vector = _vectors(1)["user_0"]
+    write_slices("user_0", split_vector(vector), layout=2)
+    new_movie = np.ones(384, dtype=np.float32)
+    write_slices("user_0", {"movie": new_movie}, layout=2)
+
+    slices = read_slices("user_0", layout=2)
+    np.testing.assert_array_equal(slices["movie"], new_movie)
+    np.testing.assert_array_equal(slices["music"], split_vector(vector)["music"])
+
+
+def test_layout_2_read_migrates_a_missed_user(user_indexes):
+    vector = _vectors(1)["user_0"]
+    write_slices("user_0", split_vector(vector), layout=1)
+
+    np.testing.assert_array_equal(read_user_vector("user_0", layout=2), vector)
+    assert list_user_ids(layout=2) == ["user_0"]
@@ -5,14 +5,18 @@ import numpy as np
 # Initialize Pinecone client
 pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
 
+# Storage layout (see retrieval/user_store.py): 1 = one 1536-dim record per user,
+# 2 = one 384-dim record per slice, with ID "<user_id>#<slice>"
+layout = int(os.getenv("USER_VECTOR_LAYOUT", "1"))
+
 # Index name
-index_name = "user-preference-vector"
+index_name = "user-preference-slices" if layout == 2 else "user-preference-vector"
 
 # Check if it already exists
 if index_name not in [idx['name'] for idx in pc.list_indexes()]:
     pc.create_index(
         name=index_name,
-        dimension=1536,  # 4 x 384
+        dimension=384 if layout == 2 else 1536,  # 4 x 384 in layout 1
         metric="cosine",  # Best for embeddings-based similarity
         spec=ServerlessSpec(cloud="aws", region="us-east-1")
     )
@@ -39,9 +43,16 @@ def initialize_user_vector(user_id: str):
 
     # Push to Pinecone
     index = pc.Index(index_name)
-    index.upsert([
-        {"id": user_id, "values": full_vector}
-    ])
+    if layout == 2:
+        slices = {"movie": movie_emb, "music": music_emb, "product": product_emb, "collective": collective_emb}
+        index.upsert([
+            {"id": f"{user_id}#{name}", "values": values, "metadata": {"user_id": user_id, "slice": name, "layout": 2}}
+            for name, values in slices.items()
+        ])
+    else:
+        index.upsert([
+            {"id": user_id, "values": full_vector}
+        ])
 
     print(f"✅ Initialized vector for user: {user_id}")
 